@@ -1,17 +1,16 @@
-from generator_response import generate_response
+from generator_response import generate_response_stream, extract_recipe_title
+from recipe_store import get_recipe_store
+from resources import get_registry
 import streamlit as st
-import re
 import os, json
-import random
 
 if __name__ == "__main__":
-    # Debug: Check if recipes.json exists
+    # Load recipes.json once into the shared recipe store (reused by every query)
     recipes_path = "./recipes.json"
     if os.path.exists(recipes_path):
         try:
-            with open(recipes_path, 'r') as f:
-                recipes_data = json.load(f)
-                print(f"Recipe file exists and contains {len(recipes_data)} recipes.")
+            recipe_store = get_recipe_store(recipes_path)
+            print(f"Recipe file exists and contains {len(recipe_store)} recipes.")
         except json.JSONDecodeError:
             print("Recipe file exists but contains invalid JSON.")
         except Exception as e:
@@ -19,13 +18,13 @@ if __name__ == "__main__":
     else:
         print(f"Recipe file does not exist at path: {recipes_path}")
     
-    # Load the generator model on startup (can be CPU if no GPU)
+    # Load the embedding model and vectorstores once, eagerly, before the first query
     try:
-        device = "cuda" if "CUDA_VISIBLE_DEVICES" in os.environ else "cpu"
-        # generator = load_generator(model_key="deepseek", device=device)
+        readiness = get_registry().warm_up()
         generator_loaded = True
-        print("Recipe generator loaded successfully!")
+        print(f"Recipe generator loaded successfully! Readiness: {readiness}")
     except Exception as e:
+        readiness = {"ready": False, "errors": {"registry": str(e)}}
         generator_loaded = False
         print(f"Could not load recipe generator: {str(e)}")
 
@@ -150,6 +149,9 @@ if __name__ == "__main__":
     </div>
     """, unsafe_allow_html=True)
 
+    if not readiness["ready"]:
+        st.warning(f"Some retrieval resources are not ready yet: {readiness['errors']}")
+
     # User input
     user_input = st.text_input(
         "🤔 What kind of recipe would you like me to create?", 
@@ -163,38 +165,50 @@ if __name__ == "__main__":
     if generate_button and user_input:
         # Generate recipe section
         if generator_loaded:
-            with st.spinner("Creating your personalized recipe..."):
-                try:
-                    # Generate the recipe
-                    generated_recipe = generate_response(user_input, "./recipes.json")
-                    
-                    # Extract title (basic pattern matching)
-                    title_match = re.search(r'(?:Recipe Title:|Title:)\s*([^\n]+)', generated_recipe, re.IGNORECASE)
-                    title = title_match.group(1).strip() if title_match else "Personalized Recipe"
-                    
-                    # Add stars to title like in screenshot
-                    title = f"** {title}"
-                    
-                    # Estimate cooking time
-                    cooking_time = random.randint(20, 45)
-                    
-                    # Display the title without metadata
-                    st.markdown(f'<div class="recipe-title">🍽️ {title}</div>', unsafe_allow_html=True)
-                    
-                    # Display the rest of the recipe
-                    st.markdown(generated_recipe)
-                    
-                    # Add download option
-                    st.download_button(
-                        label="📥 Download Recipe",
-                        data=generated_recipe,
-                        file_name=f"recipe_{user_input.replace(' ', '_')[:20]}.txt",
-                        mime="text/plain"
-                    )
-                    
-                except Exception as e:
-                    st.error(f"Could not generate recipe: {str(e)}")
-                    import traceback
-                    print(f"Recipe generation error: {traceback.format_exc()}")
+            status = st.empty()
+            title_placeholder = st.empty()
+            body_placeholder = st.empty()
+            status.info("⏳ Creating your personalized recipe...")
+            try:
+                # Stream the recipe: render every chunk as it arrives
+                metrics = {}
+                generated_recipe = ""
+                title = None
+                for chunk in generate_response_stream(user_input, "./recipes.json", metrics=metrics):
+                    if not generated_recipe:
+                        status.empty()
+                    generated_recipe += chunk
+
+                    # Show the title as soon as its line is complete
+                    if title is None:
+                        title = extract_recipe_title(generated_recipe)
+                        if title is not None:
+                            title_placeholder.markdown(f'<div class="recipe-title">🍽️ ** {title}</div>', unsafe_allow_html=True)
+                    body_placeholder.markdown(generated_recipe + "▌")
+                status.empty()
+
+                if title is None:
+                    title_placeholder.markdown('<div class="recipe-title">🍽️ ** Personalized Recipe</div>', unsafe_allow_html=True)
+
+                # Display the rest of the recipe
+                body_placeholder.markdown(generated_recipe)
+                if metrics.get("cached"):
+                    st.caption(f"Answered from the response cache in {metrics['total_s']:.2f}s")
+                elif metrics.get("ttft_s") is not None:
+                    st.caption(f"First words after {metrics['ttft_s']:.1f}s · complete after {metrics['total_s']:.1f}s")
+
+                # Add download option
+                st.download_button(
+                    label="📥 Download Recipe",
+                    data=generated_recipe,
+                    file_name=f"recipe_{user_input.replace(' ', '_')[:20]}.txt",
+                    mime="text/plain"
+                )
+
+            except Exception as e:
+                status.empty()
+                st.error(f"Could not generate recipe: {str(e)}")
+                import traceback
+                print(f"Recipe generation error: {traceback.format_exc()}")
         else:
             st.warning("Recipe generator is not available. Please try again later.")
\ No newline at end of file
@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+CLASSIFIER_CACHE_PATH = "./cache/classifier_cache.sqlite"
+CLASSIFIER_CACHE_TTL = 7 * 24 * 3600
+CLASSIFIER_CACHE_MAX_ENTRIES = 50000
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a user query: lowercased, whitespace collapsed, trailing punctuation dropped."""
+    return " ".join(query.lower().split()).rstrip(" ?.!")
+
+
+class ClassifierCache:
+    """Persistent sqlite cache of parsed query_classifier outputs.
+
+    Entries are keyed by (prompt version, normalised query) and expire after ttl seconds.
+    When the table grows past max_entries, the least recently used tenth is dropped. One
+    connection is shared under a lock, in WAL mode without fsync on commit, so a hit is a
+    single indexed lookup plus json.loads.
+    """
+
+    def __init__(self,
+                 path: str = CLASSIFIER_CACHE_PATH,
+                 ttl: float = CLASSIFIER_CACHE_TTL,
+                 max_entries: int = CLASSIFIER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classifier_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS classifier_cache_accessed ON classifier_cache (accessed)")
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM classifier_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE classifier_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classifier_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM classifier_cache WHERE created < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM classifier_cache").fetchone()[0]
+        if count > self.max_entries:
+            drop = count - self.max_entries + self.max_entries // 10
+            self._conn.execute(
+                "DELETE FROM classifier_cache WHERE key IN"
+                " (SELECT key FROM classifier_cache ORDER BY accessed LIMIT ?)", (drop,)
+            )
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM classifier_cache WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM classifier_cache").fetchone()[0]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,187 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pantry_index import canonical_ingredient
+from instruction_summaries import get_summaries, SUMMARY_DIR
+
+CONTEXT_BLOCKS_DIR = "./context_blocks"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# gemma3's tokenizer is not available to tiktoken; cl100k_base counts are a close proxy
+TOKEN_ENCODING = "cl100k_base"
+# Recipes whose title words + canonical ingredients overlap at least this much (Jaccard)
+# with a recipe already in the context are dropped as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Longer instruction lists are cut to their first steps so one recipe cannot crowd out the rest
+CONTEXT_MAX_STEPS = 12
+BLOCK_SEPARATOR = "\n\n"
+# Use instruction summaries (python instruction_summaries.py) instead of full step lists when available
+CONTEXT_USE_SUMMARIES = os.getenv("CONTEXT_USE_SUMMARIES", "1") == "1"
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """tiktoken encoding, or False when it cannot be loaded (e.g. no network to fetch the BPE file)."""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as e:
+                    print(f"⚠️ Could not load tiktoken '{TOKEN_ENCODING}' ({e}); estimating 4 characters per token")
+                    _encoder = False
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text))
+    return (len(text) + 3) // 4
+
+
+def render_context_block(recipe: Dict, summary: Optional[str] = None) -> Dict:
+    """Pre-rendered prompt block of a recipe, split so instructions can be truncated by arithmetic.
+
+    The full block lists title, URL, ingredients, instructions and nutrition per 100g (with
+    `summary` as a single line in place of the steps); token counts are stored per part
+    (each step including its newline) and for the whole block.
+    """
+    ingredients = [f"- {ing['text']}" for ing in recipe.get("ingredients", []) if "text" in ing]
+    if summary:
+        steps = [f"- {summary}"]
+    else:
+        steps = [f"- {step['text']}" for step in recipe.get("instructions", []) if "text" in step]
+    nutritions = recipe.get("nutr_values_per100g") or {}
+
+    head = "\n".join([
+        f"Title: {recipe.get('title', 'Untitled')}",
+        f"URL: {recipe.get('url', '')}",
+        "",
+        "Ingredients:",
+        "\n".join(ingredients),
+        "",
+        "Instructions (summary):" if summary else "Instructions:",
+    ])
+    tail = "\n".join([
+        "Nutrition (per 100g):",
+        "\n".join(f"- {key}: {value:.2f} /100g" for key, value in nutritions.items()),
+    ])
+    signature = set(re.findall(r"[a-z0-9]+", recipe.get("title", "").lower()))
+    signature |= {canonical_ingredient(i["text"]) for i in recipe.get("ingredients", []) if i.get("text")}
+    signature.discard("")
+
+    block = {
+        "id": recipe.get("id", ""),
+        "head": head,
+        "steps": steps,
+        "tail": tail,
+        "head_tokens": count_tokens(head + "\n"),
+        "step_tokens": [count_tokens(step + "\n") for step in steps],
+        "tail_tokens": count_tokens(tail),
+        "signature": sorted(signature),
+    }
+    block["tokens"] = count_tokens(_render(block, len(steps)))
+    return block
+
+
+def render_context_blocks(recipes):
+    for recipe in recipes:
+        yield render_context_block(recipe)
+
+
+def get_context_blocks(recipes: List[Dict],
+                       json_path: str = "./recipes.json",
+                       blocks_dir: str = CONTEXT_BLOCKS_DIR,
+                       use_summaries: bool = CONTEXT_USE_SUMMARIES,
+                       summary_dir: str = SUMMARY_DIR) -> List[Dict]:
+    """Blocks for recipes: read from the ingest-time pack when it is fresh, rendered on the fly otherwise.
+
+    Recipes with an instruction summary of their current instructions get a block rendered
+    around the summary instead.
+    """
+    # recipe_store imports data_preprocessing, which imports this module for ingest
+    from recipe_store import load_recipes_by_ids, pack_is_fresh
+
+    ids = [r.get("id", "") for r in recipes]
+    summaries = get_summaries(recipes, summary_dir) if use_summaries else {}
+    stored = {}
+    if pack_is_fresh(blocks_dir, json_path):
+        stored = {b["id"]: b for b in load_recipes_by_ids([i for i in ids if i not in summaries], pack_dir=blocks_dir)}
+    return [render_context_block(r, summaries[i]) if i in summaries else stored.get(i) or render_context_block(r)
+            for r, i in zip(recipes, ids)]
+
+
+def _truncation_marker(n_dropped: int) -> str:
+    return f"- ... ({n_dropped} more steps)\n"
+
+
+def _render(block: Dict, n_steps: int) -> str:
+    steps = block["steps"][:n_steps]
+    marker = _truncation_marker(len(block["steps"]) - n_steps) if n_steps < len(block["steps"]) else ""
+    body = "".join(step + "\n" for step in steps) + marker
+    return block["head"] + "\n" + body + block["tail"]
+
+
+def pack_context(blocks: List[Dict],
+                 budget: int = CONTEXT_TOKEN_BUDGET,
+                 duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                 max_steps: int = CONTEXT_MAX_STEPS) -> Tuple[str, Dict]:
+    """Fill a token budget with recipe blocks in rank order.
+
+    Near-duplicates of an already packed recipe are dropped. A block with more than
+    max_steps instructions, or that does not fit whole, keeps its title, ingredients and
+    nutrition and as many leading instruction steps as fit (at most max_steps), with a
+    "... (n more steps)" line; the top-ranked recipe is always kept
+    in that shortened form even if it alone exceeds the budget. Returns the context and
+    a report with tokens saved against packing every block in full.
+    """
+    separator_tokens = count_tokens(BLOCK_SEPARATOR)
+    parts, kept_signatures = [], []
+    used = 0
+    report = {"recipes_in": len(blocks), "recipes_used": 0, "duplicates_dropped": 0, "truncated": 0,
+              "over_budget_dropped": 0, "budget": budget}
+    report["tokens_full"] = sum(b["tokens"] for b in blocks) + separator_tokens * max(len(blocks) - 1, 0)
+
+    seen_ids = set()
+    for block in blocks:
+        signature = set(block["signature"])
+        if block["id"] in seen_ids or any(
+                len(signature & other) / max(len(signature | other), 1) >= duplicate_threshold
+                for other in kept_signatures):
+            report["duplicates_dropped"] += 1
+            continue
+
+        remaining = budget - used - (separator_tokens if parts else 0)
+        if len(block["steps"]) <= max_steps and block["tokens"] <= remaining:
+            n_steps = len(block["steps"])
+            cost = block["tokens"]
+        else:
+            # longest prefix of steps that fits next to head, tail and the truncation marker
+            fixed = block["head_tokens"] + block["tail_tokens"] + count_tokens(_truncation_marker(len(block["steps"])))
+            step_costs = np.cumsum([0] + block["step_tokens"])
+            n_steps = min(int(np.searchsorted(step_costs, remaining - fixed, side="right")) - 1, max_steps)
+            if n_steps < 0:
+                if parts:
+                    report["over_budget_dropped"] += 1
+                    continue
+                n_steps = 0
+            cost = fixed + int(step_costs[n_steps])
+            report["truncated"] += 1
+
+        parts.append(_render(block, n_steps))
+        used += cost + (separator_tokens if len(parts) > 1 else 0)
+        kept_signatures.append(signature)
+        seen_ids.add(block["id"])
+
+    report["recipes_used"] = len(parts)
+    report["tokens_packed"] = used
+    report["tokens_saved"] = report["tokens_full"] - used
+    return BLOCK_SEPARATOR.join(parts), report
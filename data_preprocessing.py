@@ -1,80 +1,113 @@
 import json
-from typing import List, Dict
+import zlib
+import numpy as np
+from typing import List, Dict, Iterable, Optional
 from langchain_chroma import Chroma
 from langchain.docstore.document import Document
 from langchain_huggingface import HuggingFaceEmbeddings # 使用huggingface而不用openai，这样可以直接把模型下载到本地使用，不用call api
 import os
 import shutil
-from typing import Dict, List
-from langchain_core.prompts import PromptTemplate
-from transformers import pipeline
-from tqdm import tqdm
-from langchain_huggingface import HuggingFacePipeline
 from dotenv import load_dotenv
+from nutrition_index import build_nutrition_index, nutrition_metadata, NUTRITION_INDEX_DIR
+from pantry_index import build_pantry_index, PANTRY_INDEX_DIR
+from lexical_index import build_lexical_index, LEXICAL_INDEX_DIR
+from context_packing import render_context_blocks, CONTEXT_BLOCKS_DIR
+from index_publish import publish, staging_dir
+from vector_backends import build_backend, backend_dir, backend_meta, export_chroma_collection, VECTOR_BACKEND_DIR
+from ingest_stream import RecipeStream, INGEST_BATCH_SIZE
+from ingest_engine import EncoderPool, select_device, write_pipelined
+from ingest_manifest import IngestManifest, collection_version, document_id, document_id_batches, MANIFEST_FILE
+from embedding_cache import ContentEmbeddingStore, EMBEDDING_STORE_DIR
+
+RECIPE_PACK_DIR = "./recipe_pack"
 
 #调优：encoder现在用的是HuggingFaceEmbeddings，可能可以换一下试试？
-#加速：batch embedding, batch write to chroma db
 #threshold：test用，最后需要去掉
 #计时
 
-def summarize_instructions(recipes, path):
-    summarization_prompt = PromptTemplate.from_template("""
-        You are a recipe assistant. Your job is to summarize the following recipe instructions.
-
-        Focus on:
-        - The main **cooking methods**
-        - Important **kitchen tools**
-        - Key preparation or serving steps
-
-        Instructions:
-        {instructions}
-
-        Return a concise summary that highlights the above elements.
-        """)
-    
-    # Set up HuggingFace summarizer model 
-    # device = 0, run gpu
-    flan_pipeline = pipeline("text2text-generation", model="google/flan-t5-base", device=0, max_length=128)
-
-    # Wrap it for LangChain compatibility
-    flan_llm = HuggingFacePipeline(pipeline=flan_pipeline)
-    chain = summarization_prompt | flan_llm
-    
-    summaries = []
-    for recipe in tqdm(recipes):
-        raw_steps = " ".join([step["text"] for step in recipe.get("instructions", [])])
-        if not raw_steps.strip():
-            continue
-
-        try:
-            summary = chain.invoke(input={"instructions": raw_steps})
-            summaries.append({
-                "id": recipe.get("id", ""),
-                "summary": summary
-            })
-        except Exception as e:
-            print(f"❌ Failed for {recipe.get('id')}: {e}")
-
-    # Save to JSON
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(summaries, f, ensure_ascii=False, indent=2)
-
-    print(f"✅ Saved {len(summaries)} summaries to {path}")
-
-def load_or_create_vectorstore(docs, embeddings, persist_dir):
-    if os.path.exists(os.path.join(persist_dir, "chroma.sqlite3")):
-        print(f"✅ Loading existing vectorstore from: {persist_dir}")
+def load_or_create_vectorstore(recipes: Iterable[Dict], mode, embeddings, persist_dir, encoder: EncoderPool,
+                               batch_size=INGEST_BATCH_SIZE, label="documents", prune=True,
+                               embedding_store: Optional[ContentEmbeddingStore] = None):
+    """Bring the `mode` collection in persist_dir up to date with recipes, incrementally.
+
+    The ingest manifest next to the collection holds a content hash per recipe and per
+    document: only new or changed documents are encoded and upserted (under deterministic
+    ids), each batch is committed to the manifest once it is in Chroma so an interrupted
+    run resumes where it stopped, and with `prune` documents of removed recipes are deleted.
+    Texts already in embedding_store are not encoded again.
+    """
+    if (os.path.exists(os.path.join(persist_dir, "chroma.sqlite3"))
+            and not os.path.exists(os.path.join(persist_dir, MANIFEST_FILE))):
+        # built before the manifest existed: its random ids cannot be updated in place
+        print(f"✅ Loading existing vectorstore from: {persist_dir} (no ingest manifest; delete it to rebuild incrementally)")
         return Chroma(
             embedding_function=embeddings,
             persist_directory=persist_dir
         )
-    else:
-        print(f"📚 Creating and saving new vectorstore to: {persist_dir}")
-        return Chroma.from_documents(
-            documents=docs,
-            embedding=embeddings,
-            persist_directory=persist_dir
-        )
+
+    print(f"📚 Updating vectorstore in: {persist_dir}")
+    store = Chroma(embedding_function=embeddings, persist_directory=persist_dir)
+    manifest = IngestManifest(persist_dir)
+    try:
+        docs = manifest.changed_documents(recipes, lambda recipe: collection_documents(recipe, mode))
+        write_pipelined(docs, store, encoder, batch_size=batch_size, label=label,
+                        doc_ids=document_id, on_written=manifest.record_written, cache=embedding_store)
+        manifest.finish(store, prune=prune)
+    finally:
+        manifest.close()
+    return store
+
+def recipe_documents(recipe: Dict):
+    """Title document, ingredients document and per-step instruction documents of one recipe."""
+    title = recipe.get("title", "Untitled")
+
+    raw_ings = recipe.get("ingredients", [])
+
+    # # 只提取各ingredient的第一个单词
+    # # 存在的问题 eg. "candies, semisweet chocolate"
+    first_words = [i["text"].split(",")[0].lower() for i in raw_ings if "text" in i and i["text"]]
+    ingredients = ";".join(sorted(first_words))
+
+    recipe_id = recipe.get("id", "")
+    metadata = { 
+        "id": recipe_id,
+        # flat nutrition fields so nutrient constraints can be pushed into Chroma's `where`
+        **nutrition_metadata(recipe)
+    }
+
+    title_doc = Document(page_content=title, metadata=metadata)
+    ingredients_doc = Document(page_content=ingredients, metadata=metadata)
+
+    # ----- Step-Level Instructions -----
+    instruction_docs = []
+    instruction_texts = [step['text'] for step in recipe.get('instructions', [])]
+    for idx, text in enumerate(instruction_texts):
+        if text.strip():
+            instruction_docs.append(Document(
+                page_content=text.strip(),
+                metadata={
+                    "id": recipe_id,
+                    "step": idx
+                }
+            ))
+
+    # instruction_texts = [step['text'] for step in recipe.get('instructions', [])]
+    # full_instructions = " ".join(instruction_texts)
+    # if full_instructions.strip():  # skip empty
+    #     instruction_docs.append(Document(page_content=full_instructions, metadata=metadata))
+
+    return title_doc, ingredients_doc, instruction_docs
+
+
+def collection_documents(recipe: Dict, mode: str) -> List[Document]:
+    """Documents of one recipe in one collection ("title", "ingredients" or "instructions")."""
+    title_doc, ingredients_doc, instruction_docs = recipe_documents(recipe)
+    if mode == "title":
+        return [title_doc]
+    if mode == "ingredients":
+        return [ingredients_doc]
+    return instruction_docs
+
 
 def prepare_documents(recipes: List[dict]) -> List:
     title_docs = []
@@ -82,39 +115,10 @@ def prepare_documents(recipes: List[dict]) -> List:
     instruction_docs = []
 
     for recipe in recipes:
-        title = recipe.get("title", "Untitled")
-
-        raw_ings = recipe.get("ingredients", [])
-
-        # # 只提取各ingredient的第一个单词
-        # # 存在的问题 eg. "candies, semisweet chocolate"
-        first_words = [i["text"].split(",")[0].lower() for i in raw_ings if "text" in i and i["text"]]
-        ingredients = ";".join(sorted(first_words))
-
-        recipe_id = recipe.get("id", "")
-        metadata = { 
-            "id": recipe_id
-        }
-
-        title_docs.append(Document(page_content=title, metadata=metadata)) 
-        ingredients_docs.append(Document(page_content=ingredients, metadata=metadata))
-
-        # ----- Step-Level Instructions -----
-        instruction_texts = [step['text'] for step in recipe.get('instructions', [])]
-        for idx, text in enumerate(instruction_texts):
-            if text.strip():
-                instruction_docs.append(Document(
-                    page_content=text.strip(),
-                    metadata={
-                        "id": recipe_id,
-                        "step": idx
-                    }
-                ))
-
-        # instruction_texts = [step['text'] for step in recipe.get('instructions', [])]
-        # full_instructions = " ".join(instruction_texts)
-        # if full_instructions.strip():  # skip empty
-        #     instruction_docs.append(Document(page_content=full_instructions, metadata=metadata))
+        title_doc, ingredients_doc, step_docs = recipe_documents(recipe)
+        title_docs.append(title_doc)
+        ingredients_docs.append(ingredients_doc)
+        instruction_docs.extend(step_docs)
 
     return title_docs, ingredients_docs, instruction_docs
 
@@ -126,10 +130,59 @@ def load_recipes_from_json(file_path: str) -> List[Dict]:
     return recipes
 
 
+def build_recipe_pack(recipes: Iterable[Dict],
+                      pack_dir: str = RECIPE_PACK_DIR,
+                      source_path: Optional[str] = None) -> int:
+    """Write recipes into a packed record file plus a sorted id -> offset index.
+
+    records.bin holds zlib-compressed compact JSON records back to back; ids.npy,
+    offsets.npy and lengths.npy are sorted by id so readers can np.load them with
+    mmap_mode="r" and binary-search a single record without parsing the corpus.
+    """
+    tmp_dir = staging_dir(pack_dir)
+
+    ids, offsets, lengths = [], [], []
+    offset = 0
+    with open(os.path.join(tmp_dir, "records.bin"), "wb") as f:
+        for recipe in recipes:
+            record = zlib.compress(json.dumps(recipe, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            f.write(record)
+            ids.append(str(recipe.get("id", "")).encode("utf-8"))
+            offsets.append(offset)
+            lengths.append(len(record))
+            offset += len(record)
+
+    ids = np.array(ids, dtype=bytes)
+    order = np.argsort(ids, kind="stable")
+    np.save(os.path.join(tmp_dir, "ids.npy"), ids[order])
+    np.save(os.path.join(tmp_dir, "offsets.npy"), np.array(offsets, dtype=np.uint64)[order])
+    np.save(os.path.join(tmp_dir, "lengths.npy"), np.array(lengths, dtype=np.uint32)[order])
+
+    # Remember which recipes.json this pack was built from so readers can detect staleness
+    meta = {"format": 1, "count": len(ids), "source_mtime_ns": None, "source_size": None}
+    if source_path is not None:
+        st = os.stat(source_path)
+        meta["source_mtime_ns"], meta["source_size"] = st.st_mtime_ns, st.st_size
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    publish(tmp_dir, pack_dir)
+    print(f"📦 Packed {len(ids)} recipes into {pack_dir} ({offset / 1e6:.1f} MB)")
+    return len(ids)
+
+
 def ingest_to_chroma(json_path="./recipes.json", 
                     persist_dir_title="./chroma_title", 
                     persist_dir_ingredients="./chroma_ingredients",
                     persist_dir_instructions="./chroma_instructions",
+                    pack_dir=RECIPE_PACK_DIR,
+                    nutrition_dir=NUTRITION_INDEX_DIR,
+                    pantry_dir=PANTRY_INDEX_DIR,
+                    lexical_dir=LEXICAL_INDEX_DIR,
+                    context_dir=CONTEXT_BLOCKS_DIR,
+                    backend_root=VECTOR_BACKEND_DIR,
+                    compressed_tier=True,
+                    embedding_store_dir=EMBEDDING_STORE_DIR,
                     threshold=-1):
     """Main pipeline: load -> format -> embed -> save to ChromaDB."""
 
@@ -141,35 +194,73 @@ def ingest_to_chroma(json_path="./recipes.json",
     #         print(f"⚠️ Found existing directory {path}. Removing it before regeneration...")
     #         shutil.rmtree(path)
 
-    recipes = load_recipes_from_json(json_path)
-    if threshold > 0:
-        recipes = recipes[:threshold]
+    # Streamed from disk on every pass; no stage holds the whole corpus
+    recipes = RecipeStream(json_path, limit=threshold)
+
+    print("📦 Packing recipes for mmap lookups...")
+    # A truncated test run must not look like a fresh pack of the full recipes.json
+    build_recipe_pack(recipes, pack_dir, source_path=json_path if threshold <= 0 else None)
 
-    title_docs, ingredients_docs, instructions_docs = prepare_documents(recipes)
+    print("🥗 Building columnar nutrition index...")
+    build_nutrition_index(recipes, nutrition_dir)
 
+    print("🧺 Building pantry ingredient bitsets...")
+    build_pantry_index(recipes, pantry_dir)
+
+    print("🔤 Building BM25 indexes for titles and ingredients...")
+    build_lexical_index(recipes, lexical_dir)
+
+    print("🧮 Pre-rendering prompt context blocks and token counts...")
+    build_recipe_pack(render_context_blocks(recipes), context_dir, source_path=json_path if threshold <= 0 else None)
+
+    device = select_device()
     embeddings = HuggingFaceEmbeddings(
         model_name="sentence-transformers/all-MiniLM-L6-v2",
         cache_folder="./hf_cache",
-        model_kwargs={"device": "cuda"}, ###################### GPU
+        model_kwargs={"device": device},
         encode_kwargs={"batch_size": 128, "normalize_embeddings": True}
     )
 
-    print("📚 Embedding titles...")
-    title_store = load_or_create_vectorstore(title_docs, embeddings, persist_dir_title)
-
-    print("🥬 Embedding ingredients...")
-    ingredients_store = load_or_create_vectorstore(ingredients_docs, embeddings, persist_dir_ingredients)
-
-    print("🥬 Embedding instructions...")
-    instructions_store = load_or_create_vectorstore(instructions_docs, embeddings, persist_dir_instructions)
+    # Ingest-time encoders (one process per core on CPU, in-process on a GPU) behind one text-hash -> vector store shared by all three collections
+    with EncoderPool("sentence-transformers/all-MiniLM-L6-v2", device=device) as encoder, \
+            ContentEmbeddingStore("sentence-transformers/all-MiniLM-L6-v2", embedding_store_dir) as embedding_store:
+        # A truncated test run must not prune the recipes it did not read
+        prune = threshold <= 0
+        print("📚 Embedding titles...")
+        title_store = load_or_create_vectorstore(recipes, "title", embeddings, persist_dir_title,
+                                                 encoder, label="titles", prune=prune,
+                                                 embedding_store=embedding_store)
+
+        print("🥬 Embedding ingredients...")
+        ingredients_store = load_or_create_vectorstore(recipes, "ingredients", embeddings, persist_dir_ingredients,
+                                                       encoder, label="ingredients", prune=prune,
+                                                       embedding_store=embedding_store)
+
+        print("🥬 Embedding instructions...")
+        instructions_store = load_or_create_vectorstore(recipes, "instructions", embeddings, persist_dir_instructions,
+                                                        encoder, label="instruction steps", prune=prune,
+                                                        embedding_store=embedding_store)
+
+    if compressed_tier:
+        stores = {"title": (title_store, persist_dir_title),
+                  "ingredients": (ingredients_store, persist_dir_ingredients),
+                  "instructions": (instructions_store, persist_dir_instructions)}
+        for mode, (store, persist_dir) in stores.items():
+            out_dir = backend_dir("compressed", mode, backend_root)
+            version = collection_version(persist_dir)
+            meta = backend_meta(out_dir)
+            # rebuilt only when the collection was written to since the tier was built
+            if meta is not None and meta.get("source_version") == version:
+                print(f"✅ Compressed {mode} tier is up to date")
+                continue
+            print(f"🗜️ Building compressed (int8 + sign bit) {mode} tier...")
+            id_batches = document_id_batches(persist_dir) if version is not None else None
+            build_backend("compressed", export_chroma_collection(store, id_batches=id_batches), out_dir,
+                          source_version=version)
 
 
 if __name__ == "__main__":
-    with open("./recipes.json", "r", encoding="utf-8") as f:
-        recipes = json.load(f)
-    print(f"一共 {len(recipes)} 条菜谱")
-
     # # ingest_to_chroma(threshold=100) #试运行转换为embeddings
     ingest_to_chroma() # recipes--> embeddings
-    # summarize_instructions(recipes, "./summarized_instructions.json")
+    # Instruction summaries for the prompt context: python instruction_summaries.py
 
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+QUERY_CACHE_SIZE = 4096
+
+
+def normalize_query_text(text: str) -> str:
+    """Cache key of a query string: lowercased, whitespace collapsed, ';'-joined keyword lists sorted.
+
+    "Garlic ; chicken" and "chicken;garlic" share one key. Word order inside a keyword is
+    kept ("chicken soup" != "soup chicken"). The encoder is uncased, so lowercasing does
+    not change the embedding.
+    """
+    keywords = [" ".join(k.split()) for k in text.lower().split(";")]
+    keywords = sorted(set(k for k in keywords if k))
+    return ";".join(keywords)
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings in front of the encoder.
+
+    Values are float32 vectors of the normalised key text. Only cache misses go to the
+    encoder, in one embed_documents batch. With persist_path, the cache is loaded at
+    start-up and written back by save() (an .npz of keys and a vector matrix), and is
+    discarded when it was produced by a different model.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, persist_path: Optional[str] = None, model_name: str = ""):
+        self.max_size = max_size
+        self.persist_path = persist_path
+        self.model_name = model_name
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if persist_path and os.path.exists(persist_path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def embed(self, texts: List[str], encoder) -> List[np.ndarray]:
+        """Embeddings of texts, encoding only the keys that are not cached yet."""
+        keys = [normalize_query_text(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+                elif key not in found:
+                    found[key] = None
+                    self.misses += 1
+                else:
+                    # repeated within the same batch: encoded once
+                    self.hits += 1
+
+        missing = [key for key, vector in found.items() if vector is None]
+        if missing:
+            vectors = np.asarray(encoder.embed_documents(missing), dtype=np.float32).reshape(len(missing), -1)
+            with self._lock:
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._put(key, vector)
+        return [found[key] for key in keys]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write the cache (least recently used first) next to path, then rename into place."""
+        path = path or self.persist_path
+        if not path:
+            return
+        with self._lock:
+            keys = list(self._entries)
+            vectors = np.stack(list(self._entries.values())) if keys else np.zeros((0, 0), dtype=np.float32)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), vectors=vectors,
+                 meta=np.array(json.dumps({"model": self.model_name})))
+        os.replace(tmp_path, path)
+        print(f"💾 Saved {len(keys)} query embeddings to {path}")
+
+    def load(self, path: Optional[str] = None) -> int:
+        path = path or self.persist_path
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("model") != self.model_name:
+                    print(f"⚠️ Ignoring query embedding cache {path}: built with '{meta.get('model')}'")
+                    return 0
+                keys, vectors = data["keys"], data["vectors"].astype(np.float32)
+        except Exception as e:
+            print(f"⚠️ Could not load query embedding cache {path}: {e}")
+            return 0
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._put(str(key), vector)
+        return len(keys)
+
+
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "./embedding_store")
+# New vectors are merged into the sorted on-disk key index every this many additions
+STORE_FLUSH_EVERY = 100_000
+
+
+_INDEX_DTYPE = np.dtype([("key", "S16"), ("row", np.int64)])
+
+
+class ContentEmbeddingStore:
+    """Content-addressed document embeddings on disk: text hash -> float32 vector.
+
+    One store per encoder model, shared by the title, ingredient and instruction
+    collections and kept across rebuilds, so each distinct string ("Serve.", a common
+    title, an ingredient list) is encoded and stored once. vectors.f32 is an append-only
+    row matrix read through np.memmap; index.npy holds the sorted 16-byte blake2b keys with
+    their rows, searched with np.searchsorted. The index is also the row count: it is
+    replaced in one os.replace, so keys and count always belong to the same flush. Keys
+    added since the last flush live in a dict; rows appended after the last flush are
+    dropped on open, since their keys were never indexed.
+    """
+
+    def __init__(self, model_name: str, root: str = EMBEDDING_STORE_DIR):
+        self.model_name = model_name
+        self.dir = os.path.join(root, model_name.replace("/", "__"))
+        os.makedirs(self.dir, exist_ok=True)
+        self._vectors_path = os.path.join(self.dir, "vectors.f32")
+        self._index_path = os.path.join(self.dir, "index.npy")
+        meta_path = os.path.join(self.dir, "meta.json")
+        meta = {"model": model_name, "dim": None}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        self.dim = meta["dim"]
+        if self.dim is not None and os.path.exists(self._index_path):
+            self._load_index()
+        else:
+            self._keys, self._rows = np.zeros(0, dtype="S16"), np.zeros(0, dtype=np.int64)
+            self.count = 0
+
+        if os.path.exists(self._vectors_path):
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(self.count * (self.dim or 0) * 4)
+        self._new: Dict[bytes, int] = {}
+        self._file = open(self._vectors_path, "ab")
+        self._map = None
+
+    def _load_index(self) -> None:
+        index = np.load(self._index_path, mmap_mode="r")
+        self._keys, self._rows = index["key"], index["row"]
+        # every flushed row is indexed exactly once, so the index length is the committed count
+        self.count = len(index)
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def __len__(self) -> int:
+        return self.count + len(self._new)
+
+    def lookup(self, keys: List[bytes]) -> np.ndarray:
+        """Row of every key, -1 where the text has not been embedded yet."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._keys) and keys:
+            query = np.array(keys, dtype="S16")
+            pos = np.minimum(np.searchsorted(self._keys, query), len(self._keys) - 1)
+            found = self._keys[pos] == query
+            rows[found] = self._rows[pos[found]]
+        if self._new:
+            for i, key in enumerate(keys):
+                if rows[i] < 0:
+                    rows[i] = self._new.get(key, -1)
+        return rows
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors of the given rows (all must exist), copied out of the memory map."""
+        if len(rows) == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._map is None or len(self._map) <= rows.max():
+            self._file.flush()
+            self._map = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(len(self), self.dim))
+        return np.array(self._map[rows])
+
+    def add(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        first = len(self)
+        self._file.write(vectors.tobytes())
+        for offset, key in enumerate(keys):
+            self._new[key] = first + offset
+        if len(self._new) >= STORE_FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """Merge new keys into the sorted index, committing them and the row count together."""
+        if not self._new:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        meta_path = os.path.join(self.dir, "meta.json")
+        if not self.count:
+            # the dimension never changes, so it is written once, before any row is committed
+            tmp_path = meta_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self.dim}, f)
+            os.replace(tmp_path, meta_path)
+        index = np.empty(self.count + len(self._new), dtype=_INDEX_DTYPE)
+        index["key"] = np.concatenate([np.asarray(self._keys), np.array(list(self._new), dtype="S16")])
+        index["row"] = np.concatenate([np.asarray(self._rows),
+                                       np.fromiter(self._new.values(), dtype=np.int64, count=len(self._new))])
+        index.sort(order="key", kind="stable")
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, index)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._index_path)
+        self._load_index()
+        self._new = {}
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self) -> Dict:
+        return {"vectors": len(self), "dim": self.dim, "megabytes": len(self) * (self.dim or 0) * 4 / 1e6}
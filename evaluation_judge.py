@@ -118,7 +118,8 @@ def run_evaluation():
         print(f"\n=== Test Case {i} ===")
         print(f"Query: {query}\n")
 
-        rag_resp = generate_response(query)
+        # Judge fresh generations, not answers cached for similar earlier queries
+        rag_resp = generate_response(query, use_cache=False)
         llm_resp = generate_no_rag_response(query)
 
         print("\n--- RAG Response ---\n")
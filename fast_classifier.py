@@ -0,0 +1,358 @@
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from lexical_index import get_lexical_index, tokenize
+from pantry_index import get_pantry_index, ingredient_tokens
+
+# Below this confidence query_classifier falls back to the LLM
+FAST_PATH_MIN_CONFIDENCE = 0.8
+# Ingredient names used by fewer recipes are too noisy to match query words against
+MIN_INGREDIENT_DF = 3
+MIN_TITLE_DF = 2
+# Longer queries are rarely "trivially structured"
+MAX_FAST_PATH_WORDS = 16
+
+NUTRIENT_WORDS = {
+    "calorie": "energy", "calories": "energy", "kcal": "energy", "energy": "energy",
+    "fat": "fat", "fats": "fat",
+    "protein": "protein",
+    "salt": "salt", "sodium": "salt",
+    "saturated fat": "saturates", "saturates": "saturates",
+    "sugar": "sugars", "sugars": "sugars",
+}
+_NUTRIENT_RE = "|".join(sorted((re.escape(w) for w in NUTRIENT_WORDS), key=len, reverse=True))
+_LOW_WORDS = {"low", "lower", "less", "reduced", "light", "lean"}
+_PREFERENCE = re.compile(rf"\b(low|lower|less|reduced|light|lean|high|higher|more|rich in)[\s-]+({_NUTRIENT_RE})\b")
+_FREE_OF_NUTRIENT = re.compile(rf"\b({_NUTRIENT_RE})[\s-]free\b")
+_LIMIT = re.compile(
+    rf"\b(under|below|less than|fewer than|at most|over|above|more than|at least)\s+(\d+(?:\.\d+)?)\s*"
+    rf"(?:g|grams?)?\s*(?:of\s+)?({_NUTRIENT_RE})\b"
+)
+_LIMIT_OPS = {"under": "<", "below": "<", "less than": "<", "fewer than": "<", "at most": "<=",
+              "over": ">", "above": ">", "more than": ">", "at least": ">="}
+
+# A new request after a negation ("I hate onions and I want curry") ends the negated clause
+_NEW_REQUEST = r"\bi\s+(?:want|need|would like)\b|\bi'd like\b|\bgive me\b|\bshow me\b|\blooking for\b"
+_NEGATION = re.compile(
+    r"\b(without|exclude|excluding|except|free of|allergic to|avoid|avoiding|hate|"
+    r"(?:do|does|don't|doesn't|do not|does not|can't|cannot)\s+(?:not\s+)?(?:have|contain|like|eat|want|use|include)|"
+    rf"not|no)\s+(?:any\s+)?(.+?)(?=[.!?;]|\bbut\b|\bwith\b|\busing\b|\bcan you\b|\bplease\b|{_NEW_REQUEST}|$)"
+)
+# Also everyday words ("no idea", "not sure", "without a doubt"); these only negate when a
+# known ingredient or dish word follows them directly
+_WEAK_NEGATIONS = {"no", "not", "without"}
+_FREE_OF = re.compile(r"\b([a-z]+)[\s-]free\b")
+
+# Phrases that frame the request but carry no retrieval keywords
+_FILLER = re.compile(
+    r"\b(?:i\s+(?:want|would like|'d like|need)\s+to\s+(?:make|cook|bake|prepare)|i\s+(?:want|would like|need)|"
+    r"(?:can|could)\s+you\s+(?:find|show|give|suggest|recommend)(?:\s+me)?|show\s+me|give\s+me|find\s+me|"
+    r"suggest|recommend|how\s+(?:do\s+i|to|can\s+i)\s+(?:make|cook|bake|prepare)|what\s+can\s+i\s+(?:make|cook)|"
+    r"(?:some|a|an|the|any)\s+|recipes?|dish(?:es)?|meals?|ideas?|for\s+me|please|something|tonight|today)\b"
+)
+_INGREDIENT_FRAME = re.compile(r"\b(?:with|using|use|uses|made\s+(?:of|from|with)|containing|contains|have|from)\b")
+_DISH_FRAME = re.compile(r"\b(?:make|making|cook|bake|prepare|recipes?\s+for)\b")
+_SEGMENT_SPLIT = re.compile(r",|\band\b|&|\bplus\b|\bor\b")
+
+COOKING_METHODS = {
+    "bake", "baked", "baking", "boil", "boiled", "boiling", "fry", "fried", "frying", "deep fry",
+    "deep fried", "stir fry", "stir fried", "grill", "grilled", "grilling", "roast", "roasted",
+    "roasting", "steam", "steamed", "steaming", "braise", "braised", "poach", "poached", "saute",
+    "sauteed", "simmer", "simmered", "slow cook", "slow cooker", "pressure cook", "smoke", "smoked",
+    "microwave", "churn", "blend", "blended",
+}
+_METHOD = re.compile(r"\b(" + "|".join(sorted((re.escape(m) for m in COOKING_METHODS), key=len, reverse=True)) + r")\b")
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "with", "and", "or", "to", "in", "on", "for", "me", "my", "i", "is", "that",
+    "which", "some", "any", "it", "can", "you", "use", "uses", "using", "make", "cook", "want", "like",
+    "have", "made", "from", "containing", "contains", "also", "just", "only", "easy", "quick", "simple",
+    "good", "nice", "best", "delicious", "tasty", "homemade", "am", "im", "are", "be", "would", "could",
+    "should", "what", "this", "will", "let", "lets", "do", "does", "there", "them", "they", "we", "our",
+    "making", "preparing",
+}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text)
+
+
+class FastClassifier:
+    """Rule- and vocabulary-based query classifier that runs without an LLM.
+
+    Ingredients are matched against the canonical ingredient names of the pantry index,
+    dish words against the title vocabulary of the BM25 index, and nutrition preferences,
+    limits, negations and cooking methods with regexes. classify returns the same dict as
+    query_classifier plus a confidence: the share of content words the rules explained.
+    """
+
+    def __init__(self, pantry_index=None, title_index=None):
+        self.pantry_index = pantry_index
+        self.title_index = title_index
+        self._ingredients = set()
+        if pantry_index is not None:
+            df = pantry_index.document_frequencies()
+            self._ingredients = {tuple(ingredient_tokens(name)) for name, n in zip(pantry_index.vocab, df)
+                                 if n >= MIN_INGREDIENT_DF}
+        self._max_ngram = max((len(name) for name in self._ingredients), default=1)
+        self._title_terms = set()
+        if title_index is not None:
+            self._title_terms = {term for term, n in title_index.document_frequencies().items() if n >= MIN_TITLE_DF}
+
+    def _ingredient_spans(self, words: List[str]) -> List[Tuple[int, int]]:
+        """Greedy longest-match (start, end) spans of known ingredient names."""
+        spans, i = [], 0
+        singular = ingredient_tokens(" ".join(words))
+        while i < len(words):
+            for n in range(min(self._max_ngram, len(words) - i), 0, -1):
+                if tuple(singular[i:i + n]) in self._ingredients:
+                    spans.append((i, i + n))
+                    i += n
+                    break
+            else:
+                i += 1
+        return spans
+
+    def _is_title(self, words: List[str]) -> bool:
+        terms = tokenize(" ".join(words))
+        return bool(terms) and all(t in self._title_terms for t in terms)
+
+    def _starts_with_known_term(self, clause: str) -> bool:
+        """Whether the words right after a negation name a known ingredient or dish word."""
+        words = _words(clause)
+        if not words:
+            return False
+        if any(start == 0 for start, _ in self._ingredient_spans(words[:self._max_ngram])):
+            return True
+        return words[0] not in _STOPWORDS and not _FILLER.fullmatch(words[0]) and self._is_title(words[:1])
+
+    def _continues_list(self, part: str) -> bool:
+        """Whether a comma-separated part after a negation only names known ingredients
+        ("without onions, garlic or leeks"), rather than starting the actual request."""
+        items = [item for item in self._split_items(part) if item]
+        return bool(items) and all(self._ingredient_spans(item) == [(0, len(item))] for item in items)
+
+    def _negated_clause(self, clause: str) -> str:
+        """The clause cut at the first comma that does not continue its list of ingredients."""
+        parts = clause.split(",")
+        end = len(parts[0])
+        for part in parts[1:]:
+            if not self._continues_list(part):
+                break
+            end += 1 + len(part)
+        return clause[:end]
+
+    def _split_negations(self, text: str) -> Tuple[str, List[str]]:
+        """(text without its negation clauses, the negated clauses)."""
+        kept, clauses, pos = [], [], 0
+        while True:
+            match = _NEGATION.search(text, pos)
+            if match is None:
+                kept.append(text[pos:])
+                break
+            trigger, clause = match.groups()
+            if trigger in _WEAK_NEGATIONS and not self._starts_with_known_term(clause):
+                # not a negation here; keep the words and look for one further on
+                kept.append(text[pos:match.end(1)])
+                pos = match.end(1)
+                continue
+            clause = self._negated_clause(clause)
+            kept.append(text[pos:match.start()] + " ")
+            clauses.append(clause)
+            pos = match.start(2) + len(clause)
+        text = "".join(kept)
+        return _FREE_OF.sub(" ", text), clauses + _FREE_OF.findall(text)
+
+    def _split_items(self, text: str) -> List[List[str]]:
+        items = [_words(part) for part in _SEGMENT_SPLIT.split(text)]
+        return [[w for w in item if w not in _STOPWORDS] for item in items if item]
+
+    def classify(self, query: str) -> Tuple[Dict, float]:
+        result = {
+            "type": [],
+            "title": {"include": [], "exclude": []},
+            "ingredients": {"include": [], "exclude": []},
+            "instructions": {"include": [], "exclude": []},
+            "nutritions": None,
+            "descending": None,
+            "nutrition_constraints": [],
+        }
+        if not self._ingredients and not self._title_terms:
+            return result, 0.0
+
+        text = " " + " ".join(query.lower().replace("’", "'").split()) + " "
+        n_words = len(_words(text))
+
+        # nutrition limits and preferences
+        for op, value, word in _LIMIT.findall(text):
+            result["nutrition_constraints"].append([NUTRIENT_WORDS[word], _LIMIT_OPS[op], float(value)])
+        text = _LIMIT.sub(" ", text)
+        for level, word in _PREFERENCE.findall(text):
+            result["nutritions"], result["descending"] = NUTRIENT_WORDS[word], level not in _LOW_WORDS
+        text = _PREFERENCE.sub(" ", text)
+        for word in _FREE_OF_NUTRIENT.findall(text):
+            result["nutritions"], result["descending"] = NUTRIENT_WORDS[word], False
+        text = _FREE_OF_NUTRIENT.sub(" ", text)
+
+        # explained / total content words, for the confidence
+        explained, unexplained = 0, 0
+
+        # negations: "without X and Y", "allergic to X", "X-free"
+        text, negated = self._split_negations(text)
+        # an unexplained word in a negation may flip what is excluded, so leave those to the LLM
+        unsure_negation = False
+        for clause in negated:
+            for item in self._split_items(_FILLER.sub(" ", clause)):
+                if not item:
+                    continue
+                if self._ingredient_spans(item) == [(0, len(item))]:
+                    result["ingredients"]["exclude"].append(" ".join(item))
+                    explained += len(item)
+                elif self._is_title(item):
+                    result["title"]["exclude"].append(" ".join(item))
+                    explained += len(item)
+                    # a whole dish is more often the request itself than something to avoid
+                    unsure_negation = unsure_negation or len(item) > 1
+                else:
+                    unexplained += len(item)
+                    unsure_negation = True
+
+        # cooking methods become instruction keywords
+        for method in _METHOD.findall(text):
+            result["instructions"]["include"].append(method)
+            explained += len(method.split())
+        text = _METHOD.sub(" ", text)
+
+        ingredient_frame = bool(_INGREDIENT_FRAME.search(text))
+        dish_frame = bool(_DISH_FRAME.search(text))
+        text = _FILLER.sub(" ", text)
+        # "dessert with strawberries": the dish part comes before the ingredient frame
+        head, tail = (_INGREDIENT_FRAME.split(text, maxsplit=1) if ingredient_frame else [text, ""])
+        head = _DISH_FRAME.sub(" ", head)
+
+        for part, in_ingredient_frame in ((head, False), (tail, True)):
+            items = self._split_items(part)
+            for item in items:
+                if not item:
+                    continue
+                spans = self._ingredient_spans(item)
+                covered = sum(end - start for start, end in spans)
+                whole_ingredient = spans == [(0, len(item))]
+                if whole_ingredient and (in_ingredient_frame or len(items) > 1 or not self._is_title(item)
+                                         or (not dish_frame and ingredient_frame)):
+                    result["ingredients"]["include"].append(" ".join(item))
+                    explained += len(item)
+                elif self._is_title(item):
+                    result["title"]["include"].append(" ".join(item))
+                    explained += len(item)
+                elif covered and in_ingredient_frame:
+                    for start, end in spans:
+                        result["ingredients"]["include"].append(" ".join(item[start:end]))
+                    explained += covered
+                    unexplained += len(item) - covered
+                else:
+                    unexplained += len(item)
+
+        for section in ("title", "ingredients", "instructions"):
+            for key in ("include", "exclude"):
+                result[section][key] = list(dict.fromkeys(result[section][key]))
+            if result[section]["include"] or result[section]["exclude"]:
+                result["type"].append(section)
+        result["ingredients"]["include"] = sorted(result["ingredients"]["include"])
+
+        found = explained + len(result["nutrition_constraints"]) + (result["nutritions"] is not None)
+        if found == 0:
+            return result, 0.0
+        # nutrition-only queries ("high protein") have no content words left and are fully explained
+        confidence = explained / (explained + unexplained) if explained + unexplained else 1.0
+        if n_words > MAX_FAST_PATH_WORDS:
+            confidence *= 0.5
+        if unsure_negation:
+            confidence = min(confidence, FAST_PATH_MIN_CONFIDENCE / 2)
+        return result, confidence
+
+
+_classifier: Optional[Tuple[object, object, FastClassifier]] = None
+_classifier_lock = threading.Lock()
+
+
+def get_fast_classifier() -> FastClassifier:
+    """Shared FastClassifier over the current pantry and title indexes (rebuilt after they are re-built)."""
+    global _classifier
+    pantry_index, title_index = get_pantry_index(), get_lexical_index("title")
+    cached = _classifier
+    if cached is None or cached[0] is not pantry_index or cached[1] is not title_index:
+        with _classifier_lock:
+            cached = _classifier
+            if cached is None or cached[0] is not pantry_index or cached[1] is not title_index:
+                cached = (pantry_index, title_index, FastClassifier(pantry_index, title_index))
+                _classifier = cached
+    return cached[2]
+
+
+def fast_classify(query: str) -> Tuple[Dict, float]:
+    return get_fast_classifier().classify(query)
+
+
+def _jaccard(a: List[str], b: List[str]) -> float:
+    a, b = {x.lower() for x in a}, {x.lower() for x in b}
+    return 1.0 if not a and not b else len(a & b) / len(a | b)
+
+
+def agreement_report(queries: List[str], llm_classify=None, min_confidence: float = FAST_PATH_MIN_CONFIDENCE) -> Dict:
+    """Compare the fast path with the LLM classifier on a list of queries.
+
+    Reports coverage (share of queries the fast path would answer) and, on those
+    queries, how often the type set, per-field keywords and nutrition fields agree.
+    """
+    if llm_classify is None:
+        from query_construction import query_classifier
+
+        def llm_classify(q):
+            return query_classifier(q, use_fast_path=False, log=False)
+
+    rows = []
+    for query in queries:
+        fast, confidence = fast_classify(query)
+        llm = llm_classify(query)
+        row = {
+            "query": query,
+            "confidence": confidence,
+            "type": set(fast["type"]) == set(llm.get("type", [])),
+            "nutrition": (fast["nutritions"], fast["descending"]) == (llm.get("nutritions"), llm.get("descending")),
+        }
+        for section in ("title", "ingredients", "instructions"):
+            for key in ("include", "exclude"):
+                row[f"{section}_{key}"] = _jaccard(fast[section][key], llm.get(section, {}).get(key, []))
+        row["exact"] = row["type"] and row["nutrition"] and all(
+            row[f"{s}_{k}"] == 1.0 for s in ("title", "ingredients", "instructions") for k in ("include", "exclude"))
+        rows.append(row)
+
+    answered = [r for r in rows if r["confidence"] >= min_confidence]
+    metrics = ["type", "nutrition", "exact"] + [f"{s}_{k}" for s in ("title", "ingredients", "instructions")
+                                                 for k in ("include", "exclude")]
+    report = {
+        "queries": len(rows),
+        "coverage": len(answered) / len(rows) if rows else 0.0,
+        "answered": {m: float(np.mean([r[m] for r in answered])) if answered else None for m in metrics},
+        "all": {m: float(np.mean([r[m] for r in rows])) if rows else None for m in metrics},
+        "disagreements": [r["query"] for r in answered if not r["exact"]],
+    }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Agreement of the fast-path classifier with the LLM classifier.")
+    parser.add_argument("queries", help="Query file, one query per line (e.g. ./cache/query_log.txt)")
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = list(dict.fromkeys(line.strip() for line in f if line.strip()))[:args.limit]
+    print(json.dumps(agreement_report(queries), indent=2))
@@ -1,50 +1,20 @@
 from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
-from retriever import retrieve_full_recipes
+from retriever import retrieve_full_recipes, get_executor
 import os
-from data_preprocessing import load_recipes_from_json
-from query_construction import query_classifier
+from query_construction import query_classifier, empty_classification
+from hedged_classifier import ClassificationError
 from ollama import chat, Client
+from context_packing import get_context_blocks, pack_context, CONTEXT_TOKEN_BUDGET
+from response_cache import get_response_cache, response_signature
+from resources import get_registry
+import json, re, time
 
 load_dotenv()
 
-def build_context_from_recipe_json(recipe):
-    title = recipe.get("title", "Untitled")
-    url = recipe.get("url", "")
-    ingredients = recipe.get("ingredients", [])
-    instructions = recipe.get("instructions", [])
-    nutritions = recipe.get("nutr_values_per100g", [])
-
-    # Format ingredients list
-    ingredient_texts = [
-        f"- {ing['text']}" for ing in ingredients if "text" in ing
-    ]
-
-    # Format instructions list
-    instruction_texts = [
-        f"- {step['text']}" for step in instructions if "text" in step
-    ]
-
-    # Format nutritions list
-    nutrition_texts = [
-        f"- {key}: {value:.2f} /100g" for key, value in nutritions.items()
-    ]
-
-    context_parts = [
-        f"Title: {title}",
-        f"URL: {url}",
-        "",
-        "Ingredients:",
-        "\n".join(ingredient_texts),
-        "",
-        "Instructions:",
-        "\n".join(instruction_texts),
-        "Nutrition (per 100g):",
-        "\n".join(nutrition_texts)
-    ]
-
-    return "\n".join(context_parts)
+GENERATOR_MODEL = "gemma3:latest"
+GENERATION_LOG_PATH = os.getenv("GENERATION_LOG_PATH", "./cache/generation_latency.jsonl")
 
 def extract_exclude_fields(query_dict):
     exclude_items = []
@@ -94,16 +64,40 @@ def is_query_long(query: str, threshold: int = 25):
     else:
         return False
     
-def generate_response(query, path="./recipes.json"):
-    query_classified = query_classifier(query)
-    
-    # Retrieving
-    retrieved_docs = retrieve_full_recipes(query_classified, path)
-
-    #Format recipes
-    context = "\n\n".join([
-        build_context_from_recipe_json(recipe) for recipe in retrieved_docs
-    ])
+def extract_recipe_title(text):
+    """Recipe title from (possibly partial) generated text, once its line is complete; else None."""
+    title_match = re.search(r'(?:Recipe Title:|Title:)\s*([^\n]+)\n', text, re.IGNORECASE)
+    if not title_match:
+        return None
+    title = title_match.group(1).strip().strip("*").strip()
+    return title or None
+
+
+def log_generation_metrics(metrics, path=GENERATION_LOG_PATH):
+    """Print the latency breakdown of one generation and append it to the JSON-lines log."""
+    print(f"⏱️ Retrieval {metrics['retrieval_s']:.2f}s, time to first token {metrics['ttft_s']:.2f}s "
+          f"(model {metrics['model_ttft_s']:.2f}s), total {metrics['total_s']:.2f}s, {metrics['chunks']} chunks")
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(metrics) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write generation log: {e}")
+
+
+def build_generation_prompt(query, query_classified, path="./recipes.json", speculative_search=None,
+                            context_budget=CONTEXT_TOKEN_BUDGET):
+    """Retrieve and format for a classified query: the full prompt for the generator."""
+    # Retrieving (through the shared, process-resident recipe store)
+    retrieved_docs = retrieve_full_recipes(query_classified, path, speculative=speculative_search)
+
+    # Format recipes: pre-rendered blocks packed into the token budget in rank order
+    context, packing = pack_context(get_context_blocks(retrieved_docs, path), budget=context_budget)
+    print(f"🧮 Context: {packing['tokens_packed']}/{packing['tokens_full']} tokens "
+          f"(saved {packing['tokens_saved']}; {packing['recipes_used']}/{packing['recipes_in']} recipes, "
+          f"{packing['duplicates_dropped']} near-duplicates dropped, {packing['truncated']} truncated)")
 
     # Print retrieved documents
     print(context)
@@ -261,16 +255,92 @@ def generate_response(query, path="./recipes.json"):
 
     # Send to Ollama's Gemma model
     # Transfer the gen_prompt to string 
-    prompt = gen_prompt.format(query=query, context=context, exclude_items=exclude_items)
-    response = chat(
-        model="gemma3:latest",
+    return gen_prompt.format(query=query, context=context, exclude_items=exclude_items)
+
+
+def generate_response_stream(query, path="./recipes.json", speculative=True, metrics=None, use_cache=True):
+    """Yield the generated recipe as text chunks while Ollama produces them.
+
+    After classification the semantic response cache is consulted: a stored generation
+    for a near-identical query with the same exclusions and nutrition intent is returned
+    without retrieval or a model call. Otherwise a completed stream is stored. If no
+    classifier answers in time, the query gets the general (no recipes found) prompt and
+    bypasses the cache. Time to first token (from the request and from the model call),
+    total time and chunk count are logged when the stream ends, and written into
+    `metrics` if given.
+    """
+    metrics = metrics if metrics is not None else {}
+    start = time.perf_counter()
+
+    # Search titles/ingredients with the raw query while the classifier runs
+    speculative_search = get_executor().speculate(query) if speculative else None
+    try:
+        query_classified = query_classifier(query)
+    except ClassificationError as e:
+        print(f"⚠️ Classification failed ({e}); answering with the general prompt")
+        query_classified = empty_classification()
+        # a general answer must not be served later for this query's real intent
+        use_cache = False
+
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        # The raw query is embedded by the speculative search as well; this is a cache hit
+        query_vector = get_registry().embed_queries([query])[0]
+        signature = response_signature(query_classified, namespace=f"{GENERATOR_MODEL}|long={is_query_long(query)}")
+        cached = cache.lookup(query_vector, signature)
+        if cached is not None:
+            response, similarity = cached
+            elapsed = time.perf_counter() - start
+            metrics.update({"query": query, "model": GENERATOR_MODEL, "cached": True, "similarity": similarity,
+                            "retrieval_s": elapsed, "ttft_s": elapsed, "model_ttft_s": 0.0, "total_s": elapsed,
+                            "chunks": 1})
+            stats = cache.stats()
+            print(f"💾 Response cache hit (similarity {similarity:.3f}); hit rate {stats['hit_rate']:.0%}, "
+                  f"{stats['seconds_saved']:.1f}s of generation saved")
+            log_generation_metrics(metrics)
+            yield response
+            return
+
+    prompt = build_generation_prompt(query, query_classified, path, speculative_search)
+    model_start = time.perf_counter()
+    metrics.update({"query": query, "model": GENERATOR_MODEL, "cached": False,
+                    "retrieval_s": model_start - start, "chunks": 0})
+
+    stream = chat(
+        model=GENERATOR_MODEL,
         messages=[{"role": "user", "content": prompt}],
-        options={"temperature": 0.0}
+        options={"temperature": 0.0},
+        stream=True
     )
+    parts = []
+    for part in stream:
+        chunk = part['message']['content']
+        if not chunk:
+            continue
+        if metrics["chunks"] == 0:
+            now = time.perf_counter()
+            metrics["ttft_s"] = now - start
+            metrics["model_ttft_s"] = now - model_start
+        metrics["chunks"] += 1
+        parts.append(chunk)
+        yield chunk
+
+    metrics["total_s"] = time.perf_counter() - start
+    metrics.setdefault("ttft_s", metrics["total_s"])
+    metrics.setdefault("model_ttft_s", metrics["total_s"] - metrics["retrieval_s"])
+    log_generation_metrics(metrics)
+    # Only complete generations are stored; a stream abandoned by the caller never gets here
+    if cache is not None and parts:
+        cache.store(query_vector, signature, "".join(parts), metrics["total_s"])
+
+
+def generate_response(query, path="./recipes.json", speculative=True, use_cache=True):
+    """Non-streaming wrapper: the whole generated recipe as one string."""
+    response = "".join(generate_response_stream(query, path, speculative, use_cache=use_cache))
 
     # Print the final answer
-    print(response['message']['content'])
-    return(response['message']['content'])
+    print(response)
+    return response
     
    
 
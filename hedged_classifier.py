@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# Whole-classification budget, and the primary latency percentile after which the hedge fires
+CLASSIFIER_DEADLINE = float(os.getenv("CLASSIFIER_DEADLINE", "8.0"))
+HEDGE_PERCENTILE = float(os.getenv("CLASSIFIER_HEDGE_PERCENTILE", "90"))
+# Hedge delay used until enough primary latencies have been observed
+DEFAULT_HEDGE_DELAY = 1.5
+MIN_LATENCY_SAMPLES = 20
+
+
+class ClassificationError(RuntimeError):
+    """Neither the primary nor the hedged classifier produced valid output before the deadline."""
+
+
+class LatencyTracker:
+    """Sliding window of recent primary latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float, default: float) -> float:
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return default
+            return float(np.percentile(self._samples, q))
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive primary failures and routes traffic to the
+    fallback for `reset_timeout` seconds; then lets one trial request through (half-open)."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether the primary may be called for this request."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            trial_failed, self._trial_in_flight = self._trial_in_flight, False
+            if trial_failed or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.trips += 1
+                self.opened_at = time.monotonic()
+
+
+class HedgedClassifier:
+    """Runs the primary classifier under a deadline, hedging with a fallback classifier.
+
+    `primary` and `fallback` take a query and return (parsed, ok). If the primary has not
+    returned valid output after the HEDGE_PERCENTILE of its recent latencies (or fails
+    earlier), the fallback is started too and the first valid output wins; the loser is
+    cancelled if it has not started, and its result is ignored otherwise (a running HTTP
+    call cannot be interrupted from another thread). While the circuit breaker is open
+    only the fallback is called.
+    """
+
+    def __init__(self,
+                 primary: Callable[[str], Tuple[Dict, bool]],
+                 fallback: Callable[[str], Tuple[Dict, bool]],
+                 deadline: float = CLASSIFIER_DEADLINE,
+                 hedge_percentile: float = HEDGE_PERCENTILE,
+                 breaker: Optional[CircuitBreaker] = None,
+                 max_workers: int = 8):
+        self.primary = primary
+        self.fallback = fallback
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="classifier")
+        self._counts = {"requests": 0, "primary_wins": 0, "hedges_fired": 0, "hedge_wins": 0,
+                        "breaker_routed": 0, "primary_failures": 0, "deadline_misses": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def _timed_primary(self, query: str):
+        start = time.perf_counter()
+        try:
+            parsed, ok = self.primary(query)
+        except Exception as e:
+            print(f"⚠️ Primary classifier failed: {e}")
+            parsed, ok = None, False
+        # only successful latencies define the hedge delay; failures are handled by the breaker
+        if ok:
+            self.latencies.record(time.perf_counter() - start)
+        return parsed, ok
+
+    def _safe_fallback(self, query: str):
+        try:
+            return self.fallback(query)
+        except Exception as e:
+            print(f"⚠️ Fallback classifier failed: {e}")
+            return None, False
+
+    def hedge_delay(self) -> float:
+        return min(self.latencies.percentile(self.hedge_percentile, DEFAULT_HEDGE_DELAY), self.deadline)
+
+    def classify(self, query: str) -> Tuple[Dict, str]:
+        """(parsed output, source) where source is "primary" or "fallback"; raises ClassificationError."""
+        self._count("requests")
+        start = time.monotonic()
+        remaining = lambda: max(self.deadline - (time.monotonic() - start), 0.0)
+
+        if not self.breaker.allow():
+            self._count("breaker_routed")
+            future = self._pool.submit(self._safe_fallback, query)
+            done, _ = wait([future], timeout=remaining())
+            if done and future.result()[1]:
+                return future.result()[0], "fallback"
+            future.cancel()
+            self._count("deadline_misses")
+            raise ClassificationError(f"Fallback classifier gave no valid output within {self.deadline:.1f}s (circuit open)")
+
+        primary = self._pool.submit(self._timed_primary, query)
+        # The breaker learns the primary's outcome even when the hedge wins first;
+        # missing the deadline counts as a failure, whichever happens first is recorded
+        settled = threading.Event()
+
+        def settle(ok: bool) -> None:
+            with self._lock:
+                if settled.is_set():
+                    return
+                settled.set()
+            (self.breaker.record_success if ok else self.breaker.record_failure)()
+
+        primary.add_done_callback(lambda f: settle(not f.cancelled() and f.result()[1]))
+        pending = {primary: "primary"}
+        done, _ = wait([primary], timeout=min(self.hedge_delay(), remaining()))
+        hedge_fired = False
+
+        while True:
+            for future in done:
+                source = pending.pop(future)
+                parsed, ok = future.result()
+                if source == "primary" and not ok:
+                    self._count("primary_failures")
+                if ok:
+                    for loser in pending:
+                        loser.cancel()
+                    self._count("primary_wins" if source == "primary" else "hedge_wins")
+                    return parsed, source
+
+            if not hedge_fired and remaining() > 0:
+                # primary is slow (past the hedge percentile) or already failed
+                hedge_fired = True
+                self._count("hedges_fired")
+                pending[self._pool.submit(self._safe_fallback, query)] = "fallback"
+            if not pending or remaining() <= 0:
+                break
+            done, _ = wait(list(pending), timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+
+        for future, source in pending.items():
+            future.cancel()
+            if source == "primary":
+                settle(False)
+        self._count("deadline_misses")
+        raise ClassificationError(f"No classifier produced valid output within {self.deadline:.1f}s")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        counts.update({
+            "breaker_state": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "hedge_delay_s": self.hedge_delay(),
+        })
+        return counts
@@ -0,0 +1,105 @@
+import os
+import re
+import shutil
+import threading
+from typing import Callable, Dict, Optional
+
+# Pointer file naming the published generation, and the build directory, inside an index directory
+CURRENT_FILE = "CURRENT"
+STAGING_DIR = ".staging"
+# Published generations kept per index: the current one plus the one before it, which
+# readers that resolved the pointer a moment before a publish may still be opening
+KEEP_GENERATIONS = 2
+
+_GENERATION = re.compile(r"v(\d+)")
+
+
+def current_dir(index_dir: str) -> str:
+    """Directory holding the published generation of index_dir.
+
+    index_dir/CURRENT names it; an index built before versioned publishing has no
+    pointer and its files live in index_dir itself.
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return index_dir
+    return os.path.join(index_dir, name)
+
+
+def staging_dir(index_dir: str) -> str:
+    """Fresh, empty index_dir/.staging for a builder to write the next generation into."""
+    tmp_dir = os.path.join(index_dir, STAGING_DIR)
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def publish(tmp_dir: str, index_dir: str, keep: int = KEEP_GENERATIONS) -> str:
+    """Make a finished staging directory the current generation of index_dir.
+
+    The build is renamed to index_dir/v<N>, then index_dir/CURRENT is rewritten with
+    os.replace, which is atomic: a reader resolving the pointer sees either the old or the
+    new generation, never a missing or half-written one. index_dir itself is never
+    replaced, so it can be a bind-mounted volume. Generations older than the newest `keep`
+    are removed, as are the flat files of a pre-versioning build. Returns the new directory.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    generations, legacy = {}, []
+    for entry in os.listdir(index_dir):
+        match = _GENERATION.fullmatch(entry)
+        if match and os.path.isdir(os.path.join(index_dir, entry)):
+            generations[int(match.group(1))] = os.path.join(index_dir, entry)
+        elif entry != CURRENT_FILE and os.path.isfile(os.path.join(index_dir, entry)):
+            legacy.append(os.path.join(index_dir, entry))
+    version = max(generations, default=0) + 1
+    target = os.path.join(index_dir, f"v{version}")
+    os.rename(tmp_dir, target)
+
+    pointer = os.path.join(index_dir, CURRENT_FILE + ".tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(f"v{version}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(index_dir, CURRENT_FILE))
+
+    generations[version] = target
+    for old in sorted(generations)[:-keep] if keep > 0 else []:
+        shutil.rmtree(generations[old], ignore_errors=True)
+    for path in legacy:
+        os.remove(path)
+    return target
+
+
+class IndexCache:
+    """Process-wide loaded indexes, one per index directory, re-loaded after a publish.
+
+    `marker` is a file every complete build writes. get() returns None while it does not
+    exist; otherwise the cached object, re-created with `loader` when index_dir points at a
+    different generation (or the marker was rewritten in place). The loader gets the
+    generation directory, so everything it opens belongs to one build.
+    """
+
+    def __init__(self, loader: Callable[[str], object], marker: str):
+        self._loader = loader
+        self._marker = marker
+        self._loaded: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, index_dir: str) -> Optional[object]:
+        resolved = current_dir(index_dir)
+        try:
+            signature = (resolved, os.stat(os.path.join(resolved, self._marker)).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        key = os.path.abspath(index_dir)
+        cached = self._loaded.get(key)
+        if cached is None or cached[0] != signature:
+            with self._lock:
+                cached = self._loaded.get(key)
+                if cached is None or cached[0] != signature:
+                    cached = (signature, self._loader(resolved))
+                    self._loaded[key] = cached
+        return cached[1]
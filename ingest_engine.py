@@ -0,0 +1,261 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import multiprocessing as mp
+import numpy as np
+
+from ingest_stream import IngestProgress, batched, INGEST_BATCH_SIZE
+from embedding_cache import ContentEmbeddingStore
+
+# "cpu", "cuda" or "mps" to override automatic selection
+INGEST_DEVICE = os.getenv("INGEST_DEVICE") or None
+# Encoder processes on CPU (default: one per core) and torch threads inside each
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or None
+INGEST_THREADS_PER_WORKER = int(os.getenv("INGEST_THREADS_PER_WORKER", "0")) or None
+# Encoded batches waiting to be written; bounds memory while keeping the writer busy
+WRITE_QUEUE_SIZE = 4
+ENCODE_BATCH_SIZE = 128
+
+
+def select_device(preferred: Optional[str] = INGEST_DEVICE) -> str:
+    """`preferred` if set, else cuda, then mps, then cpu, depending on what torch can see."""
+    if preferred:
+        return preferred
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, device: str, threads: int, cache_folder: str, cores) -> None:
+    """Encoder process setup: pin torch (and its OpenMP/MKL pools) to `threads` threads and
+    this worker's cores before the model is loaded."""
+    global _worker_model
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    if cores is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores.get_nowait())
+        except (queue.Empty, OSError):
+            pass
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    _worker_model = SentenceTransformer(model_name, device=device, cache_folder=cache_folder)
+
+
+def _encode(texts: List[str]) -> Tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    vectors = _worker_model.encode(texts, batch_size=ENCODE_BATCH_SIZE, normalize_embeddings=True,
+                                   convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - start
+
+
+class EncoderPool:
+    """Sentence-transformer encoders for ingest, sharded over worker processes on CPU.
+
+    On CPU, `workers` processes each load the model with torch limited to
+    `threads_per_worker` threads (and, where the OS allows, pinned to their own cores),
+    so batches are encoded in parallel without oversubscribing cores. On a GPU one
+    in-process encoder is used; the device already parallelises each batch.
+    """
+
+    def __init__(self,
+                 model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 device: Optional[str] = None,
+                 workers: Optional[int] = INGEST_WORKERS,
+                 threads_per_worker: Optional[int] = INGEST_THREADS_PER_WORKER,
+                 cache_folder: str = "./hf_cache"):
+        self.model_name = model_name
+        self.device = select_device(device)
+        cpus = os.cpu_count() or 1
+        if self.device == "cpu":
+            self.workers = workers or max(cpus // (threads_per_worker or 1), 1)
+            self.threads_per_worker = threads_per_worker or max(cpus // self.workers, 1)
+        else:
+            self.workers, self.threads_per_worker = 1, threads_per_worker or cpus
+        self.cache_folder = cache_folder
+        self._executor = None
+        self._started = False
+        self.encode_seconds = 0.0
+
+    def _start(self) -> None:
+        """Load the model(s) on the first batch, so a run with nothing to encode loads none."""
+        self._started = True
+        initargs = (self.model_name, self.device, self.threads_per_worker, self.cache_folder)
+        if self.workers > 1:
+            context = mp.get_context("spawn")
+            cores = None
+            if hasattr(os, "sched_getaffinity"):
+                available = sorted(os.sched_getaffinity(0))
+                cores = context.Queue()
+                for w in range(self.workers):
+                    share = available[w * self.threads_per_worker:(w + 1) * self.threads_per_worker]
+                    if share:
+                        cores.put(set(share))
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                 initializer=_init_worker, initargs=initargs + (cores,))
+        else:
+            _init_worker(*initargs, None)
+        print(f"🧵 Encoding on {self.device} with {self.workers} worker(s) x {self.threads_per_worker} thread(s)")
+
+    def imap(self, text_batches: Iterable[List[str]]) -> Iterator[np.ndarray]:
+        """Vectors of each text batch, in input order; up to two batches per worker are in flight.
+
+        Empty batches yield an empty array without touching the encoders.
+        """
+        in_flight = deque()
+        for texts in text_batches:
+            if not texts:
+                in_flight.append(None)
+            else:
+                if not self._started:
+                    self._start()
+                in_flight.append(self._executor.submit(_encode, texts) if self._executor else _encode(texts))
+            while len(in_flight) >= (2 * self.workers if self._executor else 1):
+                yield self._collect(in_flight.popleft())
+        while in_flight:
+            yield self._collect(in_flight.popleft())
+
+    def _collect(self, pending) -> np.ndarray:
+        if pending is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors, seconds = pending if isinstance(pending, tuple) else pending.result()
+        self.encode_seconds += seconds
+        return vectors
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_pipelined(docs: Iterable, store, encoder: EncoderPool,
+                    batch_size: int = INGEST_BATCH_SIZE, label: str = "documents",
+                    doc_ids: Optional[Callable] = None, on_written: Optional[Callable] = None,
+                    cache: Optional[ContentEmbeddingStore] = None) -> Dict:
+    """Encode documents in batches and write them to a Chroma store from a background thread.
+
+    While one chunk is being upserted the next ones are already encoding, so sqlite writes
+    overlap with the encoders instead of alternating with them. `doc_ids` maps a document
+    to its Chroma id (random ids by default) and `on_written` is called with every batch
+    once it is stored. With a content-addressed `cache`, only texts it has never seen go to
+    the encoders (each distinct text once, even across batches in flight) and new vectors
+    are added to it. Returns docs/s per stage: encode (texts over summed encoder time,
+    i.e. per worker), write, and end to end, plus how many texts were actually encoded.
+    """
+    # (batch, content keys or None, keys being encoded for this batch) in submission order
+    pending_batches = deque()
+    in_flight_keys = set()
+    encoded = 0
+
+    def text_batches():
+        for batch in batched(docs, batch_size):
+            texts = [d.page_content for d in batch]
+            if cache is None:
+                pending_batches.append((batch, None, None))
+                yield texts
+                continue
+            keys = [cache.key(t) for t in texts]
+            to_encode = {}
+            for key, text, row in zip(keys, texts, cache.lookup(keys)):
+                if row < 0 and key not in in_flight_keys and key not in to_encode:
+                    to_encode[key] = text
+            in_flight_keys.update(to_encode)
+            pending_batches.append((batch, keys, list(to_encode)))
+            yield list(to_encode.values())
+
+    writes = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    write_seconds = 0.0
+    write_error = []
+    progress = IngestProgress(label)
+
+    def writer():
+        nonlocal write_seconds
+        while True:
+            item = writes.get()
+            if item is None:
+                return
+            if write_error:
+                continue
+            batch, vectors = item
+            start = time.perf_counter()
+            try:
+                store._collection.upsert(
+                    ids=[doc_ids(d) if doc_ids else str(uuid.uuid4()) for d in batch],
+                    embeddings=vectors,
+                    metadatas=[d.metadata for d in batch],
+                    documents=[d.page_content for d in batch],
+                )
+                if on_written is not None:
+                    on_written(batch)
+            except Exception as e:
+                write_error.append(e)
+                continue
+            write_seconds += time.perf_counter() - start
+            progress.update(len(batch))
+
+    thread = threading.Thread(target=writer, name="chroma-writer", daemon=True)
+    thread.start()
+    encode_before = encoder.encode_seconds
+    try:
+        for vectors in encoder.imap(text_batches()):
+            if write_error:
+                break
+            batch, keys, encoded_keys = pending_batches.popleft()
+            encoded += len(vectors)
+            if keys is not None:
+                # earlier batches are already in the cache, so repeats in flight resolve here
+                if encoded_keys:
+                    cache.add(encoded_keys, vectors)
+                    in_flight_keys.difference_update(encoded_keys)
+                vectors = cache.vectors(cache.lookup(keys))
+            writes.put((batch, vectors))
+    finally:
+        writes.put(None)
+        thread.join()
+    if write_error:
+        raise write_error[0]
+
+    stats = progress.finish()
+    encode_seconds = encoder.encode_seconds - encode_before
+    stats.update({
+        "encoded": encoded,
+        "encode_docs_per_s": encoded / encode_seconds if encode_seconds else 0.0,
+        "write_docs_per_s": stats["docs"] / write_seconds if write_seconds else 0.0,
+    })
+    print(f"   encode {stats['encode_docs_per_s']:.0f} docs/s per worker x {encoder.workers}, "
+          f"write {stats['write_docs_per_s']:.0f} docs/s, end to end {stats['docs_per_s']:.0f} docs/s")
+    if cache is not None and stats["docs"]:
+        # docs per encoder call; infinite when a rebuild found every text in the store
+        stats["dedup_ratio"] = stats["docs"] / encoded if encoded else float("inf")
+        print(f"🔁 {label}: {encoded} of {stats['docs']} texts encoded, "
+              f"{1 - encoded / stats['docs']:.0%} reused from the embedding store (dedup ratio {stats['dedup_ratio']:.1f}x); "
+              f"store holds {len(cache)} vectors")
+    return stats
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+MANIFEST_FILE = "ingest_manifest.sqlite"
+# Bump when the way recipes are turned into documents changes, so every recipe is re-embedded
+DOCUMENT_FORMAT = 1
+# Recipes whose stored hashes are looked up together
+LOOKUP_BATCH = 500
+# Document ids per page when a collection is read back by id
+EXPORT_BATCH = 5000
+
+
+def recipe_hash(recipe: Dict) -> str:
+    payload = json.dumps(recipe, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(f"{DOCUMENT_FORMAT}\n{payload}".encode("utf-8")).hexdigest()
+
+
+def document_hash(doc) -> str:
+    payload = json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(f"{doc.page_content}\n{payload}".encode("utf-8")).hexdigest()
+
+
+def document_id(doc) -> str:
+    """Deterministic Chroma id: the recipe id, plus the step index for instruction documents."""
+    step = doc.metadata.get("step")
+    return f"{doc.metadata.get('id', '')}:{step}" if step is not None else str(doc.metadata.get("id", ""))
+
+
+class IngestManifest:
+    """Content hashes of what one Chroma collection holds, stored next to it.
+
+    Every recipe and every document carries a content hash and the number of the last run
+    that saw it. A run streams the corpus, skips recipes whose hash is unchanged, yields only
+    new or changed documents for embedding, and records them once their batch has been
+    written (record_written), so a crashed run resumes after its last committed batch.
+    finish() then deletes whatever the completed run did not see.
+    """
+
+    def __init__(self, persist_dir: str):
+        self.path = os.path.join(persist_dir, MANIFEST_FILE)
+        os.makedirs(persist_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS recipes (recipe_id TEXT PRIMARY KEY, hash TEXT NOT NULL, run INTEGER NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY, recipe_id TEXT NOT NULL, hash TEXT NOT NULL, run INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_recipe ON documents (recipe_id)")
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'run'").fetchone()
+        self.run = int(row[0]) + 1 if row else 1
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run', ?)", (str(self.run),))
+        # last doc id of a changed recipe -> (recipe id, hash), recorded once that doc is written
+        self._recipe_on_write: Dict[str, tuple] = {}
+        self.counts = {"recipes_unchanged": 0, "recipes_changed": 0, "docs_unchanged": 0,
+                       "docs_written": 0, "docs_deleted": 0, "recipes_deleted": 0}
+
+    def _query(self, sql: str, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            chunk = keys[start:start + LOOKUP_BATCH]
+            with self._lock:
+                found.update(self._conn.execute(sql.format(marks=",".join("?" * len(chunk))), chunk).fetchall())
+        return found
+
+    def _mark_seen(self, recipe_ids: List[str], doc_ids: List[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE recipes SET run = ? WHERE recipe_id = ?", [(self.run, i) for i in recipe_ids])
+            self._conn.executemany("UPDATE documents SET run = ? WHERE recipe_id = ?", [(self.run, i) for i in recipe_ids])
+            self._conn.executemany("UPDATE documents SET run = ? WHERE doc_id = ?", [(self.run, i) for i in doc_ids])
+            self._conn.execute("COMMIT")
+
+    def changed_documents(self, recipes: Iterable[Dict], to_documents: Callable[[Dict], List]) -> Iterator:
+        """Documents of new or changed recipes whose own hash differs from the stored one."""
+        iterator = iter(recipes)
+        while True:
+            chunk = list(islice(iterator, LOOKUP_BATCH))
+            if not chunk:
+                return
+            ids = [str(r.get("id", "")) for r in chunk]
+            stored = self._query("SELECT recipe_id, hash FROM recipes WHERE recipe_id IN ({marks})", ids)
+            unchanged, changed = [], []
+            for recipe_id, recipe in zip(ids, chunk):
+                h = recipe_hash(recipe)
+                (unchanged if stored.get(recipe_id) == h else changed).append((recipe_id, h, recipe))
+            self.counts["recipes_unchanged"] += len(unchanged)
+            self.counts["recipes_changed"] += len(changed)
+
+            documents = [[(document_id(d), document_hash(d), d) for d in to_documents(recipe)]
+                         for _, _, recipe in changed]
+            stored_docs = self._query("SELECT doc_id, hash FROM documents WHERE doc_id IN ({marks})",
+                                      [i for docs in documents for i, _, _ in docs])
+            seen_docs, to_write, settled = [], [], []
+            for (recipe_id, h, _), docs in zip(changed, documents):
+                fresh = [d for i, dh, d in docs if stored_docs.get(i) != dh]
+                seen_docs += [i for i, dh, _ in docs if stored_docs.get(i) == dh]
+                if fresh:
+                    self._recipe_on_write[document_id(fresh[-1])] = (recipe_id, h)
+                    to_write += fresh
+                else:
+                    settled.append((recipe_id, h))
+            self.counts["docs_unchanged"] += len(seen_docs)
+            self._mark_seen([recipe_id for recipe_id, _, _ in unchanged], seen_docs)
+            if settled:
+                self._record_recipes(settled)
+            yield from to_write
+
+    def _record_recipes(self, recipes: List[tuple]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO recipes (recipe_id, hash, run) VALUES (?, ?, ?)",
+                [(recipe_id, h, self.run) for recipe_id, h in recipes],
+            )
+
+    def record_written(self, docs: List) -> None:
+        """Commit the hashes of a batch that is now in Chroma (called from the writer thread)."""
+        rows = [(document_id(d), str(d.metadata.get("id", "")), document_hash(d), self.run) for d in docs]
+        finished = [self._recipe_on_write.pop(doc_id) for doc_id, _, _, _ in rows if doc_id in self._recipe_on_write]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO documents (doc_id, recipe_id, hash, run) VALUES (?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT OR REPLACE INTO recipes (recipe_id, hash, run) VALUES (?, ?, ?)",
+                                   [(recipe_id, h, self.run) for recipe_id, h in finished])
+            self._mark_changed()
+            self._conn.execute("COMMIT")
+        self.counts["docs_written"] += len(rows)
+
+    def _mark_changed(self) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('changed_run', ?)", (str(self.run),))
+
+    def finish(self, store, prune: bool = True, batch_size: int = 5000) -> Dict:
+        """Delete documents and recipes this (complete) run did not see; returns the run's counts."""
+        if prune:
+            with self._lock:
+                stale = [r[0] for r in self._conn.execute("SELECT doc_id FROM documents WHERE run < ?", (self.run,))]
+                if stale:
+                    # before deleting, so a run that dies halfway still counts as a change
+                    self._mark_changed()
+            for start in range(0, len(stale), batch_size):
+                chunk = stale[start:start + batch_size]
+                store._collection.delete(ids=chunk)
+                with self._lock:
+                    self._conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(i,) for i in chunk])
+            with self._lock:
+                self.counts["recipes_deleted"] = self._conn.execute("DELETE FROM recipes WHERE run < ?", (self.run,)).rowcount
+            self.counts["docs_deleted"] = len(stale)
+        c = self.counts
+        print(f"🧾 Manifest: {c['recipes_unchanged']} recipes unchanged, {c['recipes_changed']} new/changed; "
+              f"{c['docs_written']} documents written, {c['docs_unchanged']} reused, {c['docs_deleted']} deleted")
+        return dict(c)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _read_only(persist_dir: str) -> Optional[sqlite3.Connection]:
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def collection_version(persist_dir: str) -> Optional[int]:
+    """Number of the last run that wrote to or deleted from the collection in persist_dir.
+
+    Derived indexes record it when they are built, so a rerun that changed nothing can
+    skip rebuilding them. None when the collection has no manifest (or was never written).
+    """
+    conn = _read_only(persist_dir)
+    if conn is None:
+        return None
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'changed_run'").fetchone()
+    finally:
+        conn.close()
+    return int(row[0]) if row else None
+
+
+def document_id_batches(persist_dir: str, batch_size: int = EXPORT_BATCH) -> Iterator[List[str]]:
+    """Ids of every document the manifest has committed for persist_dir's collection, in pages.
+
+    Walks the primary key with one cursor, so paging through a collection by these ids
+    costs one indexed lookup per page instead of an OFFSET scan over the skipped rows.
+    """
+    conn = _read_only(persist_dir)
+    if conn is None:
+        return
+    try:
+        cursor = conn.execute("SELECT doc_id FROM documents ORDER BY doc_id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [r[0] for r in rows]
+    finally:
+        conn.close()
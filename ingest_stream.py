@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Bytes read from recipes.json per refill of the parser buffer
+READ_CHUNK_SIZE = 1 << 20
+# Documents embedded and written to Chroma together
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1024"))
+# Seconds between progress lines
+PROGRESS_INTERVAL = 10.0
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(file_path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """Yield the elements of a top-level JSON array one at a time.
+
+    The file is read in chunks and each element is parsed with JSONDecoder.raw_decode as
+    soon as it is complete in the buffer, so memory holds one chunk plus one element
+    rather than the whole corpus.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer, pos, eof = "", 0, False
+
+        def fill() -> bool:
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            return not eof
+
+        def skip(chars: str) -> None:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in chars:
+                    pos += 1
+                if pos < len(buffer) or not fill():
+                    return
+
+        skip(_WHITESPACE)
+        if buffer[pos:pos + 1] != "[":
+            raise ValueError(f"{file_path} does not contain a JSON array")
+        pos += 1
+
+        while True:
+            skip(_WHITESPACE + ",")
+            if pos >= len(buffer):
+                raise ValueError(f"{file_path} ended inside the JSON array")
+            if buffer[pos] == "]":
+                return
+            try:
+                element, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # element continues past the buffer; anything else fails again at EOF
+                if not fill():
+                    raise
+                continue
+            pos = end
+            yield element
+
+
+class RecipeStream:
+    """Re-iterable view of recipes.json: every iteration streams the file from the start.
+
+    Index builders that take several passes (or several builders in a row) each get a
+    fresh incremental parse instead of a list of the whole corpus. `limit` keeps only the
+    first recipes, like ingest_to_chroma's threshold.
+    """
+
+    def __init__(self, file_path: str, limit: Optional[int] = None):
+        self.file_path = file_path
+        self.limit = limit if limit and limit > 0 else None
+
+    def __iter__(self) -> Iterator[Dict]:
+        return islice(iter_json_array(self.file_path), self.limit)
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+class IngestProgress:
+    """Periodic progress lines for a streaming ingest stage: count, throughput, peak RSS."""
+
+    def __init__(self, label: str, total: Optional[int] = None, interval: float = PROGRESS_INTERVAL):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    def update(self, n: int) -> None:
+        self.count += n
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(f"   {self.label}: {self._line(now)}")
+
+    def _line(self, now: float) -> str:
+        elapsed = max(now - self.start, 1e-9)
+        done = f"{self.count}/{self.total}" if self.total else f"{self.count}"
+        rss = peak_rss_mb()
+        rss = f", peak RSS {rss:.0f} MB" if rss is not None else ""
+        return f"{done} docs in {elapsed:.1f}s ({self.count / elapsed:.0f} docs/s{rss})"
+
+    def finish(self) -> Dict:
+        now = time.perf_counter()
+        print(f"✅ {self.label}: {self._line(now)}")
+        elapsed = now - self.start
+        return {"docs": self.count, "seconds": elapsed,
+                "docs_per_s": self.count / elapsed if elapsed else 0.0, "peak_rss_mb": peak_rss_mb()}
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from index_publish import current_dir
+
+SUMMARY_MODEL = "google/flan-t5-base"
+SUMMARY_DIR = "./instruction_summaries"
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "32"))
+# Recipes are sorted by prompt length within windows of this many batches, so each batch
+# pads to similar lengths; larger windows pad less but hold more recipes in memory
+BUCKET_WINDOW = 32
+# Summaries appended to the checkpoint between fsyncs (and progress lines)
+CHECKPOINT_EVERY = 2000
+SUMMARY_MAX_INPUT_TOKENS = 512
+SUMMARY_MAX_NEW_TOKENS = 128
+
+SUMMARY_PROMPT = """
+        You are a recipe assistant. Your job is to summarize the following recipe instructions.
+
+        Focus on:
+        - The main **cooking methods**
+        - Important **kitchen tools**
+        - Key preparation or serving steps
+
+        Instructions:
+        {instructions}
+
+        Return a concise summary that highlights the above elements.
+        """
+
+
+def instructions_text(recipe: Dict) -> str:
+    return " ".join(step["text"] for step in recipe.get("instructions", []) if step.get("text")).strip()
+
+
+def instructions_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class Seq2SeqSummarizer:
+    """flan-t5 (or any seq2seq model) generating a whole batch of prompts per call."""
+
+    def __init__(self, model_name: str = SUMMARY_MODEL, device: Optional[str] = None):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        from ingest_engine import select_device
+
+        self.torch = torch
+        self.device = select_device(device)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir="./hf_cache")
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name, cache_dir="./hf_cache").to(self.device).eval()
+        print(f"📝 Summarizing with {model_name} on {self.device}")
+
+    def token_lengths(self, prompts: List[str]) -> List[int]:
+        encoded = self.tokenizer(prompts, truncation=True, max_length=SUMMARY_MAX_INPUT_TOKENS)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def summarize(self, prompts: List[str]) -> List[str]:
+        inputs = self.tokenizer(prompts, padding="longest", truncation=True,
+                                max_length=SUMMARY_MAX_INPUT_TOKENS, return_tensors="pt").to(self.device)
+        with self.torch.inference_mode():
+            outputs = self.model.generate(**inputs, max_new_tokens=SUMMARY_MAX_NEW_TOKENS, num_beams=1)
+        return [text.strip() for text in self.tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+
+def checkpoint_path(out_dir: str) -> str:
+    # next to the store, which build_recipe_pack replaces wholesale
+    return out_dir.rstrip("/") + ".checkpoint.jsonl"
+
+
+def read_checkpoint(path: str) -> Dict[str, str]:
+    """id -> instructions hash of every summary in the checkpoint; a torn last line is cut off."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r+b") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    for line in data[:complete].splitlines():
+        record = json.loads(line)
+        done[record["id"]] = record["hash"]
+    return done
+
+
+def _checkpoint_records(path: str, keep: Dict[str, int]) -> Iterator[Dict]:
+    """Latest summary per id (a recipe re-summarized after a change appears twice), with its hash."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            record = json.loads(line)
+            if keep.get(record["id"]) == line_no:
+                yield {"id": record["id"], "hash": record["hash"], "summary": record["summary"]}
+
+
+def summarize_instructions(recipes: Iterable[Dict],
+                           out_dir: str = SUMMARY_DIR,
+                           json_path: Optional[str] = None,
+                           batch_size: int = SUMMARY_BATCH_SIZE,
+                           device: Optional[str] = None,
+                           checkpoint_every: int = CHECKPOINT_EVERY,
+                           summarizer: Optional[Seq2SeqSummarizer] = None) -> int:
+    """Summarize recipe instructions in length-bucketed batches into an id-keyed pack.
+
+    Summaries are appended to a JSON-lines checkpoint (fsynced every checkpoint_every
+    summaries); a rerun skips recipes whose instructions are unchanged since they were
+    summarized, so an interrupted run resumes and a corpus refresh only summarizes new or
+    edited recipes. The checkpoint is then compacted into a build_recipe_pack store of
+    {"id", "hash", "summary"} records under out_dir. Returns the number of new summaries.
+    """
+    # data_preprocessing imports context_packing, which reads summaries from this module
+    from data_preprocessing import build_recipe_pack
+    from ingest_stream import IngestProgress
+
+    path = checkpoint_path(out_dir)
+    done = read_checkpoint(path)
+    if done:
+        print(f"↩️ Resuming: {len(done)} summaries already in {path}")
+
+    def pending() -> Iterator[Dict]:
+        for recipe in recipes:
+            text = instructions_text(recipe)
+            if not text:
+                continue
+            recipe_id, digest = str(recipe.get("id", "")), instructions_hash(text)
+            if done.get(recipe_id) != digest:
+                yield {"id": recipe_id, "hash": digest, "prompt": SUMMARY_PROMPT.format(instructions=text)}
+
+    progress = IngestProgress("summaries")
+    written = since_sync = 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        todo = pending()
+        while True:
+            window = list(islice(todo, batch_size * BUCKET_WINDOW))
+            if not window:
+                break
+            summarizer = summarizer or Seq2SeqSummarizer(device=device)
+            lengths = summarizer.token_lengths([item["prompt"] for item in window])
+            window = [item for _, item in sorted(zip(lengths, window), key=lambda pair: pair[0])]
+            for start in range(0, len(window), batch_size):
+                batch = window[start:start + batch_size]
+                for item, summary in zip(batch, summarizer.summarize([item["prompt"] for item in batch])):
+                    f.write(json.dumps({"id": item["id"], "hash": item["hash"], "summary": summary},
+                                       ensure_ascii=False) + "\n")
+                written += len(batch)
+                since_sync += len(batch)
+                progress.update(len(batch))
+                if since_sync >= checkpoint_every:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    since_sync = 0
+    progress.finish()
+
+    # id -> line number of its latest summary
+    keep = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f):
+                keep[json.loads(line)["id"]] = line_no
+    build_recipe_pack(_checkpoint_records(path, keep), out_dir, source_path=json_path)
+    print(f"✅ Saved {len(keep)} summaries to {out_dir} ({written} new)")
+    return written
+
+
+def get_summaries(recipes: Iterable[Dict], summary_dir: str = SUMMARY_DIR) -> Dict[str, str]:
+    """id -> instruction summary for the recipes that have one; empty when no store was built.
+
+    A summary is only returned while it matches the recipe's current instructions, so a
+    recipe edited since the last summarization run gets its full steps instead.
+    """
+    if not os.path.exists(os.path.join(current_dir(summary_dir), "meta.json")):
+        return {}
+    from recipe_store import get_packed_store
+
+    store = get_packed_store(summary_dir)
+    summaries = {}
+    for recipe in recipes:
+        recipe_id = str(recipe.get("id", ""))
+        record = store.get(recipe_id)
+        if record is None or not record.get("summary"):
+            continue
+        if record.get("hash") != instructions_hash(instructions_text(recipe)):
+            continue
+        summaries[recipe_id] = record["summary"]
+    return summaries
+
+
+if __name__ == "__main__":
+    import argparse
+    from ingest_stream import RecipeStream
+
+    parser = argparse.ArgumentParser(description="Summarize recipe instructions into an id-keyed store.")
+    parser.add_argument("--json", default="./recipes.json")
+    parser.add_argument("--out", default=SUMMARY_DIR)
+    parser.add_argument("--batch-size", type=int, default=SUMMARY_BATCH_SIZE)
+    parser.add_argument("--device", default=None, help="cpu, cuda or mps (default: automatic)")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N recipes (test runs)")
+    args = parser.parse_args()
+
+    summarize_instructions(RecipeStream(args.json, limit=args.limit), args.out,
+                           json_path=args.json if not args.limit else None,
+                           batch_size=args.batch_size, device=args.device)
@@ -0,0 +1,217 @@
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from index_publish import IndexCache, current_dir, publish, staging_dir
+
+LEXICAL_INDEX_DIR = "./lexical_index"
+LEXICAL_FIELDS = ("title", "ingredients")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Documents tokenised and spilled to disk together while building
+BM25_BATCH_SIZE = 50000
+
+_STOPWORDS = {
+    "a", "an", "and", "the", "of", "with", "in", "on", "for", "to", "or", "recipe", "recipes",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens with light plural folding and stopwords removed."""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def field_text(recipe: Dict, field: str) -> str:
+    if field == "title":
+        return recipe.get("title", "")
+    if field == "ingredients":
+        return " ".join(i["text"] for i in recipe.get("ingredients", []) if i.get("text"))
+    raise ValueError(f"Unknown lexical field '{field}'. Choose from {list(LEXICAL_FIELDS)}.")
+
+
+def _spill_batch(batch: List[Tuple[str, str]], first_row: int, path: str) -> Tuple[List[str], np.ndarray]:
+    """Term-major postings of one batch of documents to an .npz; returns (terms, their df)."""
+    postings = defaultdict(list)
+    ids, lengths, n_terms = [], [], []
+    for row, (recipe_id, text) in enumerate(batch, start=first_row):
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            postings[term].append((row, tf))
+        ids.append(str(recipe_id).encode("utf-8"))
+        lengths.append(len(tokens))
+        n_terms.append(min(len(counts), 65535))
+    terms = sorted(postings)
+    df = np.array([len(postings[t]) for t in terms], dtype=np.int64)
+    flat = [p for t in terms for p in postings[t]]
+    np.savez(path,
+             rows=np.array([row for row, _ in flat], dtype=np.int32),
+             tf=np.array([tf for _, tf in flat], dtype=np.float32),
+             df=df,
+             lengths=np.array(lengths, dtype=np.float32),
+             ids=np.array(ids, dtype=bytes),
+             n_terms=np.array(n_terms, dtype=np.uint16))
+    return terms, df
+
+
+def build_bm25_index(texts: Iterable[Tuple[str, str]], index_dir: str, batch_size: int = BM25_BATCH_SIZE) -> int:
+    """BM25 index over (recipe_id, text) pairs, stored term-major in CSR form.
+
+    vocab.json   sorted terms; term t owns postings[indptr[t]:indptr[t + 1]]
+    indptr.npy   int64 (V + 1,)
+    rows.npy     int32 document rows of each posting
+    weights.npy  float32 precomputed BM25 weight of each posting (idf * saturated tf)
+    ids.npy      recipe id of each document row
+    terms.npy    uint16 distinct terms per document, for exact-match detection
+
+    Documents are tokenised batch_size at a time and each batch's postings are spilled to
+    disk; a merge pass then scatters them into memory-mapped output arrays. Peak memory is
+    one batch plus the vocabulary (document frequency per term), not the corpus.
+    """
+    tmp_dir = staging_dir(index_dir)
+    spill_dir = os.path.join(tmp_dir, "spill")
+    os.makedirs(spill_dir)
+
+    spills, df, n_docs, total_length, id_width = [], Counter(), 0, 0.0, 1
+    iterator = iter(texts)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+        path = os.path.join(spill_dir, f"{len(spills):06d}.npz")
+        terms, batch_df = _spill_batch(batch, n_docs, path)
+        df.update(dict(zip(terms, batch_df.tolist())))
+        with np.load(path) as spill:
+            total_length += float(spill["lengths"].sum())
+            id_width = max(id_width, spill["ids"].dtype.itemsize)
+        spills.append((path, terms))
+        n_docs += len(batch)
+
+    vocab = sorted(df)
+    term_id = {term: t for t, term in enumerate(vocab)}
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([df[term] for term in vocab])
+    idf = np.log(1.0 + (n_docs - np.diff(indptr) + 0.5) / (np.diff(indptr) + 0.5)).astype(np.float32)
+    avgdl = total_length / n_docs if n_docs else 0.0
+
+    def output(name, dtype, shape):
+        return np.lib.format.open_memmap(os.path.join(tmp_dir, name), mode="w+", dtype=dtype, shape=shape)
+
+    rows_out = output("rows.npy", np.int32, (int(indptr[-1]),))
+    weights_out = output("weights.npy", np.float32, (int(indptr[-1]),))
+    ids_out = output("ids.npy", f"S{id_width}", (n_docs,))
+    terms_out = output("terms.npy", np.uint16, (n_docs,))
+    # next free posting slot of every term; batches are merged in row order, so postings stay sorted
+    cursor = indptr[:-1].copy()
+    first_row = 0
+    for path, terms in spills:
+        with np.load(path) as spill:
+            rows, tf, batch_df, lengths = spill["rows"], spill["tf"], spill["df"], spill["lengths"]
+            ids_out[first_row:first_row + len(lengths)] = spill["ids"]
+            terms_out[first_row:first_row + len(lengths)] = spill["n_terms"]
+        t = np.array([term_id[term] for term in terms], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(batch_df)[:-1]]) if len(t) else np.zeros(0, dtype=np.int64)
+        slots = np.repeat(cursor[t] - starts, batch_df) + np.arange(len(rows))
+        cursor[t] += batch_df
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[rows - first_row] / max(avgdl, 1e-6))
+        rows_out[slots] = rows
+        weights_out[slots] = np.repeat(idf[t], batch_df) * tf * (BM25_K1 + 1.0) / (tf + norm)
+        first_row += len(lengths)
+        os.remove(path)
+    for array in (rows_out, weights_out, ids_out, terms_out):
+        array.flush()
+    del rows_out, weights_out, ids_out, terms_out
+    os.rmdir(spill_dir)
+
+    with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    np.save(os.path.join(tmp_dir, "indptr.npy"), indptr)
+
+    publish(tmp_dir, index_dir)
+    print(f"🔤 BM25 index: {n_docs} docs, {len(vocab)} terms, {int(indptr[-1])} postings -> {index_dir}")
+    return n_docs
+
+
+def build_lexical_index(recipes: List[Dict], index_dir: str = LEXICAL_INDEX_DIR) -> None:
+    """One BM25 index per lexical field (title, ingredients) under index_dir."""
+    for field in LEXICAL_FIELDS:
+        build_bm25_index(((r.get("id", ""), field_text(r, field)) for r in recipes), os.path.join(index_dir, field))
+
+
+class BM25Index:
+    """Memory-mapped CSR BM25 index; a query only touches the postings of its own terms."""
+
+    def __init__(self, index_dir: str):
+        index_dir = current_dir(index_dir)
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            self._term_id = {term: t for t, term in enumerate(json.load(f))}
+        self.indptr = np.load(os.path.join(index_dir, "indptr.npy"), mmap_mode="r")
+        self.rows = np.load(os.path.join(index_dir, "rows.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(index_dir, "weights.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(index_dir, "ids.npy"), mmap_mode="r")
+        self.terms = np.load(os.path.join(index_dir, "terms.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document_frequencies(self) -> Dict[str, int]:
+        """term -> number of documents containing it."""
+        df = np.diff(np.asarray(self.indptr))
+        return {term: int(df[t]) for term, t in self._term_id.items()}
+
+    def _postings(self, text: str):
+        """(rows, weights, number of distinct known query terms) for the query's terms."""
+        term_ids = sorted({self._term_id[t] for t in tokenize(text) if t in self._term_id})
+        if not term_ids:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32), 0
+        rows = np.concatenate([self.rows[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.weights[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        return rows, weights, len(term_ids)
+
+    def search(self, text: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Top (recipe_id, bm25 score) pairs for a free-text query."""
+        rows, weights, _ = self._postings(text)
+        if len(rows) == 0:
+            return []
+        # Accumulate only over touched documents instead of a corpus-sized score array
+        touched, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        if len(touched) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(touched))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.ids[touched[b]].decode("utf-8"), float(scores[b])) for b in best]
+
+    def exact_matches(self, text: str, limit: int = 50) -> List[str]:
+        """Recipe ids whose field has exactly the query's terms (e.g. a full dish name)."""
+        rows, _, n_terms = self._postings(text)
+        if n_terms == 0 or n_terms != len(set(tokenize(text))):
+            return []
+        touched, hits = np.unique(rows, return_counts=True)
+        exact = touched[(hits == n_terms) & (self.terms[touched] == n_terms)]
+        return [self.ids[row].decode("utf-8") for row in exact[:limit]]
+
+
+_indexes = IndexCache(BM25Index, "vocab.json")
+
+
+def get_lexical_index(field: str, index_dir: str = LEXICAL_INDEX_DIR) -> Optional[BM25Index]:
+    """Shared BM25Index for a field (re-loaded after a rebuild), or None when it has not been built."""
+    return _indexes.get(os.path.join(index_dir, field))
@@ -0,0 +1,247 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from index_publish import IndexCache, current_dir, publish, staging_dir
+
+NUTRITION_INDEX_DIR = "./nutrition_index"
+NUTRIENTS = ("energy", "fat", "protein", "salt", "saturates", "sugars")
+FSA_NUTRIENTS = ("fat", "salt", "saturates", "sugars")
+FSA_LEVELS = {"green": 0, "orange": 1, "red": 2}
+
+_OPS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+}
+
+
+def build_nutrition_index(recipes: Iterable[Dict], index_dir: str = NUTRITION_INDEX_DIR) -> int:
+    """Write columnar nutrition arrays for the whole corpus, rows sorted by recipe id.
+
+    values.npy  float32 (n, 6)  nutr_values_per100g in NUTRIENTS order, NaN if missing
+    lights.npy  int8    (n, 4)  fsa_lights_per100g in FSA_NUTRIENTS order (0 green .. 2 red, -1 missing)
+    orders.npy  int32   (6, n)  per-nutrient ascending sort permutation (missing values last)
+    sorted.npy  float32 (6, n)  values[orders[j], j], so range filters are two searchsorted calls
+    """
+    ids, values, lights = [], [], []
+    for recipe in recipes:
+        nutr = recipe.get("nutr_values_per100g") or {}
+        fsa = recipe.get("fsa_lights_per100g") or {}
+        ids.append(str(recipe.get("id", "")).encode("utf-8"))
+        values.append([float(nutr[n]) if nutr.get(n) is not None else np.nan for n in NUTRIENTS])
+        lights.append([FSA_LEVELS.get(fsa.get(n), -1) for n in FSA_NUTRIENTS])
+
+    ids = np.array(ids, dtype=bytes)
+    by_id = np.argsort(ids, kind="stable")
+    ids = ids[by_id]
+    values = np.array(values, dtype=np.float32).reshape(-1, len(NUTRIENTS))[by_id]
+    lights = np.array(lights, dtype=np.int8).reshape(-1, len(FSA_NUTRIENTS))[by_id]
+
+    # np.argsort places NaN last, which is exactly where missing values belong
+    orders = np.argsort(values, axis=0, kind="stable").T.astype(np.int32)
+    sorted_values = np.take_along_axis(values, orders.T, axis=0).T
+
+    tmp_dir = staging_dir(index_dir)
+    np.save(os.path.join(tmp_dir, "ids.npy"), ids)
+    np.save(os.path.join(tmp_dir, "values.npy"), values)
+    np.save(os.path.join(tmp_dir, "lights.npy"), lights)
+    np.save(os.path.join(tmp_dir, "orders.npy"), np.ascontiguousarray(orders))
+    np.save(os.path.join(tmp_dir, "sorted.npy"), np.ascontiguousarray(sorted_values))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": len(ids), "nutrients": NUTRIENTS, "fsa_nutrients": FSA_NUTRIENTS}, f)
+
+    publish(tmp_dir, index_dir)
+    print(f"🥗 Indexed nutrition for {len(ids)} recipes into {index_dir}")
+    return len(ids)
+
+
+def nutrition_metadata(recipe: Dict) -> Dict:
+    """Flat per-recipe nutrition fields for Chroma metadata, so constraints can be pushed into `where`."""
+    metadata = {}
+    nutr = recipe.get("nutr_values_per100g") or {}
+    fsa = recipe.get("fsa_lights_per100g") or {}
+    for n in NUTRIENTS:
+        if nutr.get(n) is not None:
+            metadata[f"nutr_{n}"] = float(nutr[n])
+    for n in FSA_NUTRIENTS:
+        if fsa.get(n) in FSA_LEVELS:
+            metadata[f"fsa_{n}"] = FSA_LEVELS[fsa[n]]
+    return metadata
+
+
+def _parse_constraint(constraint: Sequence):
+    """(nutrient, op, value) -> (column kind, column index, op, numeric value)."""
+    if not isinstance(constraint, (list, tuple)) or len(constraint) != 3:
+        raise ValueError(f"Constraint must be [nutrient, op, value]: {constraint!r}")
+    nutrient, op, value = constraint
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)) or (
+            isinstance(value, float) and not np.isfinite(value)):
+        raise ValueError(f"Constraint value must be a number or an FSA light: {constraint!r}")
+    if op not in _OPS:
+        raise ValueError(f"Unknown operator '{op}'. Choose from {list(_OPS)}.")
+    if isinstance(value, str):
+        if nutrient not in FSA_NUTRIENTS or value not in FSA_LEVELS:
+            raise ValueError(f"Invalid FSA light constraint: {constraint}")
+        return "fsa", FSA_NUTRIENTS.index(nutrient), op, FSA_LEVELS[value]
+    if nutrient not in NUTRIENTS:
+        raise ValueError(f"Unknown nutrient '{nutrient}'. Choose from {list(NUTRIENTS)}.")
+    return "nutr", NUTRIENTS.index(nutrient), op, float(value)
+
+
+def normalize_constraints(constraints) -> List[List]:
+    """Well-formed constraints only, as [nutrient, op, value] lists.
+
+    Nutrient names are lowercased and numeric strings converted; constraints with an
+    unknown nutrient or operator, a non-numeric value or the wrong number of elements
+    are dropped with a warning, so LLM output cannot fail a search.
+    """
+    if not isinstance(constraints, (list, tuple)):
+        return []
+    normalized = []
+    for constraint in constraints:
+        try:
+            if not isinstance(constraint, (list, tuple)) or len(constraint) != 3:
+                raise ValueError("expected [nutrient, op, value]")
+            nutrient, op, value = constraint
+            nutrient = str(nutrient).strip().lower()
+            if isinstance(value, str) and value.strip().lower() not in FSA_LEVELS:
+                value = float(value)
+            elif isinstance(value, str):
+                value = value.strip().lower()
+            _parse_constraint([nutrient, op, value])
+        except (TypeError, ValueError) as e:
+            print(f"⚠️ Dropping nutrition constraint {constraint!r}: {e}")
+            continue
+        normalized.append([nutrient, op, value])
+    return normalized
+
+
+def nutrient_where(constraints: List[Sequence]) -> Optional[Dict]:
+    """Chroma `where` filter for constraints like [("energy", "<", 200), ("salt", "==", "green")]."""
+    _chroma_ops = {"<": "$lt", "<=": "$lte", ">": "$gt", ">=": "$gte", "==": "$eq"}
+    clauses = []
+    for constraint in constraints or []:
+        kind, col, op, value = _parse_constraint(constraint)
+        field = f"nutr_{NUTRIENTS[col]}" if kind == "nutr" else f"fsa_{FSA_NUTRIENTS[col]}"
+        clauses.append({field: {_chroma_ops[op]: value}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class NutritionIndex:
+    """Memory-mapped columnar nutrition arrays for corpus-wide filtering and top-k selection."""
+
+    def __init__(self, index_dir: str = NUTRITION_INDEX_DIR):
+        index_dir = current_dir(index_dir)
+        self.index_dir = index_dir
+        self.ids = np.load(os.path.join(index_dir, "ids.npy"), mmap_mode="r")
+        self.values = np.load(os.path.join(index_dir, "values.npy"), mmap_mode="r")
+        self.lights = np.load(os.path.join(index_dir, "lights.npy"), mmap_mode="r")
+        self.orders = np.load(os.path.join(index_dir, "orders.npy"), mmap_mode="r")
+        self.sorted_values = np.load(os.path.join(index_dir, "sorted.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows_for(self, recipe_ids: List[str]) -> np.ndarray:
+        """Row of each recipe id, -1 for ids that are not indexed."""
+        if len(self.ids) == 0:
+            return np.full(len(recipe_ids), -1, dtype=np.int64)
+        keys = np.array([str(r).encode("utf-8") for r in recipe_ids], dtype=self.ids.dtype)
+        rows = np.minimum(np.searchsorted(self.ids, keys), len(self.ids) - 1)
+        return np.where(self.ids[rows] == keys, rows, -1)
+
+    def ids_for(self, rows: np.ndarray) -> List[str]:
+        return [self.ids[row].decode("utf-8") for row in rows]
+
+    def _bounds(self, col: int, op: str, value: float):
+        """[start, end) of the rows satisfying `op value` in nutrient col's sort permutation."""
+        column = self.sorted_values[col]
+        # NaN sorts last, so the present values are a prefix of the permutation
+        n_valid = int(np.searchsorted(column, np.inf, side="right"))
+        left = int(np.searchsorted(column[:n_valid], value, side="left"))
+        right = int(np.searchsorted(column[:n_valid], value, side="right"))
+        return {"<": (0, left), "<=": (0, right), ">": (right, n_valid),
+                ">=": (left, n_valid), "==": (left, right)}[op]
+
+    def range_rows(self, nutrient: str, op: str, value: float) -> np.ndarray:
+        """Rows whose nutrient satisfies `op value`, read off the precomputed sort permutation."""
+        kind, col, op, value = _parse_constraint([nutrient, op, value])
+        if kind != "nutr":
+            raise ValueError(f"range_rows needs a numeric nutrient value, not an FSA light: {value!r}")
+        start, end = self._bounds(col, op, value)
+        return np.asarray(self.orders[col, start:end])
+
+    def mask(self, constraints: List[Sequence]) -> np.ndarray:
+        """Boolean mask over all rows satisfying every constraint (missing values never match).
+
+        Nutrient ranges are two searchsorted calls on the sorted column, whose permutation
+        slice is scattered into the mask; FSA lights are compared column-wise.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for constraint in constraints or []:
+            kind, col, op, value = _parse_constraint(constraint)
+            if kind == "nutr":
+                start, end = self._bounds(col, op, value)
+                hit = np.zeros(len(self.ids), dtype=bool)
+                hit[self.orders[col, start:end]] = True
+                mask &= hit
+            else:
+                column = self.lights[:, col]
+                mask &= _OPS[op](column, value) & (column >= 0)
+        return mask
+
+    def top_k(self,
+              nutrient: str,
+              k: int = 5,
+              descending: bool = True,
+              rows: Optional[np.ndarray] = None,
+              mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Best k rows by nutrient among `rows` (default: whole corpus) that pass `mask`.
+
+        Candidate sets use a partial sort (argpartition); corpus-wide queries walk the
+        precomputed permutation in growing chunks and stop once k rows pass the mask.
+        """
+        col = NUTRIENTS.index(nutrient)
+        if rows is None:
+            column = self.sorted_values[col]
+            # NaN sorts last, so the present values are a prefix of the permutation
+            n_valid = int(np.searchsorted(column, np.inf, side="right"))
+            found, start, chunk = [], 0, max(4 * k, 1024)
+            while start < n_valid and sum(len(f) for f in found) < k:
+                end = min(start + chunk, n_valid)
+                if descending:
+                    order = np.asarray(self.orders[col, n_valid - end:n_valid - start])[::-1]
+                else:
+                    order = np.asarray(self.orders[col, start:end])
+                found.append(order[mask[order]] if mask is not None else order)
+                start, chunk = end, chunk * 2
+            return np.concatenate(found)[:k] if found else np.zeros(0, dtype=np.int64)
+
+        rows = np.asarray(rows)
+        rows = rows[rows >= 0]
+        if mask is not None:
+            rows = rows[mask[rows]]
+        column = np.asarray(self.values[rows, col])
+        rows, column = rows[~np.isnan(column)], column[~np.isnan(column)]
+        if len(rows) == 0:
+            return rows
+        keys = -column if descending else column
+        if len(rows) > k:
+            part = np.argpartition(keys, k - 1)[:k]
+            rows, keys = rows[part], keys[part]
+        return rows[np.argsort(keys, kind="stable")]
+
+
+_indexes = IndexCache(NutritionIndex, "meta.json")
+
+
+def get_nutrition_index(index_dir: str = NUTRITION_INDEX_DIR) -> Optional[NutritionIndex]:
+    """Shared NutritionIndex (re-mapped after a rebuild), or None when it has not been built."""
+    return _indexes.get(index_dir)
@@ -0,0 +1,183 @@
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from index_publish import IndexCache, current_dir, publish, staging_dir
+
+PANTRY_INDEX_DIR = "./pantry_index"
+
+# Set bits per byte value, for popcounts over packed bitsets
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def canonical_ingredient(text: str) -> str:
+    """Canonical name of an ingredient line: the part before the first comma, lowercased.
+
+    Same reduction prepare_documents uses ("yogurt, greek, plain" -> "yogurt"), plus
+    whitespace/punctuation clean-up.
+    """
+    name = text.split(",")[0].lower()
+    name = re.sub(r"[^a-z0-9 ]+", " ", name)
+    return " ".join(name.split())
+
+
+def _singular(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("oes", "ches", "shes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def ingredient_tokens(name: str) -> List[str]:
+    """Singularised tokens of a canonical name, the form the index matches ingredients in."""
+    return [_singular(t) for t in name.split()]
+
+
+def build_pantry_index(recipes: Iterable[Dict], index_dir: str = PANTRY_INDEX_DIR, min_df: int = 1) -> int:
+    """Canonical ingredient vocabulary plus one packed bitset of recipe rows per ingredient.
+
+    vocab.json  canonical ingredient names (row order of bits.npy)
+    bits.npy    uint8 (V, ceil(N / 8)) np.packbits rows; bit r set if recipe row r uses the ingredient
+    ids.npy     recipe id of each row
+    counts.npy  uint16 number of distinct canonical ingredients per recipe (before min_df pruning)
+    """
+    ids, counts = [], []
+    postings = defaultdict(list)
+    for row, recipe in enumerate(recipes):
+        names = {canonical_ingredient(i["text"]) for i in recipe.get("ingredients", []) if i.get("text")}
+        names.discard("")
+        for name in names:
+            postings[name].append(row)
+        ids.append(str(recipe.get("id", "")).encode("utf-8"))
+        counts.append(len(names))
+
+    n_recipes = len(ids)
+    vocab = sorted(name for name, rows in postings.items() if len(rows) >= min_df)
+    bits = np.zeros((len(vocab), (n_recipes + 7) // 8), dtype=np.uint8)
+    if vocab:
+        # Set every (ingredient, recipe) bit in one scatter, same bit order as np.packbits
+        v_rows = np.concatenate([np.full(len(postings[name]), v, dtype=np.int64) for v, name in enumerate(vocab)])
+        r_rows = np.concatenate([np.asarray(postings[name], dtype=np.int64) for name in vocab])
+        np.bitwise_or.at(bits, (v_rows, r_rows >> 3), (0x80 >> (r_rows & 7)).astype(np.uint8))
+
+    tmp_dir = staging_dir(index_dir)
+    with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    np.save(os.path.join(tmp_dir, "bits.npy"), bits)
+    np.save(os.path.join(tmp_dir, "ids.npy"), np.array(ids, dtype=bytes))
+    np.save(os.path.join(tmp_dir, "counts.npy"), np.minimum(np.array(counts), 65535).astype(np.uint16))
+
+    publish(tmp_dir, index_dir)
+    print(f"🧺 Indexed {len(vocab)} canonical ingredients over {n_recipes} recipes into {index_dir} ({bits.nbytes / 1e6:.1f} MB)")
+    return len(vocab)
+
+
+class PantryIndex:
+    """Bitset inverted index over canonical ingredients, for "what can I make with ..." queries."""
+
+    def __init__(self, index_dir: str = PANTRY_INDEX_DIR):
+        index_dir = current_dir(index_dir)
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        self.bits = np.load(os.path.join(index_dir, "bits.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(index_dir, "ids.npy"), mmap_mode="r")
+        self.counts = np.load(os.path.join(index_dir, "counts.npy"), mmap_mode="r")
+
+        # token -> vocab rows containing it, so "flour" also covers "wheat flour"
+        self._exact = {name: v for v, name in enumerate(self.vocab)}
+        self._by_token = defaultdict(list)
+        for v, name in enumerate(self.vocab):
+            for token in set(ingredient_tokens(name)):
+                self._by_token[token].append(v)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document_frequencies(self, chunk: int = 1024) -> np.ndarray:
+        """Number of recipes using each vocabulary entry (popcount of its bitset row)."""
+        df = np.zeros(len(self.vocab), dtype=np.int64)
+        for start in range(0, len(df), chunk):
+            df[start:start + chunk] = _POPCOUNT[np.asarray(self.bits[start:start + chunk])].sum(axis=1)
+        return df
+
+    def vocab_rows(self, ingredient: str) -> List[int]:
+        """Vocabulary rows an ingredient term refers to: its exact name plus every name containing all its tokens."""
+        name = canonical_ingredient(ingredient)
+        tokens = ingredient_tokens(name)
+        if not tokens:
+            return []
+        rows = set(self._by_token.get(tokens[0], []))
+        for token in tokens[1:]:
+            rows &= set(self._by_token.get(token, []))
+        if name in self._exact:
+            rows.add(self._exact[name])
+        return sorted(rows)
+
+    def ingredient_bits(self, ingredient: str) -> np.ndarray:
+        """Packed bitset of recipes using any vocabulary entry the term refers to."""
+        rows = self.vocab_rows(ingredient)
+        if not rows:
+            return np.zeros(self.bits.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(np.asarray(self.bits[rows]), axis=0)
+
+    def count_with_all(self, ingredients: List[str]) -> int:
+        """Number of recipes using every given ingredient (AND of bitsets, then popcount)."""
+        if not ingredients:
+            return 0
+        combined = np.bitwise_and.reduce(np.stack([self.ingredient_bits(i) for i in ingredients]), axis=0)
+        return int(_POPCOUNT[combined].sum())
+
+    def search(self,
+               ingredients: List[str],
+               top_k: int = 5,
+               missing_penalty: float = 0.1,
+               require_all: bool = False) -> List[Dict]:
+        """Rank recipes by how much of the pantry they use, penalising ingredients the user lacks.
+
+        score = matched / len(pantry) - missing_penalty * (recipe ingredients not in the pantry)
+        Returns up to top_k dicts {"id", "score", "matched", "missing"}.
+        """
+        terms = list(dict.fromkeys(i for i in ingredients if canonical_ingredient(i)))
+        if not terms or len(self.ids) == 0:
+            return []
+
+        n = len(self.ids)
+        term_bits = np.stack([self.ingredient_bits(term) for term in terms])  # (T, ceil(N/8))
+        uses = np.unpackbits(term_bits, axis=1, count=n).astype(bool)           # (T, N)
+        matched = uses.sum(axis=0, dtype=np.int32)
+
+        candidates = np.flatnonzero(matched == len(terms)) if require_all else np.flatnonzero(matched)
+        if len(candidates) == 0:
+            return []
+
+        # A pantry term can cover several canonical ingredients of one recipe; never go below zero
+        missing = np.maximum(np.asarray(self.counts[candidates], dtype=np.int32) - matched[candidates], 0)
+        scores = matched[candidates] / len(terms) - missing_penalty * missing
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.argsort(-scores[best], kind="stable")]
+
+        return [{
+            "id": self.ids[candidates[b]].decode("utf-8"),
+            "score": float(scores[b]),
+            "matched": [term for t, term in enumerate(terms) if uses[t, candidates[b]]],
+            "missing": int(missing[b]),
+        } for b in best]
+
+
+_indexes = IndexCache(PantryIndex, "vocab.json")
+
+
+def get_pantry_index(index_dir: str = PANTRY_INDEX_DIR) -> Optional[PantryIndex]:
+    """Shared PantryIndex (re-loaded after a rebuild), or None when it has not been built."""
+    return _indexes.get(index_dir)
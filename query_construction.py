@@ -1,13 +1,24 @@
 from langchain.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
-import os, json, re
+from classifier_cache import ClassifierCache, normalize_query
+from fast_classifier import fast_classify, FAST_PATH_MIN_CONFIDENCE
+from hedged_classifier import HedgedClassifier, ClassificationError
+from nutrition_index import NUTRIENTS, normalize_constraints
+from ollama import chat
+import os, json, re, hashlib, threading
 
 load_dotenv()
 
-def query_classifier(query):
-    classifier_prompt = PromptTemplate.from_template(
-        """You are a helpful AI cooking assistant. Your job is to analyze a user's recipe-related query and extract structured information for recipe retrieval.
+CLASSIFIER_MODEL = "gemini-2.0-flash"
+# Local model the hedged classifier races against Gemini (same one the generator uses)
+LOCAL_CLASSIFIER_MODEL = os.getenv("LOCAL_CLASSIFIER_MODEL", "gemma3:latest")
+# Optional file that collects raw queries for prewarm_classifier_cache (off by default, since
+# queries can be personal); rotated to <path>.1 once it reaches QUERY_LOG_MAX_BYTES
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH") or None
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(10 << 20)))
+
+CLASSIFIER_TEMPLATE = """You are a helpful AI cooking assistant. Your job is to analyze a user's recipe-related query and extract structured information for recipe retrieval.
 
         1. Classify the user query into the following types (can be multiple):
         - ingredients: mentions specific ingredients (e.g., "chicken and garlic")
@@ -26,6 +37,10 @@ def query_classifier(query):
         - `"descending": true` if the user wants **high** value (e.g., "high protein")
         - `"descending": false` if the user wants **low** value (e.g., "low sugar")
         - If no nutrition preference is mentioned, return `"nutrition": None` and `"descending": None`
+        - If the query states a hard nutrition limit (e.g. "under 200 calories", "green salt"), add it to
+          `"nutrition_constraints"` as `[nutrient, operator, value]` with operator one of "<", "<=", ">", ">=", "==";
+          value is a number per 100g for energy/fat/protein/salt/saturates/sugars, or one of "green", "orange", "red"
+          for the FSA traffic lights of fat/salt/saturates/sugars. Otherwise return an empty list.
 
         5.  Ensure consistency:
         - If any category (title, ingredients, instructions) contains non-empty "include" or "exclude" lists, it must also appear in the top-level `"type"` list.
@@ -46,7 +61,8 @@ def query_classifier(query):
                 "exclude": [...]
             }},
             "nutritions": one of ["energy", "fat", "protein", "salt", "saturates", "sugars", None],
-            "descending": true, false, or None
+            "descending": true, false, or None,
+            "nutrition_constraints": [[nutrient, operator, value], ...]
         }}  
         Only include keywords that are clearly stated or strongly implied in the query. 
         If a category does not apply, return an empty list for both `include` and `exclude`.
@@ -56,30 +72,65 @@ def query_classifier(query):
         Query: {query}
         Response:
         """
-    )
-    def sort_and_join(keyword_list):
-        return "; ".join(sorted(set(keyword_list)))
-    
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", api_key = os.getenv("GOOGLE_API_KEY"))
-    classifier_chain = classifier_prompt | llm
-    result = classifier_chain.invoke(input={"query": query})
-    content = result.content.strip()
-    # Remove ```json ... ``` or ``` ... ``` if present
-    content = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
-    
+
+# Cached outputs are only valid for the prompt and model that produced them
+PROMPT_VERSION = hashlib.sha1((CLASSIFIER_MODEL + CLASSIFIER_TEMPLATE).encode("utf-8")).hexdigest()[:12]
+
+_chain = None
+_chain_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+_hedged = None
+_hedged_lock = threading.Lock()
+
+
+def get_classifier_chain():
+    """Prompt | Gemini chain built once per process; its HTTP client and connection pool are reused by every call."""
+    global _chain
+    if _chain is None:
+        with _chain_lock:
+            if _chain is None:
+                llm = ChatGoogleGenerativeAI(model=CLASSIFIER_MODEL, api_key=os.getenv("GOOGLE_API_KEY"))
+                _chain = PromptTemplate.from_template(CLASSIFIER_TEMPLATE) | llm
+    return _chain
+
+
+def get_classifier_cache() -> ClassifierCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ClassifierCache()
+    return _cache
+
+
+def cache_key(query):
+    return f"{PROMPT_VERSION}:{normalize_query(query)}"
+
+
+_log_lock = threading.Lock()
+
+
+def log_query(query, path=QUERY_LOG_PATH, max_bytes=QUERY_LOG_MAX_BYTES):
+    """Append the raw query to the query log that prewarm_classifier_cache reads (if enabled).
+
+    A log that reached max_bytes replaces the previous <path>.1, so at most two files are kept.
+    """
+    if not path:
+        return
     try:
-        parsed = json.loads(content)
-        for section in ["ingredients"]:
-            parsed[section]["include"] = sort_and_join(parsed[section]["include"])
-        for section in ["title", "instructions"]:
-            parsed[section]["include"] = ",".join(parsed[section]["include"])
-            
-        print(parsed)
-        return parsed
-    except json.JSONDecodeError:
-        print("❌ Failed to parse JSON:")
-        print(content)
-        return {
+        with _log_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if max_bytes and os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(" ".join(query.split()) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write query log: {e}")
+
+
+def empty_classification():
+    return {
             "type": [],
             "title": {
                 "include": [],
@@ -94,10 +145,166 @@ def query_classifier(query):
                 "exclude": []
             },
             "nutritions": None,
-            "descending": None
+            "descending": None,
+            "nutrition_constraints": []
         }
 
+
+def parse_classifier_output(content):
+    """(parsed, True) for a reply holding a well-formed classification, else (None, False)."""
+    def dedupe(keyword_list):
+        # Keep keywords separate so retrieval can embed each concept on its own
+        return list(dict.fromkeys(k.strip() for k in keyword_list if isinstance(k, str) and k.strip()))
+
+    # Remove ```json ... ``` or ``` ... ``` if present
+    content = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
+    try:
+        parsed = json.loads(content)
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("type", []), list):
+            raise ValueError("not a classification object")
+        result = empty_classification()
+        for section in ["title", "ingredients", "instructions"]:
+            fields = parsed.get(section) or {}
+            if not isinstance(fields, dict):
+                raise ValueError(f"'{section}' is not an object")
+            result[section]["include"] = dedupe(fields.get("include") or [])
+            result[section]["exclude"] = dedupe(fields.get("exclude") or [])
+        result["ingredients"]["include"] = sorted(result["ingredients"]["include"])
+        result["type"] = [t for t in parsed.get("type", []) if t in ("title", "ingredients", "instructions")]
+        nutrient = parsed.get("nutritions")
+        nutrient = nutrient.strip().lower() if isinstance(nutrient, str) else None
+        result["nutritions"] = nutrient if nutrient in NUTRIENTS else None
+        descending = parsed.get("descending")
+        result["descending"] = descending if isinstance(descending, bool) else None
+        result["nutrition_constraints"] = normalize_constraints(parsed.get("nutrition_constraints") or [])
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"❌ Failed to parse classifier JSON ({e}):")
+        print(content)
+        return None, False
+    print(result)
+    return result, True
+
+
+def classify_with_llm(query):
+    """One Gemini call: (parsed output, True), or (None, False) when the reply is not a valid classification."""
+    result = get_classifier_chain().invoke(input={"query": query})
+    return parse_classifier_output(result.content)
+
+
+def classify_with_ollama(query):
+    """Same prompt on the local Ollama model, constrained to JSON output."""
+    response = chat(
+        model=LOCAL_CLASSIFIER_MODEL,
+        messages=[{"role": "user", "content": PromptTemplate.from_template(CLASSIFIER_TEMPLATE).format(query=query)}],
+        format="json",
+        options={"temperature": 0.0}
+    )
+    return parse_classifier_output(response['message']['content'])
+
+
+def get_hedged_classifier() -> HedgedClassifier:
+    """Gemini as primary, hedged with the local Ollama model."""
+    global _hedged
+    if _hedged is None:
+        with _hedged_lock:
+            if _hedged is None:
+                _hedged = HedgedClassifier(classify_with_llm, classify_with_ollama)
+    return _hedged
+
+
+def query_classifier(query, use_cache=True, use_fast_path=True, min_confidence=FAST_PATH_MIN_CONFIDENCE, log=True):
+    """Structured retrieval query for a user query.
+
+    Repeated queries are answered from the sqlite cache; simple ones by the local
+    rule-based classifier when it is confident enough; everything else goes to Gemini,
+    hedged with the local Ollama model under a deadline. Raises ClassificationError
+    when no classifier produced a usable result.
+    """
+    if log:
+        log_query(query)
+    if use_cache:
+        cached = get_classifier_cache().get(cache_key(query))
+        if cached is not None:
+            return cached
+
+    try:
+        fast, confidence = fast_classify(query)
+    except Exception as e:
+        fast, confidence = None, 0.0
+        print(f"⚠️ Fast-path classifier failed: {e}")
+    if use_fast_path and confidence >= min_confidence:
+        print(f"⚡ Fast-path classification (confidence {confidence:.2f}): {fast}")
+        return fast
+
+    try:
+        parsed, source = get_hedged_classifier().classify(query)
+    except ClassificationError as e:
+        # Degrade to the low-confidence local parse rather than to an empty query
+        if fast is not None and fast["type"]:
+            print(f"⚠️ {e}; using fast-path classification (confidence {confidence:.2f})")
+            return fast
+        raise
+    # Only valid outputs reach the cache, so the next identical query retries the LLMs
+    if use_cache:
+        get_classifier_cache().put(cache_key(query), parsed)
+    return parsed
+
+
+def prewarm_classifier_cache(log_path=QUERY_LOG_PATH, limit=None):
+    """Classify every distinct query of a log file (one query per line, or JSON lines with a "query"
+    field) that is not cached yet, most frequent first. Returns counts of what was done.
+
+    The rotated <log_path>.1 is read as well when it exists."""
+    if not log_path:
+        raise ValueError("No query log to prewarm from: set QUERY_LOG_PATH or pass log_path.")
+    counts = {}
+    raw = {}
+    for path in (log_path + ".1", log_path):
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    try:
+                        line = json.loads(line).get("query", "")
+                    except json.JSONDecodeError:
+                        pass
+                key = normalize_query(line)
+                if key:
+                    counts[key] = counts.get(key, 0) + 1
+                    raw.setdefault(key, line)
+
+    cache = get_classifier_cache()
+    ordered = sorted(counts, key=counts.get, reverse=True)[:limit]
+    stats = {"distinct": len(counts), "already_cached": 0, "classified": 0, "failed": 0}
+    for key in ordered:
+        if cache_key(raw[key]) in cache:
+            stats["already_cached"] += 1
+            continue
+        parsed, ok = classify_with_llm(raw[key])
+        if ok:
+            cache.put(cache_key(raw[key]), parsed)
+            stats["classified"] += 1
+        else:
+            stats["failed"] += 1
+    print(f"🔥 Classifier cache pre-warm: {stats}")
+    return stats
+
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Classify a test query, or pre-warm the classifier cache from a query log.")
+    parser.add_argument("--prewarm", default=None, help="Query log file to pre-warm the cache from")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    if args.prewarm:
+        prewarm_classifier_cache(args.prewarm, limit=args.limit)
+        raise SystemExit(0)
+
     # query_test1 = "Show me some recipes for making blueberry yogurt."
     # res1= query_classifier(query_test1)
     # print(res1)
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from data_preprocessing import load_recipes_from_json, RECIPE_PACK_DIR
+from index_publish import current_dir
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """sha1 of a file, read in chunks so a 200MB corpus never sits in memory twice."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RecipeStore:
+    """Process-resident id -> recipe index over recipes.json.
+
+    The JSON file is parsed once per process. Every later access only stats the file;
+    it is re-hashed when its mtime/size changes and re-parsed only if the hash differs.
+    """
+
+    def __init__(self, json_path: str):
+        self.json_path = json_path
+        self._lock = threading.Lock()
+        self._id_to_recipe: Dict[str, Dict] = {}
+        self._signature = None
+        self._digest = None
+        self.reload_count = 0
+
+    def _stat_signature(self):
+        st = os.stat(self.json_path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def refresh(self) -> bool:
+        """Reload the index if the file changed. Returns True when a reload happened."""
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return False
+
+        with self._lock:
+            if signature == self._signature:
+                return False
+
+            digest = file_digest(self.json_path)
+            if digest == self._digest:
+                # touched but identical (e.g. re-downloaded), keep the parsed copy
+                self._signature = signature
+                return False
+
+            recipes = load_recipes_from_json(self.json_path)
+            self._id_to_recipe = {r["id"]: r for r in recipes}
+            self._signature = signature
+            self._digest = digest
+            self.reload_count += 1
+            print(f"📦 Loaded {len(self._id_to_recipe)} recipes from {self.json_path}")
+            return True
+
+    def get(self, recipe_id: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        return self._id_to_recipe.get(recipe_id, default)
+
+    def get_many(self, recipe_ids: Iterable[str]) -> List[Dict]:
+        """Recipes for the given ids in order; unknown ids are skipped with a warning."""
+        matched = []
+        for recipe_id in recipe_ids:
+            recipe = self._id_to_recipe.get(recipe_id)
+            if recipe is None:
+                print(f"⚠️ Recipe id '{recipe_id}' not found in {self.json_path}.")
+                continue
+            matched.append(recipe)
+        return matched
+
+    def __contains__(self, recipe_id) -> bool:
+        return recipe_id in self._id_to_recipe
+
+    def __len__(self) -> int:
+        return len(self._id_to_recipe)
+
+
+def _stat_signature(path: str):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class _PackSnapshot:
+    """One mapped generation of a pack. Never modified after construction, so a reader
+    holding it sees meta, ids, offsets and records that all belong together."""
+
+    def __init__(self, pack_dir: str, signature):
+        self.signature = signature
+        # resolve the published generation once, so every file below comes from the same build
+        pack_dir = current_dir(pack_dir)
+        with open(os.path.join(pack_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.ids = np.load(os.path.join(pack_dir, "ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(pack_dir, "offsets.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(pack_dir, "lengths.npy"), mmap_mode="r")
+        self.file = open(os.path.join(pack_dir, "records.bin"), "rb")
+        self.records = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.meta["count"] else b""
+
+    def position(self, recipe_id: str) -> int:
+        key = str(recipe_id).encode("utf-8")
+        pos = int(np.searchsorted(self.ids, key))
+        if pos < len(self.ids) and self.ids[pos] == key:
+            return pos
+        return -1
+
+    def get(self, recipe_id: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        pos = self.position(recipe_id)
+        if pos < 0:
+            return default
+        start = int(self.offsets[pos])
+        end = start + int(self.lengths[pos])
+        return json.loads(zlib.decompress(self.records[start:end]))
+
+
+class PackedRecipeStore:
+    """Read-only view over a pack written by data_preprocessing.build_recipe_pack.
+
+    Records and the id index are memory-mapped, so worker processes share the OS page
+    cache instead of each holding a parsed corpus; a lookup is a binary search over the
+    sorted ids plus one zlib/json decode of that record only. A rebuilt pack is mapped
+    into a new snapshot that replaces the old one in a single reference swap.
+    """
+
+    def __init__(self, pack_dir: str = RECIPE_PACK_DIR):
+        self.pack_dir = pack_dir
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_PackSnapshot] = None
+        self.reload_count = 0
+
+    @property
+    def meta(self) -> Dict:
+        return self._snapshot.meta
+
+    def refresh(self) -> bool:
+        """Re-open the pack if it was rebuilt since it was mapped."""
+        current = self._snapshot
+        try:
+            signature = _stat_signature(os.path.join(current_dir(self.pack_dir), "meta.json"))
+        except FileNotFoundError:
+            if current is None:
+                raise
+            # mid-rebuild; keep serving the mapped generation
+            return False
+        if current is not None and signature == current.signature:
+            return False
+
+        with self._lock:
+            old = self._snapshot
+            if old is not None and signature == old.signature:
+                return False
+            try:
+                snapshot = _PackSnapshot(self.pack_dir, signature)
+            except FileNotFoundError:
+                if old is None:
+                    raise
+                return False
+            self._snapshot = snapshot
+            self.reload_count += 1
+        if old is not None:
+            # the mmap keeps its own handle; in-flight readers of the old snapshot stay valid
+            # and it is unmapped once the last of them lets go
+            old.file.close()
+        print(f"📦 Mapped {snapshot.meta['count']} packed recipes from {self.pack_dir}")
+        return True
+
+    def get(self, recipe_id: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        return self._snapshot.get(recipe_id, default)
+
+    def get_many(self, recipe_ids: Iterable[str]) -> List[Dict]:
+        """Recipes for the given ids in order; unknown ids are skipped with a warning."""
+        snapshot = self._snapshot
+        matched = []
+        for recipe_id in recipe_ids:
+            recipe = snapshot.get(recipe_id)
+            if recipe is None:
+                print(f"⚠️ Recipe id '{recipe_id}' not found in {self.pack_dir}.")
+                continue
+            matched.append(recipe)
+        return matched
+
+    def __contains__(self, recipe_id) -> bool:
+        return self._snapshot.position(recipe_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self._snapshot.ids)
+
+
+# (pack dir, json path) -> (meta.json signature, json signature, fresh)
+_freshness: Dict[tuple, tuple] = {}
+
+
+def pack_is_fresh(pack_dir: str, json_path: str) -> bool:
+    """True if pack_dir holds a complete pack built from the current json_path.
+
+    meta.json is only parsed again when it or json_path changed on disk.
+    """
+    try:
+        meta_path = os.path.join(current_dir(pack_dir), "meta.json")
+        meta_signature = _stat_signature(meta_path)
+    except FileNotFoundError:
+        return False
+    json_signature = _stat_signature(json_path) if os.path.exists(json_path) else None
+    key = (os.path.abspath(pack_dir), os.path.abspath(json_path))
+    cached = _freshness.get(key)
+    if cached is not None and cached[:2] == (meta_signature, json_signature):
+        return cached[2]
+
+    if json_signature is None:
+        # workers may ship only the pack
+        fresh = True
+    else:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        fresh = meta.get("source_mtime_ns") == json_signature[0] and meta.get("source_size") == json_signature[1]
+    _freshness[key] = (meta_signature, json_signature, fresh)
+    return fresh
+
+
+def load_recipes_by_ids(recipe_ids: Iterable[str], pack_dir: str = RECIPE_PACK_DIR) -> List[Dict]:
+    """Decode only the requested recipes from the pack, in the same dict shape as recipes.json."""
+    return _get_store(pack_dir, lambda: PackedRecipeStore(pack_dir)).get_many(recipe_ids)
+
+
+_stores: Dict[str, object] = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(path: str, factory):
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = factory()
+                _stores[key] = store
+    store.refresh()
+    return store
+
+
+def get_packed_store(pack_dir: str) -> PackedRecipeStore:
+    """Shared memory-mapped view of any pack written by build_recipe_pack, keyed by record id."""
+    return _get_store(pack_dir, lambda: PackedRecipeStore(pack_dir))
+
+
+def get_recipe_store(json_path: str = "./recipes.json", pack_dir: str = RECIPE_PACK_DIR):
+    """Shared recipe store for json_path.
+
+    Uses the memory-mapped pack when it is up to date with json_path, otherwise falls
+    back to a RecipeStore that parses the JSON once and refreshes if the file changed.
+    """
+    if pack_is_fresh(pack_dir, json_path):
+        return _get_store(pack_dir, lambda: PackedRecipeStore(pack_dir))
+    return _get_store(json_path, lambda: RecipeStore(json_path))
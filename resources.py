@@ -0,0 +1,156 @@
+import atexit
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from langchain_chroma import Chroma
+from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_cache import QueryEmbeddingCache, QUERY_CACHE_SIZE
+from vector_backends import BACKEND_KINDS, backend_dir, load_backend
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+VECTORSTORE_DIRS = {
+    "title": "./chroma_title",
+    "ingredients": "./chroma_ingredients",
+    "instructions": "./chroma_instructions",
+}
+
+# Which vector index answers similarity searches: "chroma", or the NumPy "exact" / "hnsw" /
+# "compressed" backends built with `python vector_backends.py` (compressed is also built at ingest)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Optional .npz file that keeps the query embedding cache across restarts
+QUERY_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE") or None
+
+
+class ResourceRegistry:
+    """Process-wide owner of the query encoder and the three vector collections.
+
+    Everything is built once (eagerly via warm_up, or lazily on first use) under a lock
+    and never mutated afterwards, so the same handles can be shared by every request
+    thread: Chroma serialises its own sqlite access, the NumPy backends are read-only
+    and the encoder is inference-only.
+    """
+
+    def __init__(self,
+                 device: str = "cpu",
+                 persist_dirs: Optional[Dict[str, str]] = None,
+                 backend: str = VECTOR_BACKEND,
+                 query_cache_size: int = QUERY_CACHE_SIZE,
+                 query_cache_path: Optional[str] = QUERY_CACHE_PATH):
+        if backend not in BACKEND_KINDS:
+            raise ValueError(f"Unknown vector backend '{backend}'. Choose from {list(BACKEND_KINDS)}.")
+        self.device = device
+        self.backend = backend
+        self.persist_dirs = dict(persist_dirs or VECTORSTORE_DIRS)
+        self._lock = threading.Lock()
+        self._embeddings = None
+        self._vectorstores: Dict[str, object] = {}
+        self._errors: Dict[str, str] = {}
+        self._warmup_seconds = None
+        self.query_cache = QueryEmbeddingCache(query_cache_size, query_cache_path, model_name=EMBEDDING_MODEL_NAME)
+        if query_cache_path:
+            atexit.register(self.query_cache.save)
+
+    def embeddings(self) -> HuggingFaceEmbeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = HuggingFaceEmbeddings(
+                        model_name=EMBEDDING_MODEL_NAME,
+                        cache_folder="./hf_cache",
+                        model_kwargs={"device": self.device},
+                        encode_kwargs={"normalize_embeddings": True}
+                    )
+        return self._embeddings
+
+    def embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        """Query embeddings through the LRU cache; only unseen texts reach the encoder."""
+        if not texts:
+            return []
+        return self.query_cache.embed(texts, self.embeddings())
+
+    def vectorstore(self, mode: str):
+        """Search handle for a collection: a Chroma store or a drop-in NumPy backend."""
+        if mode not in self.persist_dirs:
+            raise ValueError(f"Unknown vectorstore '{mode}'. Choose from {list(self.persist_dirs)}.")
+        store = self._vectorstores.get(mode)
+        if store is None:
+            embeddings = self.embeddings()
+            with self._lock:
+                store = self._vectorstores.get(mode)
+                if store is None:
+                    if self.backend == "chroma":
+                        store = Chroma(
+                            persist_directory=self.persist_dirs[mode],
+                            embedding_function=embeddings
+                        )
+                    else:
+                        store = load_backend(self.backend, backend_dir(self.backend, mode))
+                    self._vectorstores[mode] = store
+        return store
+
+    def warm_up(self) -> Dict:
+        """Build every resource now and touch it once so the first query pays nothing."""
+        if self.is_ready():
+            return self.readiness()
+
+        start = time.perf_counter()
+        try:
+            # Run one forward pass so lazy weight loading / thread pools are initialised
+            self.embeddings().embed_query("warm up")
+            self._errors.pop("embeddings", None)
+        except Exception as e:
+            self._errors["embeddings"] = str(e)
+            print(f"⚠️ Could not load embedding model: {e}")
+
+        for mode in self.persist_dirs:
+            try:
+                # count() opens the sqlite file / maps the arrays of the collection
+                store = self.vectorstore(mode)
+                if self.backend == "chroma":
+                    store._collection.count()
+                else:
+                    store.count()
+                self._errors.pop(mode, None)
+            except Exception as e:
+                self._errors[mode] = str(e)
+                print(f"⚠️ Could not open vectorstore '{mode}': {e}")
+
+        self._warmup_seconds = time.perf_counter() - start
+        print(f"🔥 Resources warmed up in {self._warmup_seconds:.2f}s (ready={self.is_ready()})")
+        return self.readiness()
+
+    def is_ready(self) -> bool:
+        return (self._embeddings is not None
+                and all(mode in self._vectorstores for mode in self.persist_dirs)
+                and not self._errors)
+
+    def readiness(self) -> Dict:
+        """Health report: which resources are warm and what failed."""
+        return {
+            "ready": self.is_ready(),
+            "backend": self.backend,
+            "embeddings": self._embeddings is not None,
+            "vectorstores": {mode: mode in self._vectorstores for mode in self.persist_dirs},
+            "errors": dict(self._errors),
+            "warmup_seconds": self._warmup_seconds,
+            "query_cache": self.query_cache.stats(),
+        }
+
+
+_registry: Optional[ResourceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ResourceRegistry:
+    """The shared ResourceRegistry of this process."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ResourceRegistry()
+    return _registry
@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+RESPONSE_CACHE_PATH = "./cache/response_cache.sqlite"
+# Cosine similarity of two query embeddings above which a stored generation is reused
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+
+
+def _keywords(values) -> list:
+    keywords = {" ".join(str(k).lower().split()) for k in values or []}
+    keywords.discard("")
+    return sorted(keywords)
+
+
+def response_signature(query_classified: Dict, namespace: str = "") -> str:
+    """Part of the classifier output that must match exactly for a cached answer to be reused.
+
+    The include keywords of each field (so "chicken curry" and "chicken soup" never share
+    an answer, however close their embeddings), the exclusions of all fields (so a
+    negation query is never answered for a different exclusion set) and the nutrition
+    preference and constraints; `namespace` separates generator models / prompt versions.
+    """
+    include, excluded = {}, []
+    for section in ("title", "ingredients", "instructions"):
+        fields = query_classified.get(section) or {}
+        include[section] = _keywords(fields.get("include"))
+        excluded += fields.get("exclude") or []
+    return json.dumps({
+        "namespace": namespace,
+        "include": include,
+        "exclude": _keywords(excluded),
+        "nutritions": query_classified.get("nutritions"),
+        "descending": query_classified.get("descending"),
+        "constraints": sorted(json.dumps(c) for c in query_classified.get("nutrition_constraints") or []),
+    }, sort_keys=True)
+
+
+class SemanticResponseCache:
+    """Generated responses keyed by query embedding plus an exact classifier signature.
+
+    All live entries are kept in memory (vectors grouped by signature) for lookups and
+    mirrored to sqlite so they survive restarts. A lookup compares the query vector with
+    the stored vectors of the same signature only; the best match at or above `threshold`
+    is a hit. Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(self,
+                 path: str = RESPONSE_CACHE_PATH,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD,
+                 ttl: float = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Dict] = {}
+        self._by_signature: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self.lookup_seconds = 0.0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " id INTEGER PRIMARY KEY, signature TEXT NOT NULL, vector BLOB NOT NULL, response TEXT NOT NULL,"
+            " generation_seconds REAL NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._load()
+
+    def _load(self) -> None:
+        now = time.time()
+        self._conn.execute("DELETE FROM response_cache WHERE created < ?", (now - self.ttl,))
+        rows = self._conn.execute(
+            "SELECT id, signature, vector, response, generation_seconds, created, accessed FROM response_cache"
+        ).fetchall()
+        for entry_id, signature, vector, response, generation_seconds, created, accessed in rows:
+            self._add(entry_id, signature, np.frombuffer(vector, dtype=np.float32).copy(),
+                      response, generation_seconds, created, accessed)
+        if rows:
+            print(f"💾 Loaded {len(rows)} cached responses from {self.path}")
+
+    def _add(self, entry_id, signature, vector, response, generation_seconds, created, accessed) -> None:
+        self._entries[entry_id] = {
+            "signature": signature, "vector": vector, "response": response,
+            "generation_seconds": generation_seconds, "created": created, "accessed": accessed,
+        }
+        self._by_signature.setdefault(signature, []).append(entry_id)
+
+    def _remove(self, entry_id) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._by_signature[entry["signature"]]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_signature[entry["signature"]]
+
+    def lookup(self, vector, signature: str) -> Optional[Tuple[str, float]]:
+        """(cached response, similarity) for the closest live entry with this signature, or None."""
+        start = time.perf_counter()
+        now = time.time()
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        with self._lock:
+            ids = [i for i in self._by_signature.get(signature, []) if now - self._entries[i]["created"] <= self.ttl]
+            best = None
+            if ids:
+                similarities = np.stack([self._entries[i]["vector"] for i in ids]) @ query
+                b = int(np.argmax(similarities))
+                if similarities[b] >= self.threshold:
+                    best = (ids[b], float(similarities[b]))
+            if best is None:
+                self.misses += 1
+                self.lookup_seconds += time.perf_counter() - start
+                return None
+            entry = self._entries[best[0]]
+            entry["accessed"] = now
+            self.hits += 1
+            self.seconds_saved += entry["generation_seconds"]
+            self._conn.execute("UPDATE response_cache SET accessed = ? WHERE id = ?", (now, best[0]))
+            self.lookup_seconds += time.perf_counter() - start
+            return entry["response"], best[1]
+
+    def store(self, vector, signature: str, response: str, generation_seconds: float) -> None:
+        now = time.time()
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) + 1e-12)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO response_cache (signature, vector, response, generation_seconds, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (signature, vector.tobytes(), response, generation_seconds, now, now),
+            )
+            self._add(cursor.lastrowid, signature, vector, response, generation_seconds, now, now)
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        expired = [i for i, e in self._entries.items() if now - e["created"] > self.ttl]
+        overflow = len(self._entries) - len(expired) - self.max_entries
+        if overflow > 0:
+            expired_ids = set(expired)
+            live = sorted((e["accessed"], i) for i, e in self._entries.items() if i not in expired_ids)
+            expired += [i for _, i in live[:overflow]]
+        for entry_id in expired:
+            self._remove(entry_id)
+        if expired:
+            self._conn.executemany("DELETE FROM response_cache WHERE id = ?", [(i,) for i in expired])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "seconds_saved": self.seconds_saved,
+            "mean_lookup_ms": 1000 * self.lookup_seconds / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SemanticResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticResponseCache()
+    return _cache
@@ -1,10 +1,15 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from data_preprocessing import load_recipes_from_json
-from typing import List, Dict
+from recipe_store import get_recipe_store
+from resources import get_registry
+from typing import List, Dict, Tuple
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import numpy as np
 from query_construction import query_classifier
+from nutrition_index import get_nutrition_index, nutrient_where, NUTRIENTS
+from pantry_index import get_pantry_index
+from lexical_index import get_lexical_index, LEXICAL_FIELDS
+from langchain.docstore.document import Document
 
 # def retrieve_full_recipes(query: str,
 #                           mode: str,
@@ -46,84 +51,514 @@ from query_construction import query_classifier
 #     return matched
 
 
-def cosine_similarity(vec1, vec2):
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+SEARCH_MODES = ("title", "ingredients", "instructions")
 
-def is_semantically_similar_to_exclude(recipe_text: str, exclude_vectors: List[List[float]], embeddings, threshold: float = 0.2) -> bool:
-    try:
-        recipe_vector = embeddings.embed_query(recipe_text)
-    except Exception as e:
-        print(f"⚠️ Embedding failed for recipe: {e}")
-        return False
+# Reciprocal-rank fusion: per-field weights and the usual k=60 damping constant
+# bm25_* fields are the lexical (sparse) hits for the same sub-queries
+DEFAULT_FIELD_WEIGHTS = {"title": 1.0, "ingredients": 1.0, "instructions": 0.7,
+                         "bm25_title": 0.8, "bm25_ingredients": 0.8}
+RRF_K = 60
 
-    for ex_vec in exclude_vectors:
-        sim = cosine_similarity(recipe_vector, ex_vec)
-        if sim >= threshold:
-            return True
-    return False
+# Instruction steps are indexed one document per step: fetch this many steps per wanted
+# recipe first and double the fetch (up to the cap) until enough distinct recipes show up
+INSTRUCTION_OVERFETCH = 4
+INSTRUCTION_MAX_FETCH = 1024
 
+# Cosine similarity between a candidate's stored title/ingredient vector and an exclusion
+# term at or above which the candidate is dropped; negation queries search this many
+# times more candidates so filtering still leaves top_k recipes
+EXCLUDE_SIMILARITY_THRESHOLD = 0.45
+EXCLUDE_OVERFETCH = 4
 
-def retrieve_full_recipes(query: Dict,
-                          json_path: str,
-                          top_k: int = 5):
-    full_recipes = load_recipes_from_json(json_path)
-    id_to_recipe = {r["id"]: r for r in full_recipes}
-
-    # Embedding model
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        cache_folder="./hf_cache",
-        model_kwargs={"device": "cpu"},
-        encode_kwargs={"normalize_embeddings": True}
-    )
+# Nutrition-driven queries rank/filter a wider candidate pool than top_k
+NUTRITION_OVERFETCH = 10
+
+# Speculative raw-query search started while the query is being classified: candidates
+# fetched per field, and the fields it covers
+SPECULATIVE_POOL = 100
+SPECULATIVE_MODES = ("title", "ingredients")
 
-    modes = query["type"]
-    exclude_keywords = (query["title"]["exclude"] + query["ingredients"]["exclude"] + query["instructions"]["exclude"])
-    # Embed all exclusion terms once
-    exclude_vectors = [embeddings.embed_query(term) for term in exclude_keywords]
 
-    temp_results =[]
+def stored_embeddings(vectorstore, recipe_ids: List[str]) -> Tuple[List[str], np.ndarray]:
+    """Embeddings already stored in a per-recipe collection (title / ingredients) for recipe_ids."""
+    got = vectorstore.get(where={"id": {"$in": list(recipe_ids)}}, include=["embeddings", "metadatas"])
+    ids = [metadata.get("id") for metadata in got["metadatas"]]
+    if not ids:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return ids, np.asarray(got["embeddings"], dtype=np.float32).reshape(len(ids), -1)
+
+
+def semantic_exclusion_mask(recipe_ids: List[str],
+                            exclude_vectors: List[List[float]],
+                            registry=None,
+                            threshold: float = EXCLUDE_SIMILARITY_THRESHOLD,
+                            modes: Tuple[str, ...] = ("title", "ingredients")) -> np.ndarray:
+    """Boolean mask over recipe_ids, True where a recipe is too similar to any exclusion term.
+
+    Candidate title/ingredient vectors are read back from Chroma (normalised at ingest)
+    instead of re-embedded, and compared with all exclusion vectors in one matrix product.
+    """
+    excluded = np.zeros(len(recipe_ids), dtype=bool)
+    if not recipe_ids or not exclude_vectors:
+        return excluded
+
+    registry = registry or get_registry()
+    exclude_matrix = np.asarray(exclude_vectors, dtype=np.float32)
+    exclude_matrix /= np.linalg.norm(exclude_matrix, axis=1, keepdims=True) + 1e-12
+    position = {recipe_id: i for i, recipe_id in enumerate(recipe_ids)}
 
     for mode in modes:
-        if mode == "title":
-            persist_directory = "./chroma_title"
-        elif mode == "ingredients":
-            persist_directory = "./chroma_ingredients"
-        elif mode == 'instructions':
-            persist_directory = "./chroma_instructions"
-        else:
+        ids, vectors = stored_embeddings(registry.vectorstore(mode), recipe_ids)
+        if not ids:
+            continue
+        similarities = vectors @ exclude_matrix.T  # (candidates, exclusion terms)
+        too_close = similarities.max(axis=1) >= threshold
+        rows = np.fromiter((position[recipe_id] for recipe_id in ids), dtype=np.int64, count=len(ids))
+        excluded[rows[too_close]] = True
+    return excluded
+
+
+def query_keywords(query: Dict, mode: str) -> List[str]:
+    """Include keywords of one field as a list.
+
+    Older classifier output joined them into one string (ingredients with ';'),
+    so plain strings are still accepted.
+    """
+    include = query.get(mode, {}).get("include", [])
+    if isinstance(include, str):
+        include = include.split(";") if mode == "ingredients" else [include]
+    return [k.strip() for k in include if k and k.strip()]
+
+
+def build_subqueries(query: Dict) -> List[Tuple[str, str]]:
+    """(mode, text) pairs: one per include keyword, so each concept gets its own embedding."""
+    subqueries = []
+    for mode in query.get("type", []):
+        if mode not in SEARCH_MODES:
             print(f"⚠️ Invalid mode: {mode}")
             continue
+        keywords = query_keywords(query, mode)
+        texts = list({k.lower(): k for k in keywords}.values())
+        if mode == "ingredients" and len(keywords) > 1:
+            # Ingredient documents are sorted ';'-joined names, so the joined set matches them as a whole too
+            texts.insert(0, ";".join(sorted(set(k.lower() for k in keywords))))
+        subqueries.extend((mode, text) for text in texts)
+    return subqueries
 
-        # Load corresponding vectorstore
-        vectorstore = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=embeddings
-        )
 
-        results = vectorstore.similarity_search(query[mode]["include"], k=top_k)
-        temp_results.append(results)
-    
-    all_results = [doc for result_list in temp_results for doc in result_list]
+def reciprocal_rank_fusion(per_mode: Dict[str, List[List[Tuple]]],
+                           field_weights: Dict[str, float] = None,
+                           top_k: int = 5,
+                           k: int = RRF_K) -> List[Dict]:
+    """Fuse ranked (Document, distance) lists into one unique recipe ranking.
+
+    Every sub-query list contributes weight / (k + rank) to each recipe it ranks, counting
+    only a recipe's first (best) appearance in that list, so several steps of one recipe
+    do not stack. Returns at most top_k dicts {"id", "score", "fields"} where "fields"
+    keeps the per-field RRF score, best rank and best distance for debugging.
+    """
+    weights = dict(DEFAULT_FIELD_WEIGHTS, **(field_weights or {}))
+    fused = {}
+    for mode, hit_lists in per_mode.items():
+        weight = weights.get(mode, 1.0)
+        for hits in hit_lists:
+            rank = 0
+            seen = set()
+            for doc, distance in hits:
+                recipe_id = doc.metadata.get("id")
+                if recipe_id in seen:
+                    continue
+                seen.add(recipe_id)
+                rank += 1
+
+                entry = fused.setdefault(recipe_id, {"id": recipe_id, "score": 0.0, "fields": {}})
+                contribution = weight / (k + rank)
+                entry["score"] += contribution
+                field = entry["fields"].setdefault(mode, {"rrf": 0.0, "rank": rank, "distance": distance})
+                field["rrf"] += contribution
+                field["rank"] = min(field["rank"], rank)
+                field["distance"] = min(field["distance"], distance)
+
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:top_k]
+
+
+def group_steps_by_recipe(hits: List[Tuple], aggregate: str = "max") -> List[Tuple]:
+    """Collapse step-level (Document, distance) hits into one hit per recipe.
+
+    The best-matching step represents the recipe. Recipes are ordered by their best step
+    ("max") or by the summed similarity of all matched steps ("sum"), which favours
+    recipes where several steps match. Similarity is 1 - d/2, i.e. cosine similarity for
+    the squared L2 distance Chroma reports on normalised embeddings.
+    """
+    if aggregate not in ("max", "sum"):
+        raise ValueError(f"Unknown aggregate '{aggregate}'. Choose 'max' or 'sum'.")
+
+    groups = {}
+    for doc, distance in hits:
+        recipe_id = doc.metadata.get("id")
+        similarity = 1.0 - distance / 2.0
+        if recipe_id not in groups:
+            groups[recipe_id] = {"doc": doc, "distance": distance, "score": similarity}
+            continue
+        group = groups[recipe_id]
+        if aggregate == "sum":
+            group["score"] += similarity
+        if distance < group["distance"]:
+            group["doc"], group["distance"] = doc, distance
+            if aggregate == "max":
+                group["score"] = similarity
+
+    ranked = sorted(groups.values(), key=lambda group: group["score"], reverse=True)
+    return [(group["doc"], group["distance"]) for group in ranked]
+
+
+def search_instruction_recipes(vectorstore,
+                               vector: List[float],
+                               top_k: int = 5,
+                               aggregate: str = "max",
+                               overfetch: int = INSTRUCTION_OVERFETCH,
+                               max_fetch: int = INSTRUCTION_MAX_FETCH) -> List[Tuple]:
+    """Search instruction steps and return up to top_k distinct recipes.
+
+    Starts with top_k * overfetch steps and doubles the fetch only while fewer than top_k
+    distinct recipes came back, the collection still has more steps, and max_fetch allows.
+    """
+    fetch = min(max(top_k * overfetch, top_k), max_fetch)
+    while True:
+        hits = vectorstore.similarity_search_by_vector_with_relevance_scores(vector, k=fetch)
+        recipes = group_steps_by_recipe(hits, aggregate)
+        if len(recipes) >= top_k or len(hits) < fetch or fetch >= max_fetch:
+            return recipes[:top_k]
+        fetch = min(fetch * 2, max_fetch)
+
+
+class SpeculativeResult:
+    """Title/ingredient candidates of a raw-query search, re-rankable for later sub-queries.
+
+    Holds, per field, the documents returned for the raw query vector r together with
+    their stored vectors, and the smallest similarity to r in the pool. Every document
+    outside the pool is further than that from r, so by the triangle inequality on
+    angles it is at least angle(pool edge, r) - angle(q, r) away from a sub-query vector
+    q. When the pool's k-th best match for q is closer than that bound, re-ranking the
+    pool gives the same top k as a new search would (exactly for exact backends, up to
+    the index's own approximation otherwise).
+    """
+
+    def __init__(self, raw_vector: np.ndarray, pools: Dict[str, Tuple[List, np.ndarray, float, bool]]):
+        self.raw_vector = raw_vector
+        self.pools = pools  # mode -> (documents, vectors, min similarity to r, pool covers the collection)
+
+    def reuse(self, mode: str, vector: np.ndarray, k: int):
+        """Top k (Document, squared L2 distance) hits for `vector` from the pool, or None if not guaranteed."""
+        if mode not in self.pools:
+            return None
+        docs, vectors, min_sim, complete = self.pools[mode]
+        if len(docs) == 0 or (len(docs) < k and not complete):
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        similarities = vectors @ query
+        order = np.argsort(-similarities, kind="stable")[:k]
+        if not complete:
+            kth_angle = np.arccos(np.clip(similarities[order[-1]], -1.0, 1.0))
+            drift = np.arccos(np.clip(float(query @ self.raw_vector), -1.0, 1.0))
+            radius = np.arccos(np.clip(min_sim, -1.0, 1.0))
+            if kth_angle > radius - drift:
+                return None
+        # same distance Chroma reports for normalised vectors
+        return [(docs[i], float(2.0 - 2.0 * similarities[i])) for i in order]
+
+
+class RetrievalExecutor:
+    """Runs all sub-queries of a request: one batched encoder pass, then concurrent vector searches."""
+
+    def __init__(self,
+                 registry=None,
+                 max_workers: int = 8,
+                 instruction_aggregate: str = "max",
+                 use_lexical: bool = True,
+                 skip_dense_on_exact: bool = True):
+        self.registry = registry or get_registry()
+        self.instruction_aggregate = instruction_aggregate
+        self.use_lexical = use_lexical
+        self.skip_dense_on_exact = skip_dense_on_exact
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        self._stats_lock = threading.Lock()
+        self._speculation = {"requests": 0, "subqueries": 0, "reused": 0}
+
+    def _search_one(self, mode: str, vector: np.ndarray, k: int, where: Dict = None):
+        vectorstore = self.registry.vectorstore(mode)
+        vector = np.asarray(vector, dtype=np.float32).tolist()
+        if mode == "instructions":
+            # steps carry no nutrition metadata; they are filtered through the nutrition index instead
+            return search_instruction_recipes(vectorstore, vector, top_k=k, aggregate=self.instruction_aggregate)
+        return vectorstore.similarity_search_by_vector_with_relevance_scores(vector, k=k, filter=where)
+
+    def _search_lexical(self, mode: str, text: str, k: int):
+        """BM25 hits as (Document, -score) so that, like distances, lower is better.
+
+        Returns (hits, exact) where exact means the title matched a dish name exactly and
+        dense search for this sub-query can be skipped.
+        """
+        index = get_lexical_index(mode)
+        if index is None:
+            return None, False
+        if self.skip_dense_on_exact and mode == "title":
+            exact = index.exact_matches(text, limit=k)
+            if exact:
+                return [(Document(page_content="", metadata={"id": recipe_id}), 0.0) for recipe_id in exact], True
+        hits = index.search(text, top_k=k)
+        return [(Document(page_content="", metadata={"id": recipe_id}), -score) for recipe_id, score in hits], False
+
+    def _speculate(self, raw_query: str, pool_size: int) -> SpeculativeResult:
+        raw_vector = np.asarray(self.registry.embed_queries([raw_query])[0], dtype=np.float32)
+        pools = {}
+        for mode in SPECULATIVE_MODES:
+            vectorstore = self.registry.vectorstore(mode)
+            hits = vectorstore.similarity_search_by_vector_with_relevance_scores(raw_vector.tolist(), k=pool_size)
+            ids, vectors = stored_embeddings(vectorstore, [doc.metadata.get("id") for doc, _ in hits])
+            position = {recipe_id: i for i, recipe_id in enumerate(ids)}
+            docs = [doc for doc, _ in hits if doc.metadata.get("id") in position]
+            vectors = vectors[[position[doc.metadata.get("id")] for doc in docs]] if docs else vectors
+            min_sim = float((vectors @ raw_vector).min()) if docs else 1.0
+            pools[mode] = (docs, vectors, min_sim, len(hits) < pool_size)
+        return SpeculativeResult(raw_vector, pools)
+
+    def speculate(self, raw_query: str, pool_size: int = SPECULATIVE_POOL):
+        """Start a raw-query title/ingredient search in the background; pass the future to search()."""
+        return self._pool.submit(self._speculate, raw_query, pool_size)
+
+    def speculation_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._speculation)
+        stats["hit_rate"] = stats["reused"] / stats["subqueries"] if stats["subqueries"] else 0.0
+        return stats
+
+    def search(self, query: Dict, top_k: int = 5, where: Dict = None, speculative=None) -> Dict[str, List[List[Tuple]]]:
+        """Per field, one (Document, distance) hit list for every include keyword of the query.
+
+        Dense fields are "title", "ingredients" and "instructions"; lexical BM25 lists are
+        added as "bm25_title" / "bm25_ingredients" when those indexes are built. `where` is
+        a Chroma metadata filter applied to the per-recipe (title/ingredients) collections.
+        `speculative` is a future from speculate(); title/ingredient sub-queries its pool
+        provably answers are re-ranked from it instead of searched again.
+        """
+        subqueries = build_subqueries(query)
+        if not subqueries:
+            return {}
+
+        per_mode = defaultdict(list)
+        dense_subqueries = []
+        for mode, text in subqueries:
+            if self.use_lexical and mode in LEXICAL_FIELDS:
+                hits, exact = self._search_lexical(mode, text, top_k)
+                if hits is not None:
+                    per_mode[f"bm25_{mode}"].append(hits)
+                if exact:
+                    continue
+            dense_subqueries.append((mode, text))
+
+        if dense_subqueries:
+            vectors = self.registry.embed_queries([text for _, text in dense_subqueries])
+            spec = self._speculative_result(speculative) if where is None else None
+            futures, candidates, reused = [], 0, 0
+            for (mode, _), vector in zip(dense_subqueries, vectors):
+                hits = None
+                if spec is not None and mode in SPECULATIVE_MODES:
+                    candidates += 1
+                    hits = spec.reuse(mode, vector, top_k)
+                    reused += hits is not None
+                if hits is not None:
+                    per_mode[mode].append(hits)
+                else:
+                    futures.append((mode, self._pool.submit(self._search_one, mode, vector, top_k, where)))
+            for mode, future in futures:
+                per_mode[mode].append(future.result())
+            if spec is not None:
+                with self._stats_lock:
+                    self._speculation["requests"] += 1
+                    self._speculation["subqueries"] += candidates
+                    self._speculation["reused"] += reused
+                print(f"🔮 Speculative search answered {reused}/{candidates} sub-queries "
+                      f"(hit rate so far {self.speculation_stats()['hit_rate']:.0%})")
+        return dict(per_mode)
+
+    @staticmethod
+    def _speculative_result(speculative):
+        if speculative is None:
+            return None
+        try:
+            return speculative.result()
+        except Exception as e:
+            print(f"⚠️ Speculative search failed: {e}")
+            return None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> RetrievalExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = RetrievalExecutor()
+    return _executor
+
+
+def apply_nutrition_index(hits: List[Dict],
+                          nutrition_index,
+                          constraints: List = None,
+                          nutrient: str = None,
+                          descending: bool = None,
+                          top_k: int = 5) -> List[Dict]:
+    """Intersect fused hits with nutrition constraints and, if asked, re-rank them by a nutrient.
+
+    Without hits (e.g. a query that only states a nutrition preference) the selection is
+    made over the whole corpus instead of the vector candidates.
+    """
+    mask = nutrition_index.mask(constraints) if constraints else None
+    rank_by_nutrient = nutrient is not None and descending is not None
+
+    if not hits:
+        if rank_by_nutrient:
+            rows = nutrition_index.top_k(nutrient, top_k, descending, mask=mask)
+        elif mask is not None:
+            rows = np.flatnonzero(mask)[:top_k]
+        else:
+            return []
+        return [{"id": recipe_id, "score": 0.0, "fields": {}} for recipe_id in nutrition_index.ids_for(rows)]
+
+    rows = nutrition_index.rows_for([hit["id"] for hit in hits])
+    if rank_by_nutrient:
+        best_rows = nutrition_index.top_k(nutrient, top_k, descending, rows=rows, mask=mask)
+        hit_by_row = {row: hit for row, hit in zip(rows, hits)}
+        return [hit_by_row[row] for row in best_rows]
+    keep = rows >= 0
+    if mask is not None:
+        keep &= mask[np.maximum(rows, 0)]
+    return [hit for hit, ok in zip(hits, keep) if ok][:top_k]
+
+
+def retrieve_full_recipes(query: Dict,
+                          json_path: str,
+                          top_k: int = 5,
+                          field_weights: Dict[str, float] = None,
+                          exclude_threshold: float = EXCLUDE_SIMILARITY_THRESHOLD,
+                          nutrition_pushdown: bool = False,
+                          return_scores: bool = False,
+                          speculative=None):
+    """Retrieve up to top_k unique recipes for a structured query.
+
+    Nutrition preferences (query["nutritions"] / ["descending"]) and constraints
+    (query["nutrition_constraints"], e.g. [["energy", "<", 200], ["salt", "==", "green"]])
+    are applied through the columnar nutrition index over an over-fetched candidate pool.
+    nutrition_pushdown=True also passes the constraints to Chroma as a `where` filter,
+    which needs collections ingested with nutrition metadata.
+
+    With return_scores=True, also returns the fused hits (per-field RRF scores, ranks
+    and distances) in the same order as the recipes. `speculative` is the future of a
+    raw-query search started with get_executor().speculate() while classifying.
+    """
+    recipe_store = get_recipe_store(json_path)
+
+    # Warm, process-wide encoder and vectorstores
+    registry = get_registry()
+
+    exclude_keywords = (query["title"]["exclude"] + query["ingredients"]["exclude"] + query["instructions"]["exclude"])
+    # Exclusion terms go through the query embedding cache; misses are encoded in one batch
+    exclude_vectors = registry.embed_queries(exclude_keywords)
+
+    constraints = query.get("nutrition_constraints") or []
+    nutrient, descending = query.get("nutritions"), query.get("descending")
+    try:
+        # also validates every constraint for the nutrition index mask
+        where = nutrient_where(constraints)
+    except (TypeError, ValueError) as e:
+        print(f"⚠️ Ignoring nutrition constraints {constraints!r}: {e}")
+        constraints, where = [], None
+    if nutrient is not None and nutrient not in NUTRIENTS:
+        print(f"⚠️ Ignoring unknown nutrition preference '{nutrient}'")
+        nutrient = None
+    nutrition_index = get_nutrition_index()
+    use_nutrition_index = nutrition_index is not None and (constraints or (nutrient is not None and descending is not None))
+
+    candidate_k = top_k * EXCLUDE_OVERFETCH if exclude_vectors else top_k
+    if use_nutrition_index:
+        candidate_k = max(candidate_k, top_k * NUTRITION_OVERFETCH)
+
+    # Every per-mode, per-keyword sub-query is encoded together and searched concurrently
+    where = where if nutrition_pushdown else None
+    per_mode = get_executor().search(query, top_k=candidate_k, where=where, speculative=speculative)
+    fused = reciprocal_rank_fusion(per_mode, field_weights=field_weights, top_k=candidate_k)
+    if not fused and use_nutrition_index:
+        # nutrition-only query: select from the whole corpus
+        fused = apply_nutrition_index([], nutrition_index, constraints, nutrient, descending, candidate_k)
+
+    # Drop candidates semantically close to any excluded term
+    excluded = semantic_exclusion_mask([hit["id"] for hit in fused], exclude_vectors, registry, exclude_threshold)
+    fused = [hit for hit, drop in zip(fused, excluded) if not drop]
+
+    if use_nutrition_index:
+        fused = apply_nutrition_index(fused, nutrition_index, constraints, nutrient, descending, top_k)
+    fused = fused[:top_k]
 
     final_results = []
-    for r in all_results:
-        recipe_id = r.metadata.get("id")
-        recipe = id_to_recipe[recipe_id]
-        # recipe_text = f"{recipe.get('title', '')} {recipe.get('ingredients', '')}".lower()
-        # if is_semantically_similar_to_exclude(recipe_text, exclude_vectors, embeddings):
-        #     continue
-        final_results.append(id_to_recipe[recipe_id])
-
-    # Sort the recipes by nutrition
-    if (query["nutritions"] is not None) and (query["descending"] is not None):
+    final_hits = []
+    for hit in fused:
+        recipe_id = hit["id"]
+        recipe = recipe_store.get(recipe_id)
+        if recipe is None:
+            print(f"⚠️ Recipe id '{recipe_id}' not found in JSON.")
+            continue
+        final_results.append(recipe)
+        final_hits.append(hit)
+
+    # Without a nutrition index, fall back to sorting the retrieved recipes themselves
+    if not use_nutrition_index and (nutrient is not None) and (descending is not None):
         final_results = top_k_by_nutrient(final_results, 
-                               nutrient=query["nutritions"],  
-                               descending = query["descending"]) 
-    
+                               nutrient=nutrient,  
+                               descending = descending) 
+        hit_by_id = {hit["id"]: hit for hit in final_hits}
+        final_hits = [hit_by_id[r["id"]] for r in final_results]
+
+    if return_scores:
+        return final_results, final_hits
     return final_results
 
 
+def retrieve_pantry_recipes(ingredients: List[str],
+                            json_path: str,
+                            top_k: int = 5,
+                            missing_penalty: float = 0.1,
+                            require_all: bool = False,
+                            return_scores: bool = False):
+    """Recipes that make the most of the given pantry ingredients, from the bitset pantry index.
+
+    Ranks by coverage of the user's ingredients minus a penalty per ingredient the recipe
+    needs but the user did not list; no embedding model is involved.
+    """
+    pantry_index = get_pantry_index()
+    if pantry_index is None:
+        print("⚠️ Pantry index not built yet, run data_preprocessing.ingest_to_chroma first.")
+        return ([], []) if return_scores else []
+
+    hits = pantry_index.search(ingredients, top_k=top_k, missing_penalty=missing_penalty, require_all=require_all)
+    recipe_store = get_recipe_store(json_path)
+    results, kept = [], []
+    for hit in hits:
+        recipe = recipe_store.get(hit["id"])
+        if recipe is None:
+            print(f"⚠️ Recipe id '{hit['id']}' not found in JSON.")
+            continue
+        results.append(recipe)
+        kept.append(hit)
+
+    if return_scores:
+        return results, kept
+    return results
+
+
 def top_k_by_nutrient(recipes: List[Dict], 
                       nutrient: str, # "energy""fat""protein""salt""saturates""sugars"
                     #   k: int = 5, 
@@ -161,7 +596,7 @@ if __name__ == "__main__":
     # query_test4 = "Can you find me a dessert recipe that does not have cherries and berries"
     # query= query_classifier(query_test4)
     # print(query)
-    query={'type': ['title', 'ingredients'], 'title': {'include': 'yogurt', 'exclude': []}, 'ingredients': {'include': '', 'exclude': []}, 'instructions': {'include': '', 'exclude': []}, 'nutritions': None, 'descending': None}
+    query={'type': ['title', 'ingredients'], 'title': {'include': ['yogurt'], 'exclude': []}, 'ingredients': {'include': [], 'exclude': []}, 'instructions': {'include': [], 'exclude': []}, 'nutritions': None, 'descending': None}
     path = "./recipes.json"
     result = retrieve_full_recipes(query, path)
     
@@ -0,0 +1,58 @@
+import classifier_cache
+from classifier_cache import ClassifierCache, normalize_query
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_query():
+    assert normalize_query("  Chicken   Soup?! ") == "chicken soup"
+    assert normalize_query("Chicken soup") == normalize_query("chicken soup.")
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(classifier_cache.time, "time", clock)
+    cache = ClassifierCache(":memory:", ttl=60)
+    cache.put("v1:soup", {"type": ["title"]})
+
+    clock.now += 60
+    assert cache.get("v1:soup") == {"type": ["title"]}
+    assert "v1:soup" in cache
+    clock.now += 1
+    assert cache.get("v1:soup") is None
+    assert "v1:soup" not in cache
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    # the next write purges expired rows
+    cache.put("v1:salad", {"type": ["ingredients"]})
+    assert len(cache) == 1
+
+
+def test_reads_keep_entries_from_lru_eviction(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(classifier_cache.time, "time", clock)
+    cache = ClassifierCache(":memory:", ttl=3600, max_entries=10)
+    for i in range(10):
+        clock.now += 1
+        cache.put(f"q{i}", {"i": i})
+    clock.now += 1
+    assert cache.get("q0") == {"i": 0}
+
+    clock.now += 1
+    cache.put("q10", {"i": 10})
+    # over the cap: the least recently used entries go, down to 90% of max_entries
+    assert len(cache) == 9
+    assert "q0" in cache and "q10" in cache
+    assert not any(f"q{i}" in cache for i in (1, 2))
+
+
+def test_cache_persists_across_connections(tmp_path):
+    path = str(tmp_path / "cache" / "classifier.sqlite")
+    ClassifierCache(path).put("v1:soup", {"type": ["title"]})
+    assert ClassifierCache(path).get("v1:soup") == {"type": ["title"]}
@@ -0,0 +1,47 @@
+from context_packing import count_tokens, pack_context, render_context_block
+
+
+def recipe(i, title, ingredients, steps=3):
+    return {"id": f"r{i}", "title": title, "url": f"http://example.com/{i}",
+            "ingredients": [{"text": t} for t in ingredients],
+            "instructions": [{"text": f"Step {s} of {title}, stirring well."} for s in range(steps)],
+            "nutr_values_per100g": {"energy": 100.0 + i, "fat": 2.5}}
+
+
+def test_block_renders_every_section():
+    block = render_context_block(recipe(1, "Tomato Soup", ["tomato", "onion"]))
+    context, report = pack_context([block], budget=10_000)
+    assert context.startswith("Title: Tomato Soup\nURL: http://example.com/1\n\nIngredients:\n- tomato\n- onion")
+    assert "Instructions:\n- Step 0 of Tomato Soup" in context
+    assert context.endswith("Nutrition (per 100g):\n- energy: 101.00 /100g\n- fat: 2.50 /100g")
+    assert report["tokens_packed"] == block["tokens"] == count_tokens(context)
+
+
+def test_summary_replaces_the_steps():
+    block = render_context_block(recipe(1, "Tomato Soup", ["tomato"]), summary="Simmer and blend.")
+    assert block["steps"] == ["- Simmer and blend."]
+    assert "Instructions (summary):" in block["head"]
+
+
+def test_budget_near_duplicates_and_truncation():
+    blocks = [render_context_block(r) for r in (
+        recipe(1, "Tomato Soup", ["tomato", "onion"], steps=30),
+        recipe(2, "Tomato Soup", ["tomato", "onion"]),
+        recipe(3, "Chicken Curry", ["chicken", "curry powder"]),
+        recipe(4, "Peanut Cookies", ["peanut butter", "flour"]),
+    )]
+    budget = blocks[2]["tokens"] + 200
+    context, report = pack_context(blocks, budget=budget, max_steps=5)
+    assert report["duplicates_dropped"] == 1
+    assert report["truncated"] >= 1
+    assert "- ... (25 more steps)" in context
+    assert report["tokens_packed"] <= budget
+    assert count_tokens(context) <= budget
+    assert context.index("Tomato Soup") < context.index("Chicken Curry")
+
+
+def test_top_recipe_is_kept_even_over_budget():
+    block = render_context_block(recipe(1, "Tomato Soup", ["tomato"], steps=40))
+    context, report = pack_context([block], budget=10)
+    assert report["recipes_used"] == 1
+    assert context.startswith("Title: Tomato Soup")
@@ -0,0 +1,100 @@
+import numpy as np
+
+from embedding_cache import ContentEmbeddingStore, QueryEmbeddingCache, normalize_query_text
+
+
+def vectors_for(texts, dim=8):
+    return np.stack([np.random.default_rng(abs(hash(t)) % 2**32).random(dim, dtype=np.float32) for t in texts])
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return vectors_for(texts).tolist()
+
+
+def test_normalize_query_text():
+    assert normalize_query_text("Garlic ; chicken") == normalize_query_text("chicken;garlic") == "chicken;garlic"
+    assert normalize_query_text("  Chicken   SOUP ") == "chicken soup"
+    assert normalize_query_text("chicken soup") != normalize_query_text("soup chicken")
+    assert normalize_query_text("egg;;egg; ") == "egg"
+
+
+def test_query_cache_encodes_misses_once_and_evicts_lru():
+    encoder, cache = FakeEncoder(), QueryEmbeddingCache(max_size=2)
+    vectors = cache.embed(["Soup", "soup ", "salad"], encoder)
+    assert encoder.calls == [["soup", "salad"]]
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+
+    cache.embed(["soup"], encoder)           # soup becomes most recently used
+    cache.embed(["cake"], encoder)           # evicts salad
+    cache.embed(["soup", "salad"], encoder)
+    assert encoder.calls[1:] == [["cake"], ["salad"]]
+    assert cache.stats() == {"size": 2, "max_size": 2, "hits": 3, "misses": 4, "evictions": 2,
+                             "hit_rate": 3 / 7}
+
+
+def test_query_cache_save_and_load(tmp_path):
+    path = str(tmp_path / "queries.npz")
+    encoder = FakeEncoder()
+    cache = QueryEmbeddingCache(persist_path=path, model_name="model")
+    expected = cache.embed(["soup", "salad"], encoder)
+    cache.save()
+
+    reloaded = QueryEmbeddingCache(persist_path=path, model_name="model")
+    assert len(reloaded) == 2
+    np.testing.assert_array_equal(reloaded.embed(["salad", "soup"], encoder), [expected[1], expected[0]])
+    assert len(encoder.calls) == 1
+    assert len(QueryEmbeddingCache(persist_path=path, model_name="other model")) == 0
+
+
+def test_store_round_trip_across_reopen(tmp_path):
+    texts = [f"text {i}" for i in range(50)]
+    with ContentEmbeddingStore("model", str(tmp_path)) as store:
+        store.add([store.key(t) for t in texts], vectors_for(texts))
+        assert len(store) == 50
+
+    store = ContentEmbeddingStore("model", str(tmp_path))
+    rows = store.lookup([store.key(t) for t in texts + ["unseen"]])
+    assert rows[-1] == -1
+    np.testing.assert_array_equal(store.vectors(rows[:-1]), vectors_for(texts))
+    store.close()
+
+
+def test_rows_added_after_the_last_flush_are_dropped_on_open(tmp_path):
+    flushed, lost, later = ["a", "b", "c"], ["d", "e"], ["f", "g", "h"]
+    store = ContentEmbeddingStore("model", str(tmp_path))
+    store.add([store.key(t) for t in flushed], vectors_for(flushed))
+    store.flush()
+    store.add([store.key(t) for t in lost], vectors_for(lost))
+    store._file.flush()  # the rows reach disk, then the process dies before the next flush
+
+    store = ContentEmbeddingStore("model", str(tmp_path))
+    assert len(store) == len(flushed)
+    assert list(store.lookup([store.key(t) for t in lost])) == [-1, -1]
+    store.add([store.key(t) for t in later], vectors_for(later))
+    store.flush()
+    for group in (flushed, later):
+        np.testing.assert_array_equal(store.vectors(store.lookup([store.key(t) for t in group])), vectors_for(group))
+    store.close()
+
+
+def test_interrupted_flush_keeps_index_and_count_consistent(tmp_path):
+    first, second = ["a", "b"], ["c", "d", "e"]
+    store = ContentEmbeddingStore("model", str(tmp_path))
+    store.add([store.key(t) for t in first], vectors_for(first))
+    store.flush()
+    store.add([store.key(t) for t in second], vectors_for(second))
+    store._file.flush()
+    # a crash mid-flush leaves at most a temporary index next to the committed one
+    (tmp_path / "model" / "index.npy.tmp").write_bytes(b"partial")
+
+    store = ContentEmbeddingStore("model", str(tmp_path))
+    assert len(store) == len(first)
+    rows = store.lookup([store.key(t) for t in first + second])
+    assert list(rows[len(first):]) == [-1, -1, -1]
+    np.testing.assert_array_equal(store.vectors(rows[:len(first)]), vectors_for(first))
+    store.close()
@@ -0,0 +1,82 @@
+import pytest
+
+from fast_classifier import FAST_PATH_MIN_CONFIDENCE, FastClassifier
+from lexical_index import BM25Index, build_bm25_index
+from pantry_index import PantryIndex, build_pantry_index
+
+
+@pytest.fixture(scope="module")
+def classifier(tmp_path_factory):
+    root = tmp_path_factory.mktemp("indexes")
+    dishes = [
+        ("Chicken Curry", ["chicken", "onion", "garlic"]),
+        ("Tomato Soup", ["onion", "tomato", "garlic"]),
+        ("Peanut Cookies", ["peanut butter", "flour", "sugar"]),
+        ("Chocolate Dessert", ["chocolate", "nuts", "cream"]),
+    ]
+    recipes = [{"id": f"r{i}", "title": dishes[i % 4][0], "ingredients": [{"text": t} for t in dishes[i % 4][1]]}
+               for i in range(40)]
+    build_pantry_index(recipes, str(root / "pantry"))
+    build_bm25_index(((r["id"], r["title"]) for r in recipes), str(root / "title"))
+    return FastClassifier(PantryIndex(str(root / "pantry")), BM25Index(str(root / "title")))
+
+
+def test_negation_of_a_known_ingredient(classifier):
+    result, confidence = classifier.classify("tomato soup without garlic")
+    assert result["ingredients"]["exclude"] == ["garlic"]
+    assert result["title"]["include"] == ["tomato soup"]
+    assert confidence >= FAST_PATH_MIN_CONFIDENCE
+
+
+def test_strong_negation_of_a_multiword_ingredient(classifier):
+    result, _ = classifier.classify("cookies, I'm allergic to peanut butter")
+    assert result["ingredients"]["exclude"] == ["peanut butter"]
+
+
+def test_no_followed_by_an_unknown_word_is_not_a_negation(classifier):
+    result, confidence = classifier.classify("I have no idea what to cook with chicken")
+    assert "chicken" not in result["ingredients"]["exclude"]
+    assert confidence < FAST_PATH_MIN_CONFIDENCE
+
+
+def test_later_negation_still_found_after_a_rejected_one(classifier):
+    result, _ = classifier.classify("no idea, maybe tomato soup without onions")
+    assert result["ingredients"]["exclude"] == ["onions"]
+
+
+def test_unexplained_words_in_a_negation_lower_confidence(classifier):
+    result, confidence = classifier.classify("chicken curry without any weird spices")
+    assert result["ingredients"]["exclude"] == []
+    assert confidence < FAST_PATH_MIN_CONFIDENCE
+
+
+def test_negation_clause_ends_at_a_new_ingredient_frame(classifier):
+    result, _ = classifier.classify("cookies without onion, with sugar")
+    assert result["ingredients"]["exclude"] == ["onion"]
+    assert "sugar" in result["ingredients"]["include"]
+
+
+@pytest.mark.parametrize("query, excluded, requested", [
+    ("I don't like onions, tomato soup please", "onions", "tomato soup"),
+    ("no nuts, chocolate dessert", "nuts", "chocolate dessert"),
+    ("allergic to peanut butter, chicken curry", "peanut butter", "chicken curry"),
+    ("I hate onions and I want chicken curry", "onions", "chicken curry"),
+])
+def test_negation_clause_ends_before_the_request(classifier, query, excluded, requested):
+    result, confidence = classifier.classify(query)
+    assert result["ingredients"]["exclude"] == [excluded]
+    assert result["title"]["exclude"] == []
+    assert result["title"]["include"] == [requested]
+    assert confidence >= FAST_PATH_MIN_CONFIDENCE
+
+
+def test_negated_list_continues_over_commas(classifier):
+    result, _ = classifier.classify("chicken curry without onions, garlic or tomato")
+    assert result["ingredients"]["exclude"] == ["onions", "garlic", "tomato"]
+    assert result["title"]["include"] == ["chicken curry"]
+
+
+def test_negated_dish_is_left_to_the_llm(classifier):
+    result, confidence = classifier.classify("I hate tomato soup")
+    assert result["title"]["exclude"] == ["tomato soup"]
+    assert confidence < FAST_PATH_MIN_CONFIDENCE
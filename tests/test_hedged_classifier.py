@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from hedged_classifier import CircuitBreaker, ClassificationError, HedgedClassifier
+
+GOOD = {"type": ["title"]}
+
+
+def wait_until(predicate, timeout=2.0):
+    # the breaker hears about the primary from a future callback, just after classify returns
+    end = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < end:
+        time.sleep(0.005)
+    return predicate()
+
+
+class Classifier:
+    def __init__(self, ok=True, delay=0.0, error=None):
+        self.ok, self.delay, self.error = ok, delay, error
+        self.calls = 0
+
+    def __call__(self, query):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return (GOOD if self.ok else None), self.ok
+
+
+def test_primary_wins_when_fast():
+    hedged = HedgedClassifier(Classifier(), Classifier(), deadline=1.0)
+    assert hedged.classify("soup") == (GOOD, "primary")
+
+
+@pytest.mark.parametrize("primary", [Classifier(ok=False), Classifier(error=RuntimeError("quota"))])
+def test_failed_primary_falls_back(primary):
+    fallback = Classifier()
+    hedged = HedgedClassifier(primary, fallback, deadline=1.0)
+    assert hedged.classify("soup") == (GOOD, "fallback")
+    assert hedged.stats()["primary_failures"] == 1
+
+
+def test_slow_primary_is_hedged():
+    hedged = HedgedClassifier(Classifier(delay=0.5), Classifier(), deadline=2.0)
+    hedged.latencies.percentile = lambda q, default: 0.05
+    start = time.monotonic()
+    assert hedged.classify("soup") == (GOOD, "fallback")
+    assert time.monotonic() - start < 0.4
+    assert hedged.stats()["hedges_fired"] == 1
+
+
+def test_both_failing_raises():
+    hedged = HedgedClassifier(Classifier(ok=False), Classifier(ok=False), deadline=1.0)
+    with pytest.raises(ClassificationError):
+        hedged.classify("soup")
+
+
+def test_deadline_raises_when_both_are_slow():
+    hedged = HedgedClassifier(Classifier(delay=1.0), Classifier(delay=1.0), deadline=0.2)
+    start = time.monotonic()
+    with pytest.raises(ClassificationError):
+        hedged.classify("soup")
+    assert time.monotonic() - start < 0.6
+    assert hedged.stats()["deadline_misses"] == 1
+
+
+def test_breaker_opens_routes_to_fallback_and_recovers():
+    primary, fallback = Classifier(ok=False), Classifier()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    hedged = HedgedClassifier(primary, fallback, deadline=1.0, breaker=breaker)
+    for _ in range(2):
+        hedged.classify("soup")
+    assert wait_until(lambda: breaker.state == "open")
+
+    calls = primary.calls
+    assert hedged.classify("soup") == (GOOD, "fallback")
+    assert primary.calls == calls
+    assert hedged.stats()["breaker_routed"] == 1
+
+    # half-open: one trial goes to the primary, and its success closes the breaker
+    time.sleep(0.25)
+    primary.ok = True
+    assert hedged.classify("soup") == (GOOD, "primary")
+    assert wait_until(lambda: breaker.state == "closed")
+
+
+def test_open_breaker_with_failing_fallback_raises():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    hedged = HedgedClassifier(Classifier(), Classifier(ok=False), deadline=0.5, breaker=breaker)
+    with pytest.raises(ClassificationError):
+        hedged.classify("soup")
+
+
+def test_failed_half_open_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.trips == 2
@@ -0,0 +1,60 @@
+import os
+
+from index_publish import CURRENT_FILE, IndexCache, current_dir, publish, staging_dir
+
+
+def build(index_dir, content):
+    tmp_dir = staging_dir(index_dir)
+    with open(os.path.join(tmp_dir, "data.txt"), "w", encoding="utf-8") as f:
+        f.write(content)
+    return publish(tmp_dir, index_dir)
+
+
+def read(index_dir):
+    with open(os.path.join(current_dir(index_dir), "data.txt"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_publish_swaps_the_pointer_and_keeps_two_generations(tmp_path):
+    index_dir = str(tmp_path / "index")
+    for n in range(1, 5):
+        assert build(index_dir, f"build {n}") == os.path.join(index_dir, f"v{n}")
+        assert read(index_dir) == f"build {n}"
+    assert sorted(os.listdir(index_dir)) == [CURRENT_FILE, "v3", "v4"]
+
+
+def test_legacy_flat_index_is_read_in_place_then_replaced(tmp_path):
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    (index_dir / "data.txt").write_text("legacy", encoding="utf-8")
+    assert current_dir(str(index_dir)) == str(index_dir)
+    assert read(str(index_dir)) == "legacy"
+
+    build(str(index_dir), "versioned")
+    assert read(str(index_dir)) == "versioned"
+    assert not (index_dir / "data.txt").exists()
+
+
+def test_a_reader_of_the_previous_generation_keeps_working(tmp_path):
+    index_dir = str(tmp_path / "index")
+    build(index_dir, "old")
+    resolved = current_dir(index_dir)
+    build(index_dir, "new")
+    with open(os.path.join(resolved, "data.txt"), encoding="utf-8") as f:
+        assert f.read() == "old"
+
+
+def test_index_cache_reloads_only_after_a_publish(tmp_path):
+    index_dir = str(tmp_path / "index")
+    loads = []
+    cache = IndexCache(lambda path: loads.append(path) or read(index_dir), "data.txt")
+    assert cache.get(index_dir) is None
+
+    build(index_dir, "first")
+    assert cache.get(index_dir) == "first"
+    assert cache.get(index_dir) == "first"
+    assert len(loads) == 1
+
+    build(index_dir, "second")
+    assert cache.get(index_dir) == "second"
+    assert loads == [os.path.join(index_dir, "v1"), os.path.join(index_dir, "v2")]
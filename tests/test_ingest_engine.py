@@ -0,0 +1,92 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from embedding_cache import ContentEmbeddingStore
+from ingest_engine import write_pipelined
+
+
+class Doc:
+    def __init__(self, page_content, metadata):
+        self.page_content, self.metadata = page_content, metadata
+
+
+def encode(text, dim=4):
+    return np.random.default_rng(sum(map(ord, text))).random(dim, dtype=np.float32)
+
+
+class FakeEncoder:
+    """Encodes batches with `lookahead` of them in flight, like EncoderPool.imap."""
+
+    def __init__(self, lookahead=2):
+        self.lookahead, self.workers, self.encode_seconds = lookahead, 1, 0.0
+        self.encoded = []
+
+    def imap(self, text_batches):
+        in_flight = deque()
+        for texts in text_batches:
+            self.encoded.extend(texts)
+            self.encode_seconds += 0.01
+            in_flight.append(np.stack([encode(t) for t in texts]) if texts else np.zeros((0, 0), dtype=np.float32))
+            if len(in_flight) >= self.lookahead:
+                yield in_flight.popleft()
+        while in_flight:
+            yield in_flight.popleft()
+
+
+class FakeCollection:
+    def __init__(self, fail_after=None):
+        self.rows, self.fail_after = {}, fail_after
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        if self.fail_after is not None and len(self.rows) >= self.fail_after:
+            raise RuntimeError("disk full")
+        for i, vector, text in zip(ids, embeddings, documents):
+            self.rows[i] = (np.asarray(vector), text)
+
+
+class FakeStore:
+    def __init__(self, fail_after=None):
+        self._collection = FakeCollection(fail_after)
+
+
+def docs(texts):
+    return [Doc(text, {"id": f"r{i}"}) for i, text in enumerate(texts)]
+
+
+def test_write_pipelined_writes_every_document_in_order():
+    store, encoder, written = FakeStore(), FakeEncoder(), []
+    texts = [f"text {i}" for i in range(10)]
+    stats = write_pipelined(docs(texts), store, encoder, batch_size=3,
+                            doc_ids=lambda d: d.metadata["id"], on_written=written.append)
+    assert stats["docs"] == stats["encoded"] == 10
+    assert [len(batch) for batch in written] == [3, 3, 3, 1]
+    assert encoder.encoded == texts
+    for i, text in enumerate(texts):
+        vector, document = store._collection.rows[f"r{i}"]
+        assert document == text
+        np.testing.assert_array_equal(vector, encode(text))
+
+
+def test_write_pipelined_encodes_each_distinct_text_once(tmp_path):
+    texts = ["Serve.", "Bake.", "Serve.", "Mix.", "Serve.", "Bake.", "Mix.", "Chill.", "Serve."]
+    cache = ContentEmbeddingStore("model", str(tmp_path))
+    store, encoder = FakeStore(), FakeEncoder(lookahead=3)
+    stats = write_pipelined(docs(texts), store, encoder, batch_size=2,
+                            doc_ids=lambda d: d.metadata["id"], cache=cache)
+    # repeats in the same or a later batch in flight are not sent to the encoder again
+    assert sorted(encoder.encoded) == sorted(set(texts))
+    assert stats["encoded"] == 4 and stats["dedup_ratio"] == pytest.approx(9 / 4)
+    for i, text in enumerate(texts):
+        np.testing.assert_array_equal(store._collection.rows[f"r{i}"][0], encode(text))
+
+    rebuild = FakeEncoder()
+    stats = write_pipelined(docs(texts), FakeStore(), rebuild, batch_size=2, cache=cache)
+    assert rebuild.encoded == [] and stats["encoded"] == 0 and stats["dedup_ratio"] == float("inf")
+    cache.close()
+
+
+def test_write_pipelined_raises_the_write_error():
+    with pytest.raises(RuntimeError, match="disk full"):
+        write_pipelined(docs([f"text {i}" for i in range(20)]), FakeStore(fail_after=4), FakeEncoder(), batch_size=2)
@@ -0,0 +1,133 @@
+from ingest_manifest import IngestManifest, collection_version, document_id, document_id_batches
+
+
+class Doc:
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+        self.deleted = []
+
+    def upsert(self, docs):
+        self.rows.update((document_id(d), d.page_content) for d in docs)
+
+    def delete(self, ids):
+        self.deleted += ids
+        for i in ids:
+            self.rows.pop(i, None)
+
+
+class FakeStore:
+    def __init__(self):
+        self._collection = FakeCollection()
+
+
+def to_documents(recipe):
+    docs = [Doc(recipe["title"], {"id": recipe["id"]})]
+    docs += [Doc(step, {"id": recipe["id"], "step": i}) for i, step in enumerate(recipe["steps"])]
+    return docs
+
+
+RECIPES = [{"id": str(i), "title": f"recipe {i}", "steps": [f"step {j} of {i}" for j in range(i % 3 + 1)]}
+           for i in range(40)]
+TOTAL = sum(len(to_documents(r)) for r in RECIPES)
+BATCH = 7
+
+
+def batches(docs):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def test_rerun_after_crash_resumes_from_last_committed_batch(tmp_path):
+    store = FakeStore()
+
+    # run 1 commits three batches, writes a fourth to Chroma, then dies before recording it
+    manifest = IngestManifest(str(tmp_path))
+    committed = 0
+    for n, batch in enumerate(batches(manifest.changed_documents(RECIPES, to_documents))):
+        store._collection.upsert(batch)
+        if n == 3:
+            break
+        manifest.record_written(batch)
+        committed += len(batch)
+    manifest.close()
+
+    manifest = IngestManifest(str(tmp_path))
+    assert manifest.run == 2
+    encoded = list(manifest.changed_documents(RECIPES, to_documents))
+    assert len(encoded) == TOTAL - committed
+    assert not {document_id(d) for d in encoded} & set(list(store._collection.rows)[:committed])
+    for batch in batches(encoded):
+        store._collection.upsert(batch)
+        manifest.record_written(batch)
+    counts = manifest.finish(store)
+    manifest.close()
+
+    assert len(store._collection.rows) == TOTAL
+    assert store._collection.deleted == []
+    assert counts["docs_written"] == TOTAL - committed
+    assert counts["docs_deleted"] == 0
+
+
+def test_unchanged_rerun_encodes_nothing_and_prunes_removed_recipes(tmp_path):
+    store = FakeStore()
+    manifest = IngestManifest(str(tmp_path))
+    for batch in batches(manifest.changed_documents(RECIPES, to_documents)):
+        store._collection.upsert(batch)
+        manifest.record_written(batch)
+    manifest.finish(store)
+    manifest.close()
+
+    manifest = IngestManifest(str(tmp_path))
+    assert list(manifest.changed_documents(RECIPES, to_documents)) == []
+    manifest.finish(store)
+    manifest.close()
+    assert len(store._collection.rows) == TOTAL
+
+    manifest = IngestManifest(str(tmp_path))
+    assert list(manifest.changed_documents(RECIPES[1:], to_documents)) == []
+    counts = manifest.finish(store)
+    manifest.close()
+    assert sorted(store._collection.deleted) == sorted(document_id(d) for d in to_documents(RECIPES[0]))
+    assert counts["recipes_deleted"] == 1
+
+
+def test_collection_version_moves_only_when_the_collection_changes(tmp_path):
+    assert collection_version(str(tmp_path)) is None
+    store = FakeStore()
+    for recipes in (RECIPES, RECIPES, RECIPES[1:]):
+        manifest = IngestManifest(str(tmp_path))
+        for batch in batches(manifest.changed_documents(recipes, to_documents)):
+            store._collection.upsert(batch)
+            manifest.record_written(batch)
+        manifest.finish(store)
+        manifest.close()
+        if manifest.run == 1:
+            assert collection_version(str(tmp_path)) == 1
+        elif manifest.run == 2:
+            # nothing written or deleted: derived indexes built after run 1 are still current
+            assert collection_version(str(tmp_path)) == 1
+        else:
+            assert collection_version(str(tmp_path)) == 3
+
+
+def test_document_id_batches_pages_through_every_committed_document(tmp_path):
+    manifest = IngestManifest(str(tmp_path))
+    for batch in batches(manifest.changed_documents(RECIPES, to_documents)):
+        manifest.record_written(batch)
+    manifest.close()
+    pages = list(document_id_batches(str(tmp_path), batch_size=16))
+    assert all(len(page) == 16 for page in pages[:-1])
+    assert sorted(i for page in pages for i in page) == sorted(document_id(d) for r in RECIPES for d in to_documents(r))
+    assert list(document_id_batches(str(tmp_path / "missing"))) == []
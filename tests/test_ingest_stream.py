@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from ingest_stream import RecipeStream, batched, iter_json_array
+
+RECIPES = [{"id": f"r{i}", "title": f"Dish {i} with ünïcode, [brackets] and \"quotes\"",
+            "ingredients": [{"text": "x" * i}]} for i in range(30)]
+
+
+@pytest.fixture
+def recipes_path(tmp_path):
+    path = tmp_path / "recipes.json"
+    path.write_text(json.dumps(RECIPES, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iter_json_array_matches_json_load(recipes_path, chunk_size):
+    assert list(iter_json_array(str(recipes_path), chunk_size=chunk_size)) == RECIPES
+
+
+@pytest.mark.parametrize("text", ["[]", "  [\n ]\n", "[1, [2, 3], {\"a\": null}, \"s\"]"])
+def test_iter_json_array_small_documents(tmp_path, text):
+    path = tmp_path / "small.json"
+    path.write_text(text, encoding="utf-8")
+    assert list(iter_json_array(str(path), chunk_size=2)) == json.loads(text)
+
+
+@pytest.mark.parametrize("cut", ["inside an element", "after a comma", "before the bracket"])
+def test_truncated_file_yields_complete_elements_then_raises(recipes_path, tmp_path, cut):
+    text = recipes_path.read_text(encoding="utf-8")
+    end_of_third = text.index('"r3"') - 1
+    truncated = {"inside an element": text[:text.index('"r3"') + 10],
+                 "after a comma": text[:text.rindex(",", 0, end_of_third) + 1],
+                 "before the bracket": text.rstrip()[:-1]}[cut]
+    path = tmp_path / "truncated.json"
+    path.write_text(truncated, encoding="utf-8")
+
+    parsed = []
+    with pytest.raises(ValueError):
+        for recipe in iter_json_array(str(path), chunk_size=16):
+            parsed.append(recipe)
+    assert parsed == RECIPES[:len(parsed)]
+    assert len(parsed) == (30 if cut == "before the bracket" else 3)
+
+
+def test_non_array_file_is_rejected(tmp_path):
+    path = tmp_path / "object.json"
+    path.write_text('{"id": "r0"}', encoding="utf-8")
+    with pytest.raises(ValueError, match="JSON array"):
+        list(iter_json_array(str(path)))
+
+
+def test_recipe_stream_is_re_iterable_and_limited(recipes_path):
+    stream = RecipeStream(str(recipes_path), limit=5)
+    assert list(stream) == RECIPES[:5]
+    assert [r["id"] for r in stream] == [f"r{i}" for i in range(5)]
+    assert list(RecipeStream(str(recipes_path), limit=0)) == RECIPES
+
+
+def test_batched():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from instruction_summaries import checkpoint_path, get_summaries, read_checkpoint, summarize_instructions
+
+
+class FakeSummarizer:
+    """Summarizes a prompt as its upper-cased instructions, recording every batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def token_lengths(self, prompts):
+        return [len(p) for p in prompts]
+
+    def summarize(self, prompts):
+        self.batches.append(prompts)
+        return [p.split("Instructions:")[1].split("Return")[0].strip().upper() for p in prompts]
+
+
+def recipe(i, steps):
+    return {"id": f"r{i}", "instructions": [{"text": step} for step in steps]}
+
+
+RECIPES = [recipe(i, ["Mix" + " well" * i, "Bake."]) for i in range(6)] + [recipe(6, [])]
+
+
+def test_read_checkpoint_cuts_off_a_torn_last_line(tmp_path):
+    path = tmp_path / "summaries.checkpoint.jsonl"
+    lines = [json.dumps({"id": f"r{i}", "hash": f"h{i}", "summary": "s"}) + "\n" for i in range(3)]
+    path.write_text("".join(lines) + '{"id": "r3", "ha', encoding="utf-8")
+    assert read_checkpoint(str(path)) == {"r0": "h0", "r1": "h1", "r2": "h2"}
+    assert path.read_text(encoding="utf-8") == "".join(lines)
+    assert read_checkpoint(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_summaries_resume_and_follow_instruction_changes(tmp_path):
+    pytest.importorskip("data_preprocessing", reason="needs the ingest dependencies")
+    out_dir = str(tmp_path / "summaries")
+    summarizer = FakeSummarizer()
+    assert summarize_instructions(RECIPES, out_dir, batch_size=2, summarizer=summarizer) == 6
+    # batches are bucketed by prompt length
+    prompts = [p for batch in summarizer.batches for p in batch]
+    assert [len(p) for p in prompts] == sorted(len(p) for p in prompts)
+    summaries = get_summaries(RECIPES, out_dir)
+    assert sorted(summaries) == [f"r{i}" for i in range(6)]
+    assert summaries["r2"] == "MIX WELL WELL BAKE."
+
+    # an interrupted run leaves a torn line; the rerun summarizes nothing again
+    with open(checkpoint_path(out_dir), "a", encoding="utf-8") as f:
+        f.write('{"id": "r9", "hash": "0')
+    rerun = FakeSummarizer()
+    assert summarize_instructions(RECIPES, out_dir, batch_size=2, summarizer=rerun) == 0
+    assert rerun.batches == []
+
+    edited = [recipe(1, ["Fry."])] + RECIPES[2:]
+    # the stored summary no longer matches r1's instructions
+    assert "r1" not in get_summaries(edited, out_dir)
+    assert summarize_instructions(edited, out_dir, summarizer=rerun) == 1
+    assert get_summaries(edited, out_dir)["r1"] == "FRY."
+    assert get_summaries(RECIPES[:1], out_dir) == {"r0": "MIX BAKE."}
+
+
+def test_get_summaries_without_a_store(tmp_path):
+    assert get_summaries(RECIPES, str(tmp_path / "none")) == {}
@@ -0,0 +1,78 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from lexical_index import BM25_B, BM25_K1, BM25Index, build_bm25_index, get_lexical_index, tokenize
+
+DOCS = [
+    ("r1", "Chicken Curry"),
+    ("r2", "Thai Green Curry with Chicken and Rice"),
+    ("r3", "Chicken Noodle Soup"),
+    ("r4", "Tomato Soup"),
+    ("r5", "Curry Chicken"),
+    ("r6", "Lemon Chicken"),
+    ("r7", "Vegetable Curries"),
+]
+
+
+def reference_scores(query):
+    """BM25 computed directly from the definition."""
+    tokenized = {i: tokenize(text) for i, text in DOCS}
+    avgdl = sum(len(t) for t in tokenized.values()) / len(DOCS)
+    scores = {}
+    for recipe_id, tokens in tokenized.items():
+        counts, score = Counter(tokens), 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in t for t in tokenized.values())
+            if not df or not counts[term]:
+                continue
+            idf = math.log(1 + (len(DOCS) - df + 0.5) / (df + 0.5))
+            tf = counts[term]
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avgdl))
+        if score:
+            scores[recipe_id] = score
+    return scores
+
+
+@pytest.fixture(params=[1000, 2], ids=["one-batch", "spilled"])
+def index(tmp_path, request):
+    build_bm25_index(DOCS, str(tmp_path / "title"), batch_size=request.param)
+    return BM25Index(str(tmp_path / "title"))
+
+
+def test_tokenize_folds_plurals_and_drops_stopwords():
+    assert tokenize("Curries with Tomatoes and the Glass") == ["curry", "tomatoe", "glass"]
+
+
+@pytest.mark.parametrize("query", ["chicken curry", "soup", "green curry rice", "lemon", "pizza"])
+def test_search_matches_the_bm25_definition(index, query):
+    expected = reference_scores(query)
+    hits = index.search(query, top_k=len(DOCS))
+    assert {i for i, _ in hits} == set(expected)
+    for recipe_id, score in hits:
+        assert score == pytest.approx(expected[recipe_id], rel=1e-5)
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+    assert len(index.search(query, top_k=2)) == min(2, len(expected))
+
+
+def test_exact_matches_need_exactly_the_query_terms(index):
+    assert sorted(index.exact_matches("chicken curry")) == ["r1", "r5"]
+    assert index.exact_matches("curry") == []
+    assert index.exact_matches("vegetable curry") == ["r7"]
+    assert index.exact_matches("chicken pizza") == []
+
+
+def test_document_frequencies(index):
+    df = index.document_frequencies()
+    assert df["chicken"] == 5 and df["curry"] == 4 and df["soup"] == 2
+
+
+def test_get_lexical_index_per_field(tmp_path):
+    assert get_lexical_index("title", str(tmp_path)) is None
+    build_bm25_index(DOCS, str(tmp_path / "title"))
+    index = get_lexical_index("title", str(tmp_path))
+    assert len(index) == len(DOCS)
+    assert get_lexical_index("title", str(tmp_path)) is index
+    assert np.asarray(index.terms).tolist() == [len(set(tokenize(t))) for _, t in DOCS]
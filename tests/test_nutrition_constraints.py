@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import pytest
+
+from nutrition_index import NutritionIndex, build_nutrition_index, normalize_constraints, nutrient_where
+
+
+MALFORMED = [
+    ["calories", "<", 300],   # unknown nutrient
+    ["fat", "<"],             # too few elements
+    ["fat", "<", 10, "g"],    # too many elements
+    ["fat", "<", "ten"],      # non-numeric value
+    ["sugars", "~", 3],       # unknown operator
+    ["protein", ">", True],   # bool is not a number
+    ["protein", ">", None],
+    ["energy", "<", float("nan")],
+    "fat < 10",
+    None,
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    rng = np.random.default_rng(0)
+    recipes = []
+    for i in range(5000):
+        nutr = {"energy": float(rng.random() * 500), "fat": float(rng.random() * 30)} if i % 7 else {}
+        fsa = {"salt": ["green", "orange", "red"][i % 3]}
+        recipes.append({"id": f"r{i:05d}", "nutr_values_per100g": nutr, "fsa_lights_per100g": fsa})
+    build_nutrition_index(recipes, str(tmp_path / "nutrition"))
+    return NutritionIndex(str(tmp_path / "nutrition"))
+
+
+def test_normalize_constraints_drops_malformed_entries():
+    valid = [["Fat", "<=", "12"], ["salt", "==", "Green"], ["energy", "<", 200]]
+    assert normalize_constraints(MALFORMED + valid) == [["fat", "<=", 12.0], ["salt", "==", "green"], ["energy", "<", 200]]
+    assert normalize_constraints([]) == []
+
+
+@pytest.mark.parametrize("constraint", MALFORMED)
+def test_mask_and_where_reject_malformed_constraints(index, constraint):
+    with pytest.raises((TypeError, ValueError)):
+        index.mask([constraint])
+    with pytest.raises((TypeError, ValueError)):
+        nutrient_where([constraint])
+
+
+def test_mask_matches_normalized_constraints(index):
+    constraints = normalize_constraints(MALFORMED + [["fat", "<", 5], ["salt", "==", "green"]])
+    mask = index.mask(constraints)
+    values = np.asarray(index.values)
+    fat = values[:, 1]
+    assert mask.sum() > 0
+    assert np.all(fat[mask] < 5)
+    assert not np.any(np.isnan(fat[mask]))
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("k", [1, 7, 5000])
+def test_top_k_over_the_corpus_matches_a_full_sort(index, descending, k):
+    mask = index.mask([["fat", "<", 3]])
+    energy = np.asarray(index.values)[:, 0]
+    for m in (None, mask):
+        rows = np.flatnonzero(~np.isnan(energy) & (m if m is not None else True))
+        expected = rows[np.argsort(-energy[rows] if descending else energy[rows], kind="stable")][:k]
+        got = index.top_k("energy", k, descending, mask=m)
+        assert len(got) == len(expected)
+        assert np.array_equal(np.sort(energy[got]), np.sort(energy[expected]))
+
+
+def test_top_k_with_an_empty_mask(index):
+    assert len(index.top_k("energy", 5, True, mask=np.zeros(len(index), dtype=bool))) == 0
+
+
+def test_parse_classifier_output_drops_invalid_constraints():
+    for module in ("langchain", "langchain_google_genai", "dotenv", "ollama"):
+        pytest.importorskip(module)
+    from query_construction import parse_classifier_output
+
+    reply = json.dumps({
+        "type": ["title"],
+        "title": {"include": ["soup"], "exclude": []},
+        "nutritions": "Protein",
+        "descending": "yes",
+        "nutrition_constraints": MALFORMED + [["fat", "<", "10"]],
+    })
+    parsed, ok = parse_classifier_output(reply)
+    assert ok
+    assert parsed["nutritions"] == "protein"
+    assert parsed["descending"] is None
+    assert parsed["nutrition_constraints"] == [["fat", "<", 10.0]]
+
+
+@pytest.mark.parametrize("op", ["<", "<=", ">", ">=", "=="])
+def test_range_rows_and_mask_match_a_column_scan(index, op):
+    values = np.asarray(index.values)
+    # a value present in the column, so the boundary of <=, >= and == is exercised
+    value = float(values[1, 1])
+    expected = np.flatnonzero({"<": np.less, "<=": np.less_equal, ">": np.greater,
+                               ">=": np.greater_equal, "==": np.equal}[op](values[:, 1], value))
+    assert np.array_equal(np.sort(index.range_rows("fat", op, value)), expected)
+    assert np.array_equal(np.flatnonzero(index.mask([["fat", op, value]])), expected)
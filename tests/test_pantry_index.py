@@ -0,0 +1,69 @@
+import pytest
+
+from pantry_index import PantryIndex, build_pantry_index, canonical_ingredient, get_pantry_index
+
+RECIPES = [
+    ("omelette", ["eggs, beaten", "butter", "salt"]),
+    ("pancakes", ["Eggs", "wheat flour", "milk", "butter", "salt"]),
+    ("toast", ["bread", "butter"]),
+    ("bread", ["flour", "yeast", "salt", "water"]),
+    ("egg salad", ["eggs", "mayonnaise", "salt"]),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    # 20 copies so the bitsets span several bytes
+    recipes = [{"id": f"{name}-{copy}", "ingredients": [{"text": t} for t in ingredients]}
+               for copy in range(4) for name, ingredients in RECIPES]
+    build_pantry_index(recipes, str(tmp_path / "pantry"))
+    return PantryIndex(str(tmp_path / "pantry"))
+
+
+def test_canonical_names_and_token_matching(index):
+    assert canonical_ingredient("Yogurt, greek, plain") == "yogurt"
+    assert "egg" not in index.vocab and "eggs" in index.vocab
+    # "flour" also covers "wheat flour"; "egg" finds "eggs"
+    assert [index.vocab[v] for v in index.vocab_rows("flour")] == ["flour", "wheat flour"]
+    assert [index.vocab[v] for v in index.vocab_rows("egg")] == ["eggs"]
+    assert index.vocab_rows("saffron") == []
+
+
+def test_bitset_counts_match_a_scan(index):
+    assert index.count_with_all(["eggs", "salt"]) == 12
+    assert index.count_with_all(["butter", "flour"]) == 4
+    assert index.count_with_all(["saffron"]) == 0
+    df = dict(zip(index.vocab, index.document_frequencies()))
+    assert df["butter"] == 12 and df["yeast"] == 4
+
+
+def test_search_scores_coverage_minus_missing_penalty(index):
+    hits = index.search(["eggs", "butter", "salt"], top_k=3, missing_penalty=0.1)
+    assert {h["id"].split("-")[0] for h in hits} == {"omelette"}
+    assert hits[0]["score"] == pytest.approx(1.0)
+    assert hits[0]["matched"] == ["eggs", "butter", "salt"] and hits[0]["missing"] == 0
+
+    ranked = index.search(["eggs", "butter", "salt"], top_k=20)
+    scores = {h["id"].split("-")[0]: h["score"] for h in ranked}
+    # pancakes use all three but need flour and milk too; egg salad misses butter and needs mayonnaise
+    assert scores["pancakes"] == pytest.approx(1.0 - 0.2)
+    assert scores["egg salad"] == pytest.approx(2 / 3 - 0.1)
+    assert scores["omelette"] > scores["pancakes"] > scores["egg salad"] > scores["toast"]
+    assert [h["score"] for h in ranked] == sorted((h["score"] for h in ranked), reverse=True)
+
+
+def test_require_all_and_empty_queries(index):
+    hits = index.search(["eggs", "flour"], top_k=10, require_all=True)
+    assert {h["id"].split("-")[0] for h in hits} == {"pancakes"}
+    assert index.search([], top_k=5) == []
+    assert index.search(["saffron"], top_k=5) == []
+
+
+def test_get_pantry_index_reloads_after_a_rebuild(tmp_path):
+    index_dir = str(tmp_path / "pantry")
+    assert get_pantry_index(index_dir) is None
+    build_pantry_index([{"id": "a", "ingredients": [{"text": "salt"}]}], index_dir)
+    first = get_pantry_index(index_dir)
+    assert get_pantry_index(index_dir) is first and len(first) == 1
+    build_pantry_index([{"id": "a", "ingredients": [{"text": "salt"}]}, {"id": "b", "ingredients": []}], index_dir)
+    assert len(get_pantry_index(index_dir)) == 2
@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+recipe_store = pytest.importorskip("recipe_store", reason="needs the ingest dependencies")
+
+
+def write_json(path, recipes):
+    path.write_text(json.dumps(recipes), encoding="utf-8")
+
+
+RECIPES = [{"id": f"r{i}", "title": f"Recipe {i}", "ingredients": [{"text": "salt"}]} for i in range(5)]
+
+
+def test_recipe_store_parses_once_and_reloads_only_on_content_change(tmp_path):
+    path = tmp_path / "recipes.json"
+    write_json(path, RECIPES)
+    store = recipe_store.RecipeStore(str(path))
+    assert store.refresh()
+    assert not store.refresh()
+    assert store.reload_count == 1
+    assert [r["id"] for r in store.get_many(["r3", "missing", "r0"])] == ["r3", "r0"]
+    assert "r4" in store and len(store) == 5
+
+    # touched but byte-identical: re-hashed, not re-parsed
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not store.refresh()
+    assert store.reload_count == 1
+
+    write_json(path, RECIPES[:2])
+    assert store.refresh()
+    assert store.reload_count == 2
+    assert len(store) == 2 and store.get("r4") is None
+
+
+def test_get_recipe_store_is_shared_per_path(tmp_path):
+    path = tmp_path / "recipes.json"
+    write_json(path, RECIPES)
+    first = recipe_store.get_recipe_store(str(path), pack_dir=str(tmp_path / "no_pack"))
+    second = recipe_store.get_recipe_store(str(path), pack_dir=str(tmp_path / "no_pack"))
+    assert first is second
+    assert isinstance(first, recipe_store.RecipeStore)
+    assert first.reload_count == 1
+
+
+@pytest.fixture
+def pack(tmp_path):
+    from data_preprocessing import build_recipe_pack
+
+    path = tmp_path / "recipes.json"
+    write_json(path, RECIPES)
+    # unsorted ids, so the pack's sorted index is exercised
+    build_recipe_pack(reversed(RECIPES), str(tmp_path / "pack"), source_path=str(path))
+    return path, tmp_path / "pack"
+
+
+def test_pack_round_trip(pack):
+    path, pack_dir = pack
+    store = recipe_store.PackedRecipeStore(str(pack_dir))
+    assert store.refresh()
+    assert len(store) == 5
+    assert store.get("r2") == RECIPES[2]
+    assert store.get("missing") is None
+    assert [r["id"] for r in store.get_many(["r4", "nope", "r1"])] == ["r4", "r1"]
+    assert recipe_store.load_recipes_by_ids(["r3"], pack_dir=str(pack_dir)) == [RECIPES[3]]
+
+
+def test_pack_goes_stale_when_recipes_json_changes(pack):
+    path, pack_dir = pack
+    assert recipe_store.pack_is_fresh(str(pack_dir), str(path))
+    assert isinstance(recipe_store.get_recipe_store(str(path), pack_dir=str(pack_dir)), recipe_store.PackedRecipeStore)
+
+    write_json(path, RECIPES + [{"id": "r5", "title": "New"}])
+    assert not recipe_store.pack_is_fresh(str(pack_dir), str(path))
+    assert isinstance(recipe_store.get_recipe_store(str(path), pack_dir=str(pack_dir)), recipe_store.RecipeStore)
+    assert not recipe_store.pack_is_fresh(str(pack_dir / "missing"), str(path))
+
+
+def test_rebuilt_pack_is_remapped(pack):
+    from data_preprocessing import build_recipe_pack
+
+    path, pack_dir = pack
+    store = recipe_store.PackedRecipeStore(str(pack_dir))
+    store.refresh()
+    build_recipe_pack(RECIPES[:2], str(pack_dir))
+    assert store.refresh()
+    assert len(store) == 2 and store.get("r4") is None
+    assert not store.refresh()
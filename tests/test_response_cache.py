@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+from response_cache import SemanticResponseCache, response_signature
+
+
+def classified(title=(), ingredients=(), exclude=(), constraints=()):
+    return {"type": ["title"], "title": {"include": list(title), "exclude": []},
+            "ingredients": {"include": list(ingredients), "exclude": list(exclude)},
+            "instructions": {"include": [], "exclude": []},
+            "nutritions": None, "descending": None, "nutrition_constraints": list(constraints)}
+
+
+def test_signature_separates_include_keywords():
+    curry = response_signature(classified(title=["chicken curry"], ingredients=["rice"]))
+    soup = response_signature(classified(title=["chicken soup"], ingredients=["rice"]))
+    assert curry != soup
+    assert response_signature(classified(ingredients=["Rice", "chicken  "])) == \
+        response_signature(classified(ingredients=["chicken", "rice"]))
+
+
+def test_signature_separates_exclusions_constraints_and_namespace():
+    base = response_signature(classified(title=["soup"]))
+    assert response_signature(classified(title=["soup"], exclude=["onion"])) != base
+    assert response_signature(classified(title=["soup"], constraints=[["fat", "<", 5]])) != base
+    assert response_signature(classified(title=["soup"]), namespace="other-model") != base
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_lookup_needs_the_same_signature_and_a_close_vector():
+    cache = SemanticResponseCache(":memory:", threshold=0.9)
+    curry = response_signature(classified(title=["chicken curry"]))
+    soup = response_signature(classified(title=["chicken soup"]))
+    cache.store(unit(1, 0, 0), curry, "curry answer", generation_seconds=3.0)
+
+    assert cache.lookup(unit(1, 0.1, 0), curry) == ("curry answer", pytest.approx(0.995, abs=1e-3))
+    assert cache.lookup(unit(1, 0.1, 0), soup) is None
+    assert cache.lookup(unit(0, 1, 0), curry) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["seconds_saved"]) == (1, 2, 3.0)
+
+
+def test_expired_entries_miss_and_least_recently_used_are_evicted():
+    cache = SemanticResponseCache(":memory:", threshold=0.9, ttl=0.05, max_entries=2)
+    signature = response_signature(classified(title=["soup"]))
+    cache.store(unit(1, 0, 0), signature, "old", 1.0)
+    time.sleep(0.06)
+    assert cache.lookup(unit(1, 0, 0), signature) is None
+
+    cache.ttl = 60
+    cache.store(unit(0, 1, 0), signature, "a", 1.0)
+    cache.store(unit(0, 0, 1), signature, "b", 1.0)
+    assert len(cache) == 2
+    assert cache.lookup(unit(0, 1, 0), signature)[0] == "a"
+    cache.store(unit(1, 1, 0), signature, "c", 1.0)
+    assert len(cache) == 2
+    assert cache.lookup(unit(0, 0, 1), signature) is None
+    assert cache.lookup(unit(0, 1, 0), signature)[0] == "a"
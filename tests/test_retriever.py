@@ -0,0 +1,192 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+retriever = pytest.importorskip("retriever", reason="needs the retrieval dependencies")
+from langchain_core.documents import Document
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeVectorStore:
+    """Exact cosine search over a few stored vectors, recording which threads searched it."""
+
+    def __init__(self, ids, vectors, delay=0.0):
+        self.ids, self.vectors, self.delay = ids, np.stack([unit(v) for v in vectors]), delay
+        self.threads, self.calls = set(), 0
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None):
+        self.calls += 1
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        sims = self.vectors @ unit(embedding)
+        order = np.argsort(-sims, kind="stable")[:k]
+        return [(Document(page_content="", metadata={"id": self.ids[i]}), float(2 - 2 * sims[i])) for i in order]
+
+    def get(self, where=None, include=None, **kwargs):
+        wanted = where["id"]["$in"]
+        rows = [self.ids.index(i) for i in wanted if i in self.ids]
+        return {"metadatas": [{"id": self.ids[r]} for r in rows], "embeddings": self.vectors[rows]}
+
+
+class FakeRegistry:
+    def __init__(self, stores, vocabulary):
+        self.stores, self.vocabulary = stores, vocabulary
+        self.embed_calls = []
+
+    def vectorstore(self, mode):
+        return self.stores[mode]
+
+    def embed_queries(self, texts):
+        self.embed_calls.append(list(texts))
+        return [unit(self.vocabulary[t]) for t in texts]
+
+
+def query(title=(), ingredients=(), instructions=()):
+    types = [m for m, v in (("title", title), ("ingredients", ingredients), ("instructions", instructions)) if v]
+    return {"type": types,
+            "title": {"include": list(title), "exclude": []},
+            "ingredients": {"include": list(ingredients), "exclude": []},
+            "instructions": {"include": list(instructions), "exclude": []}}
+
+
+def test_build_subqueries_splits_keywords_per_field():
+    subqueries = retriever.build_subqueries(query(title=["Curry", "curry"], ingredients=["rice", "Chicken"]))
+    assert subqueries == [("title", "curry"), ("ingredients", "chicken;rice"), ("ingredients", "rice"),
+                          ("ingredients", "Chicken")]
+    assert retriever.build_subqueries({"type": ["bogus"]}) == []
+
+
+def test_search_embeds_once_and_fans_out_concurrently():
+    vocabulary = {"curry": [1, 0, 0], "chicken;rice": [0, 1, 0], "rice": [0, 1, 1], "chicken": [0, 1, -1]}
+    stores = {mode: FakeVectorStore(["a", "b", "c"], [[1, 0, 0], [0, 1, 0], [0, 0, 1]], delay=0.1)
+              for mode in ("title", "ingredients")}
+    registry = FakeRegistry(stores, vocabulary)
+    executor = retriever.RetrievalExecutor(registry=registry, use_lexical=False)
+
+    start = time.perf_counter()
+    per_mode = executor.search(query(title=["curry"], ingredients=["rice", "chicken"]), top_k=2)
+    elapsed = time.perf_counter() - start
+
+    assert registry.embed_calls == [["curry", "chicken;rice", "rice", "chicken"]]
+    assert [len(per_mode["title"]), len(per_mode["ingredients"])] == [1, 3]
+    assert per_mode["title"][0][0][0].metadata["id"] == "a"
+    # four 0.1 s searches on the retrieval pool overlap
+    assert elapsed < 0.3
+    assert all(name.startswith("retrieval") for s in stores.values() for name in s.threads)
+
+
+def test_instruction_steps_are_grouped_into_recipes_with_overfetch():
+    steps = FakeVectorStore(["a", "a", "a", "a", "b", "c"],
+                            [[1, 0.01 * i, 0] for i in range(4)] + [[1, 0.5, 0], [0, 1, 0]])
+    recipes = retriever.search_instruction_recipes(steps, unit([1, 0, 0]).tolist(), top_k=2, overfetch=1)
+    assert [doc.metadata["id"] for doc, _ in recipes] == ["a", "b"]
+    assert steps.calls == 3
+
+
+def hits(*ids):
+    return [(Document(page_content="", metadata={"id": i}), float(rank)) for rank, i in enumerate(ids)]
+
+
+def test_rrf_fuses_dense_and_bm25_lists_into_unique_recipes():
+    per_mode = {
+        "title": [hits("a", "b", "c")],
+        "bm25_title": [hits("b", "a", "d")],
+        "instructions": [hits("c", "c", "b")],
+    }
+    fused = retriever.reciprocal_rank_fusion(per_mode, top_k=10)
+    scores = {hit["id"]: hit["score"] for hit in fused}
+    k, w = retriever.RRF_K, retriever.DEFAULT_FIELD_WEIGHTS
+    assert scores["b"] == pytest.approx(w["title"] / (k + 2) + w["bm25_title"] / (k + 1) + w["instructions"] / (k + 2))
+    # a recipe counts once per list, so c's repeated step does not stack
+    assert scores["c"] == pytest.approx(w["title"] / (k + 3) + w["instructions"] / (k + 1))
+    assert [hit["id"] for hit in fused] == ["b", "a", "c", "d"]
+    assert fused[0]["fields"]["bm25_title"]["rank"] == 1
+    dense_titles = retriever.reciprocal_rank_fusion(per_mode, {"bm25_title": 0.0, "instructions": 0.0}, top_k=2)
+    assert [hit["id"] for hit in dense_titles] == ["a", "b"]
+
+
+def test_exact_title_match_skips_the_dense_search(tmp_path, monkeypatch):
+    from lexical_index import build_bm25_index, BM25Index
+
+    build_bm25_index([("a", "Chicken Curry"), ("b", "Chicken Soup"), ("c", "Tomato Soup")], str(tmp_path / "title"))
+    index = BM25Index(str(tmp_path / "title"))
+    monkeypatch.setattr(retriever, "get_lexical_index", lambda mode: index if mode == "title" else None)
+    vocabulary = {"chicken curry": [1, 0, 0], "chicken stew": [0, 1, 0]}
+    stores = {"title": FakeVectorStore(["a", "b", "c"], [[1, 0, 0], [0, 1, 0], [0, 0, 1]])}
+    registry = FakeRegistry(stores, vocabulary)
+    executor = retriever.RetrievalExecutor(registry=registry)
+
+    per_mode = executor.search(query(title=["chicken curry"]), top_k=3)
+    assert [doc.metadata["id"] for doc, _ in per_mode["bm25_title"][0]] == ["a"]
+    assert "title" not in per_mode and registry.embed_calls == []
+
+    per_mode = executor.search(query(title=["chicken stew"]), top_k=3)
+    assert [doc.metadata["id"] for doc, _ in per_mode["bm25_title"][0]] == ["a", "b"]
+    assert registry.embed_calls == [["chicken stew"]] and len(per_mode["title"]) == 1
+
+
+def speculative_pool(vectors, raw, size):
+    sims = vectors @ raw
+    order = np.argsort(-sims, kind="stable")[:size]
+    docs = [Document(page_content="", metadata={"id": f"r{i}"}) for i in order]
+    return docs, vectors[order], float(sims[order].min()), size >= len(vectors)
+
+
+def exact_ids(vectors, vector, k):
+    return [f"r{i}" for i in np.argsort(-(vectors @ vector), kind="stable")[:k]]
+
+
+def test_speculative_reuse_is_exact_or_declines():
+    rng = np.random.default_rng(0)
+    vectors = np.stack([unit(v) for v in rng.standard_normal((500, 8))])
+    raw = unit(rng.standard_normal(8))
+    spec = retriever.SpeculativeResult(raw, {"title": speculative_pool(vectors, raw, 100)})
+
+    near = unit(raw + 0.05 * rng.standard_normal(8))
+    reused = spec.reuse("title", near, 5)
+    assert [doc.metadata["id"] for doc, _ in reused] == exact_ids(vectors, near, 5)
+    assert reused[0][1] == pytest.approx(2 - 2 * float(vectors[int(reused[0][0].metadata["id"][1:])] @ near))
+
+    for far in (-raw, unit(rng.standard_normal(8))):
+        found = spec.reuse("title", far, 5)
+        assert found is None or [doc.metadata["id"] for doc, _ in found] == exact_ids(vectors, far, 5)
+    assert spec.reuse("title", -raw, 5) is None
+    assert spec.reuse("title", raw, 101) is None
+    assert spec.reuse("ingredients", raw, 5) is None
+
+
+def test_speculative_pool_covering_the_collection_always_answers():
+    rng = np.random.default_rng(1)
+    vectors = np.stack([unit(v) for v in rng.standard_normal((20, 8))])
+    raw = unit(rng.standard_normal(8))
+    spec = retriever.SpeculativeResult(raw, {"title": speculative_pool(vectors, raw, 20)})
+    far = -raw
+    assert [doc.metadata["id"] for doc, _ in spec.reuse("title", far, 25)] == exact_ids(vectors, far, 25)
+
+
+def test_search_reuses_the_speculative_pool():
+    vocabulary = {"chicken curry": [1, 0.1, 0], "curry": [1, 0, 0], "rice": [0, 1, 0]}
+    stores = {mode: FakeVectorStore(["a", "b", "c"], [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+              for mode in ("title", "ingredients")}
+    registry = FakeRegistry(stores, vocabulary)
+    executor = retriever.RetrievalExecutor(registry=registry, use_lexical=False)
+
+    speculative = executor.speculate("chicken curry")
+    per_mode = executor.search(query(title=["curry"], ingredients=["rice"]), top_k=2, speculative=speculative)
+    # the collections are smaller than the pool, so both sub-queries come from it
+    assert [stores["title"].calls, stores["ingredients"].calls] == [1, 1]
+    assert [doc.metadata["id"] for doc, _ in per_mode["title"][0]] == ["a", "b"]
+    assert [doc.metadata["id"] for doc, _ in per_mode["ingredients"][0]] == ["b", "a"]
+    assert executor.speculation_stats() == {"requests": 1, "subqueries": 2, "reused": 2, "hit_rate": 1.0}
+
+    # a metadata filter is not applied to the pool, so filtered searches go to the store
+    executor.search(query(title=["curry"]), top_k=2, where={"nutr_fat": {"$lt": 5}},
+                    speculative=executor.speculate("chicken curry"))
+    assert stores["title"].calls == 3
+    assert executor.speculation_stats()["requests"] == 1
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+
+from vector_backends import backend_meta, build_backend, export_chroma_collection, load_backend
+
+
+def corpus(n=400, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return [f"r{i}" for i in range(n)], [i % 3 - 1 for i in range(n)], vectors
+
+
+def batches(ids, steps, vectors, size=64):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size], steps[start:start + size], vectors[start:start + size]
+
+
+class FakeCollection:
+    def __init__(self, ids, steps, vectors):
+        self.rows = {i: ({"id": i, "step": s}, v) for i, s, v in zip(ids, steps, vectors)}
+        self.offset_pages = 0
+
+    def count(self):
+        return len(self.rows)
+
+    def get(self, ids=None, include=None, limit=None, offset=None):
+        if ids is None:
+            self.offset_pages += 1
+            ids = list(self.rows)[offset:offset + limit]
+        found = [self.rows[i] for i in ids if i in self.rows]
+        return {"metadatas": [m for m, _ in found], "embeddings": [v for _, v in found]}
+
+
+class FakeStore:
+    def __init__(self, *data):
+        self._collection = FakeCollection(*data)
+
+
+@pytest.mark.parametrize("by_id", [False, True])
+def test_export_pages_through_the_whole_collection(by_id):
+    ids, steps, vectors = corpus()
+    store = FakeStore(ids, steps, vectors)
+    id_batches = ([ids[s:s + 50] for s in range(0, len(ids), 50)]) if by_id else None
+    exported = list(export_chroma_collection(store, batch_size=50, id_batches=id_batches))
+    assert [i for page_ids, _, _ in exported for i in page_ids] == ids
+    np.testing.assert_array_equal(np.concatenate([v for _, _, v in exported]), vectors)
+    assert store._collection.offset_pages == (0 if by_id else 8)
+
+
+def test_compressed_tier_records_its_source_version(tmp_path):
+    out_dir = str(tmp_path / "compressed")
+    assert backend_meta(out_dir) is None
+    build_backend("compressed", batches(*corpus()), out_dir, source_version=7)
+    assert backend_meta(out_dir)["source_version"] == 7
+    assert backend_meta(out_dir)["count"] == 400
+
+
+@pytest.mark.parametrize("prefilter, rescore_factor", [("int8", 10), ("hamming", 80)])
+def test_compressed_tier_rescoring_finds_the_exact_neighbours(tmp_path, prefilter, rescore_factor):
+    ids, steps, vectors = corpus()
+    build_backend("exact", batches(ids, steps, vectors), str(tmp_path / "exact"))
+    build_backend("compressed", batches(ids, steps, vectors), str(tmp_path / "compressed"))
+    exact = load_backend("exact", str(tmp_path / "exact"))
+    compressed = load_backend("compressed", str(tmp_path / "compressed"), prefilter=prefilter, rescore_factor=rescore_factor)
+    recalls = []
+    for query in vectors[:20]:
+        want = {d.metadata["id"] for d, _ in exact.similarity_search_by_vector_with_relevance_scores(query, k=5)}
+        got = {d.metadata["id"] for d, _ in compressed.similarity_search_by_vector_with_relevance_scores(query, k=5)}
+        recalls.append(len(got & want) / len(want))
+    # the exact backend stores float16, so near-ties may swap places
+    assert np.mean(recalls) >= 0.95
+
+
+def recall_against_exact(tmp_path, kind, n=1000, dim=32, k=10, **kwargs):
+    ids, steps, vectors = corpus(n, dim, seed=1)
+    build_backend("exact", batches(ids, steps, vectors), str(tmp_path / "exact"))
+    build_backend(kind, batches(ids, steps, vectors), str(tmp_path / kind), **kwargs)
+    exact, approximate = load_backend("exact", str(tmp_path / "exact")), load_backend(kind, str(tmp_path / kind))
+    queries = np.random.default_rng(2).standard_normal((30, dim)).astype(np.float32)
+    recalls = []
+    for query in queries:
+        want = {d.metadata["id"] for d, _ in exact.similarity_search_by_vector_with_relevance_scores(query, k=k)}
+        got = {d.metadata["id"] for d, _ in approximate.similarity_search_by_vector_with_relevance_scores(query, k=k)}
+        recalls.append(len(got & want) / k)
+    return approximate, float(np.mean(recalls))
+
+
+def test_exact_backend_matches_brute_force(tmp_path):
+    ids, steps, vectors = corpus()
+    build_backend("exact", batches(ids, steps, vectors), str(tmp_path / "exact"))
+    backend = load_backend("exact", str(tmp_path / "exact"), chunk_size=64)
+    query = vectors[7]
+    hits = backend.similarity_search_by_vector_with_relevance_scores(query, k=3)
+    normalised = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    sims = normalised @ (query / np.linalg.norm(query))
+    assert [d.metadata["id"] for d, _ in hits] == [ids[i] for i in np.argsort(-sims)[:3]]
+    assert hits[0][1] == pytest.approx(0.0, abs=1e-3)
+    assert hits[0][0].metadata["id"] == "r7"
+    got = backend.get(where={"id": {"$in": ["r3", "missing"]}}, include=["embeddings"])
+    assert [m["id"] for m in got["metadatas"]] == ["r3"]
+    with pytest.raises(ValueError):
+        backend.similarity_search_by_vector_with_relevance_scores(query, k=3, filter={"nutr_fat": {"$lt": 5}})
+
+
+def test_numpy_hnsw_recall_against_exact(tmp_path, monkeypatch):
+    import vector_backends
+
+    monkeypatch.setattr(vector_backends, "hnswlib", None)
+    backend, recall = recall_against_exact(tmp_path, "hnsw", M=8, ef_construction=64)
+    assert "engine" not in backend.meta
+    assert recall >= 0.9
+
+
+def test_hnswlib_recall_against_exact(tmp_path):
+    pytest.importorskip("hnswlib")
+    backend, recall = recall_against_exact(tmp_path, "hnsw")
+    assert backend.meta["engine"] == "hnswlib"
+    assert recall >= 0.9
+
+
+def test_numpy_hnsw_refuses_collections_over_the_cap(tmp_path, monkeypatch):
+    import vector_backends
+
+    monkeypatch.setattr(vector_backends, "hnswlib", None)
+    monkeypatch.setattr(vector_backends, "HNSW_PYTHON_MAX_VECTORS", 100)
+    out_dir = tmp_path / "hnsw"
+    with pytest.raises(ValueError, match="hnswlib"):
+        build_backend("hnsw", batches(*corpus()), str(out_dir))
+    assert backend_meta(str(out_dir)) is None
+    assert not (out_dir / ".staging").exists()
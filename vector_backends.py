@@ -0,0 +1,616 @@
+import heapq
+import json
+import os
+import shutil
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from index_publish import current_dir, publish, staging_dir
+
+try:
+    import hnswlib
+except ImportError:  # optional; small collections fall back to the NumPy graph below
+    hnswlib = None
+
+VECTOR_BACKEND_DIR = "./vector_backends"
+BACKEND_KINDS = ("chroma", "exact", "hnsw", "compressed")
+# Rows converted, quantised or copied at a time while building a backend
+BUILD_CHUNK = 65536
+SPOOL_FILE = "spool.f32"
+# The NumPy HNSW build inserts a few hundred vectors per second; larger collections need hnswlib
+HNSW_PYTHON_MAX_VECTORS = int(os.getenv("HNSW_PYTHON_MAX_VECTORS", "100000"))
+HNSWLIB_FILE = "hnswlib.bin"
+
+
+def export_chroma_collection(vectorstore, batch_size: int = 5000,
+                             id_batches: Optional[Iterable[List[str]]] = None) -> Iterator[Tuple[List[str], List[int], np.ndarray]]:
+    """Page through a Chroma collection, yielding (recipe ids, steps, float32 embeddings) batches.
+
+    With id_batches (ingest_manifest.document_id_batches) every page is fetched by id;
+    otherwise by limit/offset, where each page rescans the rows before it.
+    """
+    if id_batches is not None:
+        pages = (vectorstore._collection.get(ids=ids, include=["embeddings", "metadatas"]) for ids in id_batches)
+    else:
+        total = vectorstore._collection.count()
+        pages = (vectorstore._collection.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+                 for offset in range(0, total, batch_size))
+    for got in pages:
+        metadatas = got["metadatas"]
+        yield ([m.get("id", "") for m in metadatas],
+               [int(m.get("step", -1)) for m in metadatas],
+               np.asarray(got["embeddings"], dtype=np.float32).reshape(len(metadatas), -1))
+
+
+def embed_documents_batched(docs: List[Document], embeddings, batch_size: int = 512) -> Iterator[Tuple[List[str], List[int], np.ndarray]]:
+    """Embed prepare_documents output in batches, yielding the same batches as export_chroma_collection."""
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start:start + batch_size]
+        vectors = embeddings.embed_documents([d.page_content for d in batch])
+        yield ([d.metadata.get("id", "") for d in batch],
+               [int(d.metadata.get("step", -1)) for d in batch],
+               np.asarray(vectors, dtype=np.float32))
+
+
+def _spool(batches: Iterable[Tuple[List[str], List[int], np.ndarray]], tmp_dir: str):
+    """Normalise the batches' vectors into a float32 scratch file under tmp_dir, one batch at a time.
+
+    Returns (ids, steps, read-only (N, D) memmap of the vectors); builders then work in
+    chunks of BUILD_CHUNK rows, so peak memory is one batch plus ids, not the collection.
+    """
+    ids, steps, n, dim = [], [], 0, 0
+    path = os.path.join(tmp_dir, SPOOL_FILE)
+    with open(path, "wb") as f:
+        for batch_ids, batch_steps, batch_vectors in batches:
+            if not len(batch_ids):
+                continue
+            vectors = np.asarray(batch_vectors, dtype=np.float32)
+            vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+            ids.extend(str(i).encode("utf-8") for i in batch_ids)
+            steps.extend(batch_steps)
+            n, dim = n + len(vectors), vectors.shape[1]
+            f.write(np.ascontiguousarray(vectors).tobytes())
+    vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(n, dim)) if n else np.zeros((0, 0), dtype=np.float32)
+    return np.array(ids, dtype=bytes), np.array(steps, dtype=np.int32), vectors
+
+
+def _write_common(tmp_dir: str, kind: str, ids: np.ndarray, steps: np.ndarray, vectors: np.ndarray,
+                  dtype=np.float16, **meta) -> str:
+    out = np.lib.format.open_memmap(os.path.join(tmp_dir, "vectors.npy"), mode="w+", dtype=dtype,
+                                    shape=vectors.shape)
+    for start in range(0, len(vectors), BUILD_CHUNK):
+        out[start:start + BUILD_CHUNK] = vectors[start:start + BUILD_CHUNK]
+    out.flush()
+    del out
+    np.save(os.path.join(tmp_dir, "ids.npy"), ids)
+    np.save(os.path.join(tmp_dir, "steps.npy"), steps)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(meta, kind=kind, count=len(ids), dim=int(vectors.shape[1]) if len(ids) else 0), f)
+    return tmp_dir
+
+
+def _publish(tmp_dir: str, out_dir: str) -> None:
+    spool = os.path.join(tmp_dir, SPOOL_FILE)
+    if os.path.exists(spool):
+        os.remove(spool)
+    publish(tmp_dir, out_dir)
+
+
+class VectorBackend:
+    """Read-only vector index with the slice of the Chroma API the retriever uses.
+
+    Distances are squared L2 between normalised vectors (2 - 2 * cosine), like Chroma's
+    default space, so callers cannot tell the backends apart.
+    """
+
+    kind = None
+
+    def __init__(self, index_dir: str):
+        index_dir = current_dir(index_dir)
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(index_dir, "ids.npy"), mmap_mode="r")
+        self.steps = np.load(os.path.join(index_dir, "steps.npy"), mmap_mode="r")
+        self._id_order = None
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _search_rows(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cosine similarities) of the k nearest vectors, best first."""
+        raise NotImplementedError
+
+    def _document(self, row: int) -> Document:
+        metadata = {"id": self.ids[row].decode("utf-8")}
+        if self.steps[row] >= 0:
+            metadata["step"] = int(self.steps[row])
+        return Document(page_content="", metadata=metadata)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k: int = 4, filter: Dict = None, **kwargs):
+        if filter:
+            raise ValueError(f"Metadata filters are only supported by the chroma backend, not '{self.kind}'.")
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        rows, sims = self._search_rows(query, k)
+        return [(self._document(int(row)), float(2.0 - 2.0 * sim)) for row, sim in zip(rows, sims)]
+
+    def get(self, ids=None, where: Dict = None, include: List[str] = None, **kwargs) -> Dict:
+        """Supports the {"id": {"$in": [...]}} lookup used for stored-embedding reads."""
+        wanted = (where or {}).get("id", {}).get("$in")
+        if wanted is None:
+            raise ValueError("Only where={'id': {'$in': [...]}} lookups are supported.")
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._id_order]
+        keys = np.array([str(i).encode("utf-8") for i in wanted], dtype=self.ids.dtype)
+        start = np.searchsorted(sorted_ids, keys, side="left")
+        end = np.searchsorted(sorted_ids, keys, side="right")
+        rows = np.concatenate([self._id_order[s:e] for s, e in zip(start, end)]) if len(keys) else np.zeros(0, dtype=np.int64)
+        return {
+            "ids": [str(int(r)) for r in rows],
+            "metadatas": [self._document(int(r)).metadata for r in rows],
+            "embeddings": np.asarray(self.vectors[rows], dtype=np.float32).reshape(len(rows), -1),
+        }
+
+
+class ExactBackend(VectorBackend):
+    """Brute-force cosine search over a memory-mapped float16 matrix, scanned in chunks."""
+
+    kind = "exact"
+
+    def __init__(self, index_dir: str, chunk_size: int = 65536):
+        super().__init__(index_dir)
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def build(batches, out_dir: str) -> str:
+        tmp_dir = staging_dir(out_dir)
+        ids, steps, vectors = _spool(batches, tmp_dir)
+        _publish(_write_common(tmp_dir, "exact", ids, steps, vectors), out_dir)
+        print(f"🧮 Exact backend: {len(ids)} vectors -> {out_dir}")
+        return out_dir
+
+    def _search_rows(self, query: np.ndarray, k: int):
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_sims = np.zeros(0, dtype=np.float32)
+        for start in range(0, len(self.vectors), self.chunk_size):
+            chunk = np.asarray(self.vectors[start:start + self.chunk_size], dtype=np.float32)
+            sims = chunk @ query
+            if len(sims) > k:
+                top = np.argpartition(-sims, k - 1)[:k]
+            else:
+                top = np.arange(len(sims))
+            best_rows = np.concatenate([best_rows, top + start])
+            best_sims = np.concatenate([best_sims, sims[top]])
+            if len(best_sims) > k:
+                keep = np.argpartition(-best_sims, k - 1)[:k]
+                best_rows, best_sims = best_rows[keep], best_sims[keep]
+        order = np.argsort(-best_sims, kind="stable")
+        return best_rows[order], best_sims[order]
+
+
+class HNSWBackend(VectorBackend):
+    """Hierarchical navigable small-world graph over the same float16 vectors.
+
+    Built with hnswlib when it is installed. Otherwise a pure NumPy graph is built (up to
+    HNSW_PYTHON_MAX_VECTORS vectors): layer 0 neighbours live in a fixed (N, 2M) int32
+    array and the sparse upper layers are CSR arrays. Search cost grows with ef_search
+    rather than with the collection size.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, index_dir: str, ef_search: int = 64):
+        super().__init__(index_dir)
+        self.ef_search = ef_search
+        self.graph = None
+        if self.meta.get("engine") == "hnswlib":
+            if hnswlib is None:
+                raise ImportError(f"{index_dir} was built with hnswlib; pip install hnswlib to load it.")
+            self.graph = hnswlib.Index(space="ip", dim=self.meta["dim"])
+            self.graph.load_index(os.path.join(self.index_dir, HNSWLIB_FILE), max_elements=self.meta["count"])
+            self.graph.set_ef(ef_search)
+            return
+        self.layer0 = np.load(os.path.join(self.index_dir, "layer0.npy"), mmap_mode="r")
+        upper = np.load(os.path.join(self.index_dir, "upper.npz"))
+        self.upper = []
+        for level in range(1, self.meta["max_level"] + 1):
+            nodes, indptr, flat = upper[f"nodes{level}"], upper[f"indptr{level}"], upper[f"flat{level}"]
+            self.upper.append({int(n): flat[indptr[i]:indptr[i + 1]] for i, n in enumerate(nodes)})
+
+    def _neighbors(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            row = self.layer0[node]
+            return row[row >= 0]
+        return self.upper[level - 1].get(node, np.zeros(0, dtype=np.int32))
+
+    def _search_rows(self, query: np.ndarray, k: int):
+        if self.meta["count"] == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if self.graph is not None:
+            labels, distances = self.graph.knn_query(query, k=min(k, self.meta["count"]))
+            # inner-product space: distance = 1 - cosine
+            return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+        entry = self.meta["entry"]
+        for level in range(self.meta["max_level"], 0, -1):
+            entry = _search_layer(self.vectors, self._neighbors, query, [entry], 1, level)[0][1]
+        found = _search_layer(self.vectors, self._neighbors, query, [entry], max(self.ef_search, k), 0)[:k]
+        return np.array([n for _, n in found], dtype=np.int64), np.array([-d for d, _ in found], dtype=np.float32)
+
+    @staticmethod
+    def build(batches, out_dir: str, M: int = 16, ef_construction: int = 100, seed: int = 0) -> str:
+        tmp_dir = staging_dir(out_dir)
+        ids, steps, vectors = _spool(batches, tmp_dir)
+        n = len(ids)
+        if hnswlib is not None and n:
+            return HNSWBackend._build_hnswlib(tmp_dir, out_dir, ids, steps, vectors, M, ef_construction, seed)
+        if n > HNSW_PYTHON_MAX_VECTORS:
+            shutil.rmtree(tmp_dir)
+            raise ValueError(
+                f"Refusing to build a {n}-vector HNSW graph in pure Python (limit HNSW_PYTHON_MAX_VECTORS="
+                f"{HNSW_PYTHON_MAX_VECTORS}, roughly {n * 3e-3 / 60:.0f} minutes at ~3 ms per vector). "
+                "pip install hnswlib, or use the 'exact' or 'compressed' backend."
+            )
+        vectors = np.array(vectors)
+        rng = np.random.default_rng(seed)
+        levels = np.floor(-np.log(rng.random(n) + 1e-12) / np.log(M)).astype(np.int32)
+        max_m0 = 2 * M
+        layer0 = np.full((n, max_m0), -1, dtype=np.int32)
+        upper: List[Dict[int, List[int]]] = [dict() for _ in range(int(levels.max()) if n else 0)]
+
+        def neighbors(node, level):
+            if level == 0:
+                row = layer0[node]
+                return row[row >= 0]
+            return np.asarray(upper[level - 1].get(node, []), dtype=np.int32)
+
+        def set_neighbors(node, level, nbrs):
+            if level == 0:
+                layer0[node] = -1
+                layer0[node, :len(nbrs)] = nbrs
+            else:
+                upper[level - 1][node] = list(nbrs)
+
+        def connect(node, level, candidates, limit):
+            # keep the `limit` candidates closest to node
+            candidates = np.unique(np.asarray(candidates, dtype=np.int32))
+            candidates = candidates[candidates != node]
+            if len(candidates) > limit:
+                sims = vectors[candidates] @ vectors[node]
+                candidates = candidates[np.argpartition(-sims, limit - 1)[:limit]]
+            set_neighbors(node, level, candidates)
+
+        def add_link(node, level, new, limit):
+            # cheap append while there is room; prune to the closest `limit` only on overflow
+            current = neighbors(node, level)
+            if len(current) < limit:
+                if level == 0:
+                    layer0[node, len(current)] = new
+                else:
+                    upper[level - 1].setdefault(node, []).append(new)
+            else:
+                connect(node, level, np.append(current, new), limit)
+
+        entry, max_level = -1, -1
+        start = time.perf_counter()
+        for node in range(n):
+            query, level = vectors[node], int(levels[node])
+            if entry < 0:
+                entry, max_level = node, level
+                continue
+            ep = [entry]
+            for lc in range(max_level, level, -1):
+                ep = [_search_layer(vectors, neighbors, query, ep, 1, lc)[0][1]]
+            for lc in range(min(level, max_level), -1, -1):
+                found = _search_layer(vectors, neighbors, query, ep, ef_construction, lc)
+                limit = max_m0 if lc == 0 else M
+                selected = [c for _, c in found[:M]]
+                connect(node, lc, selected, limit)
+                for other in selected:
+                    add_link(other, lc, node, limit)
+                ep = [c for _, c in found]
+            if level > max_level:
+                entry, max_level = node, level
+            if node and node % 100000 == 0:
+                print(f"  HNSW: inserted {node}/{n} ({node / (time.perf_counter() - start):.0f} vec/s)")
+
+        _write_common(tmp_dir, "hnsw", ids, steps, vectors, M=M, ef_construction=ef_construction,
+                                entry=int(max(entry, 0)), max_level=int(max(max_level, 0)))
+        np.save(os.path.join(tmp_dir, "layer0.npy"), layer0)
+        arrays = {}
+        for level in range(1, max(max_level, 0) + 1):
+            nodes = sorted(upper[level - 1])
+            lists = [np.asarray(upper[level - 1][node], dtype=np.int32) for node in nodes]
+            arrays[f"nodes{level}"] = np.array(nodes, dtype=np.int32)
+            arrays[f"indptr{level}"] = np.concatenate([[0], np.cumsum([len(l) for l in lists])]).astype(np.int64)
+            arrays[f"flat{level}"] = np.concatenate(lists) if lists else np.zeros(0, dtype=np.int32)
+        np.savez(os.path.join(tmp_dir, "upper.npz"), **arrays)
+        _publish(tmp_dir, out_dir)
+        print(f"🕸️ HNSW backend: {n} vectors, {max_level + 1} layers in {time.perf_counter() - start:.1f}s -> {out_dir}")
+        return out_dir
+
+    @staticmethod
+    def _build_hnswlib(tmp_dir, out_dir, ids, steps, vectors, M, ef_construction, seed) -> str:
+        """hnswlib graph over the spooled vectors, added BUILD_CHUNK rows at a time."""
+        n, dim = vectors.shape
+        start = time.perf_counter()
+        graph = hnswlib.Index(space="ip", dim=dim)
+        graph.init_index(max_elements=n, M=M, ef_construction=ef_construction, random_seed=seed)
+        for begin in range(0, n, BUILD_CHUNK):
+            chunk = np.asarray(vectors[begin:begin + BUILD_CHUNK], dtype=np.float32)
+            graph.add_items(chunk, np.arange(begin, begin + len(chunk)))
+        graph.save_index(os.path.join(tmp_dir, HNSWLIB_FILE))
+        _write_common(tmp_dir, "hnsw", ids, steps, vectors, engine="hnswlib", M=M, ef_construction=ef_construction)
+        _publish(tmp_dir, out_dir)
+        print(f"🕸️ HNSW backend (hnswlib): {n} vectors in {time.perf_counter() - start:.1f}s -> {out_dir}")
+        return out_dir
+
+
+def _search_layer(vectors, neighbors, query, entry_points, ef: int, level: int) -> List[Tuple[float, int]]:
+    """Best-first search of one HNSW layer; returns up to ef (distance, node) pairs, nearest first.
+
+    Distance is the negated cosine similarity, so smaller is closer.
+    """
+    entry_points = list(entry_points)
+    dists = -(np.asarray(vectors[entry_points], dtype=np.float32) @ query)
+    visited = set(entry_points)
+    candidates = [(float(d), int(e)) for d, e in zip(dists, entry_points)]
+    heapq.heapify(candidates)
+    results = [(-d, e) for d, e in candidates]
+    heapq.heapify(results)
+    while len(results) > ef:
+        heapq.heappop(results)
+
+    while candidates:
+        dist, node = heapq.heappop(candidates)
+        if dist > -results[0][0] and len(results) >= ef:
+            break
+        fresh = [int(n) for n in neighbors(node, level) if n not in visited]
+        if not fresh:
+            continue
+        visited.update(fresh)
+        fresh_dists = -(np.asarray(vectors[fresh], dtype=np.float32) @ query)
+        for d, n in zip(fresh_dists.tolist(), fresh):
+            if len(results) < ef or d < -results[0][0]:
+                heapq.heappush(candidates, (d, n))
+                heapq.heappush(results, (-d, n))
+                if len(results) > ef:
+                    heapq.heappop(results)
+    return sorted((-d, n) for d, n in results)
+
+
+# Set bits per byte value, for Hamming distances between packed sign codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_rows(bits: np.ndarray) -> np.ndarray:
+    """Set bits per row of a uint8 (n, bytes) array."""
+    if hasattr(np, "bitwise_count") and bits.shape[1] % 8 == 0:
+        return np.bitwise_count(np.ascontiguousarray(bits).view(np.uint64)).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[bits].sum(axis=1, dtype=np.int32)
+
+
+class CompressedBackend(VectorBackend):
+    """Two-stage search over compressed codes with exact rescoring.
+
+    Every vector is stored three ways: a 1-bit sign code around the corpus mean (D/8 bytes), an int8 scalar
+    quantisation with one scale per dimension (D bytes), and the original float32 vector
+    on disk. A query prefilters the whole collection by Hamming distance on the sign codes
+    or by int8 dot product, then rescores only a shortlist of rescore_factor * k candidates
+    against the original vectors, which stay memory-mapped and mostly unread.
+    """
+
+    kind = "compressed"
+
+    def __init__(self, index_dir: str, prefilter: str = "hamming", rescore_factor: int = 10, chunk_size: int = 262144):
+        super().__init__(index_dir)
+        if prefilter not in ("hamming", "int8"):
+            raise ValueError(f"Unknown prefilter '{prefilter}'. Choose 'hamming' or 'int8'.")
+        self.prefilter = prefilter
+        self.rescore_factor = rescore_factor
+        self.chunk_size = chunk_size
+        self.codes = np.load(os.path.join(self.index_dir, "codes.npy"), mmap_mode="r")
+        self.bits = np.load(os.path.join(self.index_dir, "bits.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(self.index_dir, "scales.npy"))
+        self.center = np.load(os.path.join(self.index_dir, "center.npy"))
+
+    @staticmethod
+    def build(batches, out_dir: str, source_version: Optional[int] = None) -> str:
+        """source_version: ingest_manifest.collection_version of the collection the batches come from."""
+        tmp_dir = staging_dir(out_dir)
+        ids, steps, vectors = _spool(batches, tmp_dir)
+        n, dim = vectors.shape
+        # first pass: per-dimension max magnitude and mean
+        peak, total = np.zeros(dim, dtype=np.float32), np.zeros(dim, dtype=np.float64)
+        for start in range(0, n, BUILD_CHUNK):
+            chunk = vectors[start:start + BUILD_CHUNK]
+            peak = np.maximum(peak, np.abs(chunk).max(axis=0))
+            total += chunk.sum(axis=0, dtype=np.float64)
+        # symmetric per-dimension scale so the largest magnitude maps to 127
+        scales = (peak / 127.0).astype(np.float32) if n else np.ones(0, np.float32)
+        scales[scales == 0] = 1.0
+        # sign bits relative to the corpus mean, so every bit splits the collection roughly in half
+        center = (total / max(n, 1)).astype(np.float32)
+
+        # second pass: quantise chunk by chunk straight into the output files
+        codes = np.lib.format.open_memmap(os.path.join(tmp_dir, "codes.npy"), mode="w+", dtype=np.int8, shape=(n, dim))
+        bits = np.lib.format.open_memmap(os.path.join(tmp_dir, "bits.npy"), mode="w+", dtype=np.uint8,
+                                         shape=(n, (dim + 7) // 8))
+        for start in range(0, n, BUILD_CHUNK):
+            chunk = vectors[start:start + BUILD_CHUNK]
+            codes[start:start + len(chunk)] = np.clip(np.rint(chunk / scales), -127, 127).astype(np.int8)
+            bits[start:start + len(chunk)] = np.packbits(chunk > center, axis=1)
+        codes.flush()
+        bits.flush()
+
+        _write_common(tmp_dir, "compressed", ids, steps, vectors, dtype=np.float32, source_version=source_version)
+        np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+        np.save(os.path.join(tmp_dir, "center.npy"), center)
+        _publish(tmp_dir, out_dir)
+        print(f"🗜️ Compressed backend: {n} vectors, {codes.nbytes / 1e6:.1f} MB int8 + {bits.nbytes / 1e6:.1f} MB sign bits -> {out_dir}")
+        return out_dir
+
+    def memory_report(self) -> Dict[str, float]:
+        """Bytes each representation takes, and the saving of the scanned codes vs float32."""
+        original = self.vectors.nbytes
+        scanned = self.bits.nbytes if self.prefilter == "hamming" else self.codes.nbytes
+        return {
+            "float32_mb": original / 1e6,
+            "int8_mb": self.codes.nbytes / 1e6,
+            "binary_mb": self.bits.nbytes / 1e6,
+            "scanned_mb": scanned / 1e6,
+            "scan_compression": original / max(scanned, 1),
+        }
+
+    def _prefilter_scores(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Higher is better, for rows [start, end)."""
+        if self.prefilter == "hamming":
+            query_bits = np.packbits(query > self.center)
+            return -_popcount_rows(np.bitwise_xor(self.bits[start:end], query_bits))
+        return np.asarray(self.codes[start:end], dtype=np.float32) @ (query * self.scales)
+
+    def _search_rows(self, query: np.ndarray, k: int):
+        shortlist_size = max(k * self.rescore_factor, k)
+        short_rows = np.zeros(0, dtype=np.int64)
+        short_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, len(self.ids), self.chunk_size):
+            scores = self._prefilter_scores(query, start, min(start + self.chunk_size, len(self.ids)))
+            if len(scores) > shortlist_size:
+                top = np.argpartition(-scores, shortlist_size - 1)[:shortlist_size]
+            else:
+                top = np.arange(len(scores))
+            short_rows = np.concatenate([short_rows, top + start])
+            short_scores = np.concatenate([short_scores, scores[top].astype(np.float32)])
+            if len(short_scores) > shortlist_size:
+                keep = np.argpartition(-short_scores, shortlist_size - 1)[:shortlist_size]
+                short_rows, short_scores = short_rows[keep], short_scores[keep]
+
+        # exact rescoring of the shortlist against the original vectors
+        short_rows = np.sort(short_rows)
+        sims = np.asarray(self.vectors[short_rows], dtype=np.float32) @ query
+        best = np.argsort(-sims, kind="stable")[:k]
+        return short_rows[best], sims[best]
+
+
+_BACKEND_CLASSES = {"exact": ExactBackend, "hnsw": HNSWBackend, "compressed": CompressedBackend}
+
+
+def build_backend(kind: str, batches, out_dir: str, **kwargs) -> str:
+    """Build an exact/hnsw/compressed backend from export_chroma_collection or embed_documents_batched batches."""
+    if kind not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown backend '{kind}'. Choose from {list(_BACKEND_CLASSES)}.")
+    return _BACKEND_CLASSES[kind].build(batches, out_dir, **kwargs)
+
+
+def load_backend(kind: str, index_dir: str, **kwargs) -> VectorBackend:
+    if kind not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown backend '{kind}'. Choose from {list(_BACKEND_CLASSES)}.")
+    return _BACKEND_CLASSES[kind](index_dir, **kwargs)
+
+
+def backend_dir(kind: str, mode: str, root: str = VECTOR_BACKEND_DIR) -> str:
+    return os.path.join(root, kind, mode)
+
+
+def backend_meta(index_dir: str) -> Optional[Dict]:
+    """meta.json of the published backend in index_dir, None when none was built."""
+    try:
+        with open(os.path.join(current_dir(index_dir), "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def compression_tradeoffs(index_dir: str,
+                          queries: np.ndarray,
+                          k: int = 10,
+                          rescore_factors=(1, 4, 10, 40),
+                          exact_dir: str = None) -> List[Dict]:
+    """Recall@k, latency and memory of a compressed index for each prefilter and shortlist size.
+
+    Recall is measured against an exact backend over the same vectors (exact_dir) or, when
+    none is given, against brute force on the compressed index's own original vectors.
+    """
+    # a compressed index keeps the same vectors.npy/ids.npy layout, so ExactBackend can read it directly
+    reference = ExactBackend(exact_dir or index_dir)
+    rows = []
+    for prefilter in ("hamming", "int8"):
+        for factor in rescore_factors:
+            backend = CompressedBackend(index_dir, prefilter=prefilter, rescore_factor=factor)
+            stats = benchmark_backends({"exact": reference, "compressed": backend}, queries, k=k)
+            rows.append(dict(prefilter=prefilter, rescore_factor=factor, **stats["compressed"], **backend.memory_report()))
+    return rows
+
+
+def benchmark_backends(backends: Dict[str, object], queries: np.ndarray, k: int = 10, reference: str = None) -> Dict[str, Dict]:
+    """Latency percentiles and recall@k of each backend on the same query vectors.
+
+    Recall is measured against `reference` (by default the exact backend if present),
+    comparing (recipe id, step) pairs of the top k.
+    """
+    reference = reference or ("exact" if "exact" in backends else None)
+    results, truth = {}, {}
+    for name, backend in backends.items():
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            hits = backend.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append({(d.metadata.get("id"), d.metadata.get("step")) for d, _ in hits})
+        truth[name] = found
+        results[name] = {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        }
+    if reference is not None:
+        for name in backends:
+            recalls = [len(a & b) / max(len(b), 1) for a, b in zip(truth[name], truth[reference])]
+            results[name][f"recall@{k}"] = float(np.mean(recalls))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from resources import ResourceRegistry
+
+    parser = argparse.ArgumentParser(description="Build exact/HNSW/compressed backends from the Chroma collections and benchmark them.")
+    parser.add_argument("--modes", nargs="+", default=["title", "ingredients", "instructions"])
+    parser.add_argument("--kinds", nargs="+", default=["exact", "hnsw", "compressed"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--from-json", default=None,
+                        help="Embed prepare_documents(recipes.json) directly instead of exporting the Chroma collections")
+    args = parser.parse_args()
+
+    registry = ResourceRegistry(backend="chroma")
+    docs_by_mode = {}
+    if args.from_json:
+        from data_preprocessing import load_recipes_from_json, prepare_documents
+        docs_by_mode = dict(zip(("title", "ingredients", "instructions"),
+                                prepare_documents(load_recipes_from_json(args.from_json))))
+
+    for mode in args.modes:
+        chroma = registry.vectorstore(mode)
+        # embedding is the expensive part, so freshly embedded batches are kept for every kind;
+        # the Chroma export is paged through again per kind instead of being held in memory
+        cached = list(embed_documents_batched(docs_by_mode[mode], registry.embeddings())) if args.from_json else None
+        for kind in args.kinds:
+            build_backend(kind, cached if cached is not None else export_chroma_collection(chroma), backend_dir(kind, mode))
+
+        backends = {"chroma": chroma}
+        backends.update({kind: load_backend(kind, backend_dir(kind, mode)) for kind in args.kinds})
+        # Query with stored vectors of the collection itself
+        sample = backends[args.kinds[0]]
+        rows = np.random.default_rng(0).choice(sample.count(), size=min(args.queries, sample.count()), replace=False)
+        queries = np.asarray(sample.vectors[np.sort(rows)], dtype=np.float32)
+        print(f"📊 {mode}: {json.dumps(benchmark_backends(backends, queries, k=args.k), indent=2)}")
+        if "compressed" in args.kinds:
+            exact_dir = backend_dir("exact", mode) if "exact" in args.kinds else None
+            for row in compression_tradeoffs(backend_dir("compressed", mode), queries, k=args.k, exact_dir=exact_dir):
+                print(f"🗜️ {mode}: {json.dumps(row)}")